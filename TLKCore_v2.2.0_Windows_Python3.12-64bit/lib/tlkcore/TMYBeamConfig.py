@@ -1,11 +1,63 @@
+import copy
 import csv
+import hashlib
+import json
 import logging
+import math
 import os
 
+import numpy as np
+
 from tlkcore.TMYPublic import RetCode, RFMode, BeamType
 
 logger = logging.getLogger("TMYBeamConfig")
 
+# One row per CSV line, db is beam_db of BEAM rows or ch_db of CHANNEL rows,
+# has_* masks tell which optional fields are assigned, values of empty fields are 0
+BEAM_TABLE = np.dtype([('mode', 'u1'), ('beam_id', '<u2'), ('beam_type', 'u1'), ('ch', '<u2'),
+                       ('sw', 'i1'), ('db', '<f8'), ('theta', '<i2'), ('phi', '<i2'), ('deg', '<i2'),
+                       ('has_sw', '?'), ('has_db', '?'), ('has_theta', '?'), ('has_phi', '?'), ('has_deg', '?')])
+
+def normalizeChannelGains(ele_db, common_db, com_dr, ele_dr):
+    """
+    Check and normalize gains of channel beams in one pass, negative element gains
+    are moved into common gain of its board, then element gains start from 0.
+
+    Args:
+        ele_db (array_like): Element gains relative to common gain, shape: (beams, boards, 4)
+        common_db (array_like): Common gains, shape: (beams, boards)
+        com_dr (array_like): [min, max] common gain of each board, shape: (boards, 2)
+        ele_dr (array_like): Element gain range of each board, shape: (boards,)
+
+    Returns:
+        dict: 'common' (beams, boards) and 'element' (beams, boards, 4) adjusted gains,
+              'spread' (beams, boards) max diff of element gains,
+              'spread_error', 'common_error' (lowered below min common gain), 'adjusted' (beams, boards) masks,
+              'valid' (beams,) mask of beams without errors
+    """
+    ele_db = np.asarray(ele_db, dtype=np.float64)
+    common_db = np.asarray(common_db, dtype=np.float64)
+    com_dr = np.asarray(com_dr, dtype=np.float64)
+    ele_dr = np.asarray(ele_dr, dtype=np.float64)
+
+    low = ele_db.min(axis=-1)
+    spread = ele_db.max(axis=-1) - low
+    spread_error = spread > ele_dr
+    # Lower the common gain by min element gain if it is negative
+    shift = np.minimum(low, 0)
+    common = common_db + shift
+    # Common gain is only ever lowered, so only a lowered one is checked against min common gain
+    common_error = (shift < 0) & (common < com_dr[:, 0])
+    return {
+        'common': common,
+        'element': ele_db - shift[..., None],
+        'spread': spread,
+        'spread_error': spread_error,
+        'common_error': common_error,
+        'adjusted': shift < 0,
+        'valid': ~(spread_error | common_error).any(axis=-1),
+    }
+
 class TMYBeamConfig():
     def __init__(self, sn:str, service, path="CustomBatchBeams.csv", delimiter=","):
         """
@@ -15,56 +67,95 @@ class TMYBeamConfig():
         Args:
             sn (str): Device serail number
             service (_type_): TLKCoreService instance
-            path (str, optional): _description_. Defaults to "CustomBatchBeams.csv".
+            path (str, optional): Beam table, csv or compiled .npz by compile(). Defaults to "CustomBatchBeams.csv".
             delimiter (str, optional): delimiter in csv. Defaults to ",".
         """
 
         self.__sn = sn
         self.__service = service
         self.__config = None
+        # Last known device beams: {(mode_name, beamID): beam}, for diff apply without reading back
+        self.__snapshot = {}
+        # Result of last applyBeams()
+        self.stats = {'written': 0, 'skipped': 0, 'failed': 0}
         if not os.path.exists(path):
             logger.error("Not exist: %s" %path)
             return
-        self.__config = self.__parse(path, delimiter)
+        if path.endswith(".npz"):
+            self.__config = self.__load(path)
+        else:
+            self.__config = self.__parse(path, delimiter)
 
-    def __parse(self, path:str, delimiter:str):
-        logger.info("Start to parsing...")
-        try:
-            aakit_selected = True if self.__service.getAAKitInfo(self.__sn).RetCode is RetCode.OK else False
-            logger.info("[AppyBatchBeams] AAKit %sselected" %"" if aakit_selected else "NOT ")
+    @staticmethod
+    def readTable(path:str, delimiter:str=","):
+        """
+        Read csv beam table into typed rows.
 
-            file = open(path)
+        Returns:
+            np.ndarray: Structured array of BEAM_TABLE
+        """
+        def number(text, cast):
+            """Returns (value, assigned), 0 for empty field"""
+            return (cast(text), True) if len(text) > 0 else (cast(0), False)
+
+        rows = []
+        with open(path) as file:
             reader = csv.reader((_.replace('\x00', '') for _ in file), delimiter=delimiter)
-            custom = { 'TX': {}, 'RX': {}}
-            # Parsing CSV
             for col in reader:
                 if len(col) == 0 or len(col[0]) == 0 or col[0] == 'Mode':
                     continue
-                # print(col)
-                mode_name = col[0]
-                beamID = int(col[1])
+                col += [''] * (10 - len(col))
+                mode = getattr(RFMode, col[0])
                 beam_type = BeamType(int(col[2]))
-
                 if beam_type is BeamType.BEAM:
-                    if not aakit_selected:
-                        logger.warning("PhiA mode not support whole beam config -> skip")
-                        continue
-                    # Fetch col 3~5 for db,theta,phi
-                    config = [col[i] for i in range(3, 6)]
+                    # col 3~5 for db,theta,phi
+                    sw, ch = (0, False), 0
+                    db, theta, phi = number(col[3], float), number(col[4], int), number(col[5], int)
+                    deg = (0, False)
                 else: #CHANNEL
+                    # col 6 for ch, col 7~9 for sw,db,deg
                     ch = int(col[6])
-                    # Fetch col 7~9 for sw,db,deg
-                    config = {str(ch): [col[i] for i in range(7, 10)]}
-
-                if custom[mode_name].get(str(beamID)) is None:
-                    # Create new beam config
-                    beam = {'beam_type': beam_type.value, 'config': config}
-                    custom[mode_name][str(beamID)] = beam
-                else:
-                    # If exist, replace or add new channel config into beam config
-                    custom[mode_name][str(beamID)]['config'].update(config)
-                    # custom[mode_name][str(beamID)].update(beam)
+                    sw, db, deg = number(col[7], int), number(col[8], float), number(col[9], int)
+                    theta = phi = (0, False)
+                fields = (sw, db, theta, phi, deg)
+                rows.append((mode.value, int(col[1]), beam_type.value, ch,
+                             *[v for v, _ in fields], *[has for _, has in fields]))
+        return np.array(rows, dtype=BEAM_TABLE)
 
+    def __fromTable(self, table:np.ndarray):
+        """Build beam configs of each mode and beam id from typed rows, empty fields are None"""
+        aakit_selected = True if self.__service.getAAKitInfo(self.__sn).RetCode is RetCode.OK else False
+        logger.info("[AppyBatchBeams] AAKit %sselected" %("" if aakit_selected else "NOT "))
+
+        custom = { 'TX': {}, 'RX': {}}
+        for row in table.tolist():
+            mode, beamID, beam_type, ch, sw, db, theta, phi, deg, has_sw, has_db, has_theta, has_phi, has_deg = row
+            mode_name = RFMode(mode).name
+            beam_type = BeamType(beam_type)
+            if beam_type is BeamType.BEAM:
+                if not aakit_selected:
+                    logger.warning("PhiA mode not support whole beam config -> skip")
+                    continue
+                config = [db if has_db else None,
+                          theta if has_theta else None,
+                          phi if has_phi else None]
+            else: #CHANNEL
+                config = {str(ch): [sw if has_sw else None,
+                                    db if has_db else None,
+                                    deg if has_deg else None]}
+
+            if custom[mode_name].get(str(beamID)) is None:
+                # Create new beam config
+                custom[mode_name][str(beamID)] = {'beam_type': beam_type.value, 'config': config}
+            else:
+                # If exist, replace or add new channel config into beam config
+                custom[mode_name][str(beamID)]['config'].update(config)
+        return custom
+
+    def __parse(self, path:str, delimiter:str):
+        logger.info("Start to parsing...")
+        try:
+            custom = self.__fromTable(self.readTable(path, delimiter))
             # Parsing done
             logger.info("[CustomCSV] " + str(custom))
             return custom
@@ -72,12 +163,293 @@ class TMYBeamConfig():
             logger.exception("Something wrong while parsing")
             return None
 
+    def __getLimits(self):
+        """Gain limits of device which beam table is validated against"""
+        service = self.__service
+        sn = self.__sn
+        return {
+            'channel_count': service.getChannelCount(sn).RetData,
+            'dr': service.getDR(sn).RetData,
+            'com_dr': service.getCOMDR(sn).RetData,
+            'ele_dr': service.getELEDR(sn).RetData,
+        }
+
+    @staticmethod
+    def validateTable(table:np.ndarray, limits:dict):
+        """
+        Check beam table against device gain limits.
+
+        Args:
+            table (np.ndarray): Rows of BEAM_TABLE
+            limits (dict): {'channel_count', 'dr', 'com_dr', 'ele_dr'} of device
+
+        Returns:
+            list: Error messages, empty if valid
+        """
+        errors = []
+        for mode in RFMode:
+            rows = table[table['mode'] == mode.value]
+            beams = rows[(rows['beam_type'] == BeamType.BEAM.value) & rows['has_db']]
+            if len(beams):
+                low, high = limits['dr'][mode.name][0], limits['dr'][mode.name][1]
+                bad = beams[(beams['db'] < low) | (beams['db'] > high)]
+                for r in bad:
+                    errors.append("[%s]BeamID %02d - beam db %.1f out of range [%.1f, %.1f]"
+                                  %(mode.name, r['beam_id'], r['db'], low, high))
+
+            channels = rows[rows['beam_type'] == BeamType.CHANNEL.value]
+            bad = channels[(channels['ch'] < 1) | (channels['ch'] > limits['channel_count'])]
+            for r in bad:
+                errors.append("[%s]BeamID %02d - Invalid ch_%d exceeds %d channels"
+                              %(mode.name, r['beam_id'], r['ch'], limits['channel_count']))
+            channels = channels[(channels['ch'] >= 1) & (channels['ch'] <= limits['channel_count'])
+                                & channels['has_db']]
+            # Assigned channel gains of each board must fit common gain range plus element gain range
+            boards = (channels['ch'].astype(np.int64) - 1) // 4
+            for beam_id, board in set(zip(channels['beam_id'].tolist(), boards.tolist())):
+                db = channels['db'][(channels['beam_id'] == beam_id) & (boards == board)]
+                com_low, com_high = limits['com_dr'][mode.value][board][0], limits['com_dr'][mode.value][board][1]
+                ele = limits['ele_dr'][mode.value][board]
+                if db.max() - db.min() > ele:
+                    errors.append("[%s]BeamID %02d - [board_%d] max diff of db %s exceeds the limit: %.1f"
+                                  %(mode.name, beam_id, board+1, db.tolist(), ele))
+                if db.min() < com_low or db.max() > com_high + ele:
+                    errors.append("[%s]BeamID %02d - [board_%d] db %s out of range [%.1f, %.1f]"
+                                  %(mode.name, beam_id, board+1, db.tolist(), com_low, com_high + ele))
+        return errors
+
+    @staticmethod
+    def hashFile(path:str):
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def compile(self, path:str="CustomBatchBeams.csv", out:str=None, delimiter:str=","):
+        """
+        Validate csv beam table once against gain limits of device, then save typed table into .npz,
+        which could be passed to TMYBeamConfig(path=...) later without parsing and validating again.
+
+        Args:
+            path (str, optional): Source csv. Defaults to "CustomBatchBeams.csv".
+            out (str, optional): Output path. Defaults to path with .npz extension.
+            delimiter (str, optional): delimiter in csv. Defaults to ",".
+
+        Returns:
+            str: Output path, or None if failed
+        """
+        if out is None:
+            out = os.path.splitext(path)[0] + ".npz"
+        try:
+            table = self.readTable(path, delimiter)
+            limits = self.__getLimits()
+            errors = self.validateTable(table, limits)
+            for e in errors:
+                logger.error("[Compile] %s" %e)
+            if errors:
+                return None
+            np.savez(out, table=table, source=os.path.abspath(path), hash=self.hashFile(path),
+                     limits=json.dumps(limits))
+            logger.info("[Compile] %d rows of %s -> %s" %(len(table), path, out))
+            return out
+        except:
+            logger.exception("Something wrong while compiling")
+            return None
+
+    def __load(self, path:str):
+        """
+        Load compiled table, it is compiled again from its source csv if the csv, gain limits of device
+        or table format changed since compiling. Returns None if it is stale and can not be compiled.
+        """
+        logger.info("Loading compiled beam table: %s" %path)
+        try:
+            with np.load(path) as data:
+                table = data['table']
+                source = str(data['source'])
+                content_hash = str(data['hash'])
+                limits = json.loads(str(data['limits']))
+            stale = None
+            if table.dtype != BEAM_TABLE:
+                stale = "table format changed"
+            elif not os.path.exists(source):
+                logger.warning("Source of compiled beam table not found: %s, csv changes are not checked" %source)
+            elif self.hashFile(source) != content_hash:
+                stale = "%s changed" %source
+            if stale is None and json.loads(json.dumps(self.__getLimits())) != limits:
+                stale = "gain limits of %s changed" %self.__sn
+            if stale is not None:
+                logger.warning("Compiled beam table is stale: %s, compile again" %stale)
+                if not os.path.exists(source) or self.compile(source, path) is None:
+                    logger.error("Can not compile %s again, beam table not loaded" %source)
+                    return None
+                with np.load(path) as data:
+                    table = data['table']
+            return self.__fromTable(table)
+        except:
+            logger.exception("Something wrong while loading")
+            return None
+
     def getConfig(self):
         if self.__config is None:
             return None
         return self.__config
 
-    def applyBeams(self):
+    @staticmethod
+    def __same(current, desired):
+        """Compare beam configs, gains are compared with tolerance"""
+        if isinstance(current, dict) and isinstance(desired, dict):
+            return current.keys() == desired.keys() and \
+                all(TMYBeamConfig.__same(current[k], desired[k]) for k in desired)
+        if isinstance(current, (int, float)) and isinstance(desired, (int, float)):
+            return math.isclose(current, desired, abs_tol=1e-6)
+        return current == desired
+
+    def __buildBeam(self, mode_name:str, beamID:int, snapshot:bool, limits:dict):
+        """
+        Merge custom config of beam into current device beam, channel gains are not normalized yet.
+
+        Returns:
+            tuple: (beam_type, current device beam, config to write)
+        """
+        service = self.__service
+        sn = self.__sn
+        mode = getattr(RFMode, mode_name)
+        channel_count, dr, com_dr, ele_dr_limit = limits
+        if snapshot and (mode_name, beamID) in self.__snapshot:
+            beam = copy.deepcopy(self.__snapshot[(mode_name, beamID)])
+        else:
+            ret = service.getBeamPattern(sn, mode, beamID)
+            beam = ret.RetData
+            logger.debug("Get [%s]BeamID %02d info: %s" %(mode_name, beamID, beam))
+        # Keep device beam untouched for comparing, config below is updated in place
+        current = copy.deepcopy(beam)
+
+        beam_type = BeamType(self.__config[mode_name][str(beamID)]['beam_type'])
+        value = self.__config[mode_name][str(beamID)]['config']
+        logger.info("Get [%s]BeamID %02d custom: %s" %(mode_name, beamID, value))
+
+        if beam_type is BeamType.BEAM:
+            if beam['beam_type'] != beam_type.value:
+                # Construct a new config
+                beam = {'beam_config': {'db': dr[mode.name][1], 'theta': 0, 'phi':0 }}
+            config = beam['beam_config']
+            if value[0] is not None:
+                config['db'] = value[0]
+            if value[1] is not None:
+                config['theta'] = value[1]
+            if value[2] is not None:
+                config['phi'] = value[2]
+            return beam_type, current, config
+
+        #CHANNEL
+        if beam['beam_type'] != beam_type.value:
+            # Construct a new config
+            beam = {'channel_config': {}}
+            for ch in range(1, channel_count+1):
+                if ch%4 == 1: # 4 channels in one board
+                    # First channel in board: construct brd_cfg
+                    board = int(ch/4) + 1
+                    brd_cfg = {}
+                    # Use MAX COMDR - will check with assign gain to adjust
+                    brd_cfg['common_db'] = com_dr[mode.value][board-1][1]
+                ch_cfg = {
+                    'sw': 0,
+                    # Use MAX ELEDR
+                    'db': ele_dr_limit[mode.value][board-1],
+                    'deg': 0
+                }
+                brd_cfg['channel_'+str((ch-1)%4 + 1)] = ch_cfg
+                if ch%4 == 0:
+                    beam['channel_config'].update({'board_'+str(board): brd_cfg})
+
+        config = beam['channel_config']
+
+        # Update each channel
+        for ch_str, ch_value in value.items():
+            ch = int(ch_str)
+            if ch > channel_count:
+                raise ValueError("[%s]BeamID %02d - Invalid ch_%s exceeds %d channels"
+                                 %(mode_name, beamID, ch, channel_count))
+            # logger.debug("Update ch%d info: %s" %(ch, ch_value))
+            board_idx = int((ch-1)/4)
+            board_name = 'board_'+str(board_idx + 1)
+            board_ch = (ch-1)%4 + 1
+            ch_name = 'channel_'+str(board_ch)
+            if ch_value[0] is not None:
+                config[board_name][ch_name]['sw'] = ch_value[0]
+            if ch_value[1] is not None:
+                db = ch_value[1]
+                ele_gain = db - config[board_name]['common_db']
+                if ele_gain < 0:
+                    logger.warning("Ch_%d changed to db:%.1f < com gain:%.1f, adjust com gain later" %(ch, db, config[board_name]['common_db']))
+                config[board_name][ch_name]['db'] = ele_gain
+            if ch_value[2] is not None:
+                config[board_name][ch_name]['deg'] = ch_value[2]
+        logger.debug("Tmp [%s]BeamID %02d custom: %s" %(mode_name, beamID, config))
+        return beam_type, current, config
+
+    def __normalizeChannels(self, beams:list, com_dr, ele_dr_limit):
+        """
+        Check com_gain, ele_gain of all boards of all channel beams in one normalizeChannelGains() call
+        per board layout (usually one), adjusted gains are written back into configs.
+
+        Args:
+            beams (list): [(mode_name, beamID, config), ...] of channel beams
+
+        Returns:
+            bool: True if all beams valid
+        """
+        ch_names = ['channel_'+str(i) for i in range(1, 5)]
+        groups = {}
+        for item in beams:
+            mode_name, _, config = item
+            boards = tuple(sorted(config, key=lambda b: int(b.replace("board_", ""))))
+            groups.setdefault((mode_name, boards), []).append(item)
+
+        valid = True
+        for (mode_name, boards), items in groups.items():
+            mode = getattr(RFMode, mode_name)
+            brd_idx = [int(b.replace("board_", ""))-1 for b in boards]
+            result = normalizeChannelGains(
+                [[[config[b][c]['db'] for c in ch_names] for b in boards] for _, _, config in items],
+                [[config[b]['common_db'] for b in boards] for _, _, config in items],
+                [com_dr[mode.value][i] for i in brd_idx],
+                [ele_dr_limit[mode.value][i] for i in brd_idx])
+            for n, (_, beamID, config) in enumerate(items):
+                for i, brd in enumerate(boards):
+                    brd_cfg = config[brd]
+                    if result['spread_error'][n, i]:
+                        logger.error("[%s]BeamID %02d - [%s] Invalid db setting: %s, the max diff of each db field exceeds the limit: %.1f"
+                                    %(mode_name, beamID, brd, [brd_cfg[c]['db']+brd_cfg['common_db'] for c in ch_names],
+                                      ele_dr_limit[mode.value][brd_idx[i]]))
+                    elif result['common_error'][n, i]:
+                        logger.error("[%s]BeamID %02d - [%s] Invalid common gain: %.1f < min common gain: %.1f, please tune higher the minimal db field"
+                                    %(mode_name, beamID, brd, result['common'][n, i], com_dr[mode.value][brd_idx[i]][0]))
+                    elif result['adjusted'][n, i]:
+                        logger.info("[%s]BeamID %02d - Adjust [%s]com gain: %.1f -> %.1f, and ele gain: %s -> %s"
+                                    %(mode_name, beamID, brd, brd_cfg['common_db'], result['common'][n, i],
+                                      [brd_cfg[c]['db'] for c in ch_names], result['element'][n, i].tolist()))
+                if not result['valid'][n]:
+                    valid = False
+                    continue
+                for i, brd in enumerate(boards):
+                    if result['adjusted'][n, i]:
+                        config[brd]['common_db'] = float(result['common'][n, i])
+                        for c, db in zip(ch_names, result['element'][n, i].tolist()):
+                            config[brd][c]['db'] = db
+        return valid
+
+    def applyBeams(self, diff:bool=False, snapshot:bool=False):
+        """
+        Apply beam configs to device, gains of all channel beams are checked before writing any beam.
+
+        Args:
+            diff (bool, optional): Only write beams different from current device beams. Defaults to False.
+            snapshot (bool, optional): Compare with beams of previous apply instead of reading them back,
+                                       only valid if nothing else changed device beams since then. Defaults to False.
+
+        Returns:
+            bool: True if all beams applied, counts of written/skipped/failed beams are kept in stats
+        """
+        self.stats = {'written': 0, 'skipped': 0, 'failed': 0}
         try:
             if self.__service is None:
                 logger.error("service is None")
@@ -96,112 +468,51 @@ class TMYBeamConfig():
             # print(com_dr)
             ele_dr_limit = service.getELEDR(sn).RetData
             # print(ele_dr_limit)
+            limits = (channel_count, dr, com_dr, ele_dr_limit)
 
             # Get Beam then update custom beam
+            pending = []
             for mode_name in [*custom]:
-                mode = getattr(RFMode, mode_name)
-                # print(mode)
                 for id in [*custom[mode_name]]:
                     beamID = int(id)
-                    ret = service.getBeamPattern(sn, mode, beamID)
-                    beam = ret.RetData
-                    logger.debug("Get [%s]BeamID %02d info: %s" %(mode_name, beamID, beam))
-
-                    beam_type = BeamType(custom[mode_name][str(beamID)]['beam_type'])
-                    value = custom[mode_name][str(beamID)]['config']
-                    logger.info("Get [%s]BeamID %02d custom: %s" %(mode_name, beamID, value))
-
-                    if beam_type is BeamType.BEAM:
-                        if beam['beam_type'] != beam_type.value:
-                            # Construct a new config
-                            beam = {'beam_config': {'db': dr[mode.name][1], 'theta': 0, 'phi':0 }}
-                        config = beam['beam_config']
-                        if len(value[0]) > 0:
-                            config['db'] = float(value[0])
-                        if len(value[1]) > 0:
-                            config['theta'] = int(value[1])
-                        if len(value[2]) > 0:
-                            config['phi'] = int(value[2])
-                    else: #CHANNEL
-                        if beam['beam_type'] != beam_type.value:
-                            # Construct a new config
-                            beam = {'channel_config': {}}
-                            for ch in range(1, channel_count+1):
-                                if ch%4 == 1: # 4 channels in one board
-                                    # First channel in board: construct brd_cfg
-                                    board = int(ch/4) + 1
-                                    brd_cfg = {}
-                                    # Use MAX COMDR - will check with assign gain to adjust
-                                    brd_cfg['common_db'] = com_dr[mode.value][board-1][1]
-                                ch_cfg = {
-                                    'sw': 0,
-                                    # Use MAX ELEDR
-                                    'db': ele_dr_limit[mode.value][board-1],
-                                    'deg': 0
-                                }
-                                brd_cfg['channel_'+str((ch-1)%4 + 1)] = ch_cfg
-                                if ch%4 == 0:
-                                    beam['channel_config'].update({'board_'+str(board): brd_cfg})
-
-                        config = beam['channel_config']
-
-                        # Update each channel
-                        for ch_str, ch_value in value.items():
-                            ch = int(ch_str)
-                            if ch > channel_count:
-                                logger.error("[%s]BeamID %02d - Invalid ch_%s exceeds %d channels! -> skip it"
-                                            %(mode_name, beamID, ch, channel_count))
-                                return False
-                            # logger.debug("Update ch%d info: %s" %(ch, ch_value))
-                            board_idx = int((ch-1)/4)
-                            board_name = 'board_'+str(board_idx + 1)
-                            board_ch = (ch-1)%4 + 1
-                            ch_name = 'channel_'+str(board_ch)
-                            if len(ch_value[0]) > 0:
-                                config[board_name][ch_name]['sw'] = int(ch_value[0])
-                            if len(ch_value[1]) > 0:
-                                db = float(ch_value[1])
-                                ele_gain = db - config[board_name]['common_db']
-                                if ele_gain < 0:
-                                    logger.warning("Ch_%d changed to db:%.1f < com gain:%.1f, adjust com gain later" %(ch, db, config[board_name]['common_db']))
-                                config[board_name][ch_name]['db'] = ele_gain
-                            if len(ch_value[2]) > 0:
-                                config[board_name][ch_name]['deg'] = int(ch_value[2])
-                        logger.debug("Tmp [%s]BeamID %02d custom: %s" %(mode_name, beamID, config))
-
-                        # Simple check each com_gain, ele_gain for board/channel
-                        for brd, brd_cfg in config.items():
-                            brd_idx = int(brd.replace("board_", ""))-1
-                            brd_db = [v['db'] for k, v in brd_cfg.items() if k.startswith("channel_")]
-                            # print(brd_db)
-                            if max(brd_db) - min(brd_db) > ele_dr_limit[mode.value][board_idx]:
-                                logger.error("[%s]BeamID %02d - [%s] Invalid db setting: %s, the max diff of each db field exceeds the limit: %.1f"
-                                            %(mode_name, beamID, brd, [d+brd_cfg['common_db'] for d in brd_db], ele_dr_limit[mode.value][board_idx]))
-                                return False
-                            if min(brd_db) < 0:
-                                # Lower the common gain to min db
-                                new_com = brd_cfg['common_db'] + min(brd_db)
-                                if new_com < com_dr[mode.value][brd_idx][0]:
-                                    logger.error("[%s]BeamID %02d - [%s] Invalid common gain: %.1f < min common gain: %.1f, please tune higher the minimal db field"
-                                                %(mode_name, beamID, brd, new_com, com_dr[mode.value][brd_idx][0]))
-                                    return False
-                                logger.info("[%s]BeamID %02d - Adjust [%s]com gain: %.1f -> %.1f, and ele gain: %s -> %s"
-                                            %(mode_name, beamID, brd, brd_cfg['common_db'], new_com,
-                                            [v['db'] for k, v in brd_cfg.items() if k.startswith("channel_")],
-                                            [v['db']-min(brd_db) for k, v in brd_cfg.items() if k.startswith("channel_")]))
-                                brd_cfg['common_db'] = new_com
-                                for k, v in brd_cfg.items():
-                                    if k.startswith("channel_"):
-                                        v['db'] -= min(brd_db)
-                    logger.info("Set [%s]BeamID %02d info: %s" %(mode_name, beamID, config))
-                    ret = service.setBeamPattern(sn, mode, beamID, beam_type, config)
-                    if ret.RetCode is not RetCode.OK:
-                        logger.error(ret.RetMsg)
+                    try:
+                        beam_type, current, config = self.__buildBeam(mode_name, beamID, snapshot, limits)
+                    except ValueError as e:
+                        logger.error("%s! -> skip it" %e)
+                        self.stats['failed'] += 1
                         return False
+                    pending.append((mode_name, beamID, beam_type, current, config))
+
+            channels = [(m, b, config) for m, b, t, _, config in pending if t is BeamType.CHANNEL]
+            if channels and not self.__normalizeChannels(channels, com_dr, ele_dr_limit):
+                self.stats['failed'] += 1
+                return False
+
+            for mode_name, beamID, beam_type, current, config in pending:
+                mode = getattr(RFMode, mode_name)
+                key = 'beam_config' if beam_type is BeamType.BEAM else 'channel_config'
+                desired = {'beam_type': beam_type.value, key: config}
+                if diff and isinstance(current, dict) and current.get('beam_type') == beam_type.value \
+                        and self.__same(current.get(key), config):
+                    logger.info("Skip [%s]BeamID %02d, unchanged" %(mode_name, beamID))
+                    self.stats['skipped'] += 1
+                    self.__snapshot[(mode_name, beamID)] = copy.deepcopy(desired)
+                    continue
+
+                logger.info("Set [%s]BeamID %02d info: %s" %(mode_name, beamID, config))
+                ret = service.setBeamPattern(sn, mode, beamID, beam_type, config)
+                if ret.RetCode is not RetCode.OK:
+                    logger.error(ret.RetMsg)
+                    self.stats['failed'] += 1
+                    self.__snapshot.pop((mode_name, beamID), None)
+                    return False
+                self.stats['written'] += 1
+                self.__snapshot[(mode_name, beamID)] = copy.deepcopy(desired)
         except:
             logger.exception("Something wrong while parsing")
+            self.stats['failed'] += 1
             return False
-        logger.info("Apply beam configs to %s successfully" %sn)
+        logger.info("Apply beam configs to %s successfully, %s" %(sn, self.stats))
         return True
 
 if __name__ == '__main__':
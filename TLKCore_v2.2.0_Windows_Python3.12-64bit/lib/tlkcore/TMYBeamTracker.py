@@ -0,0 +1,126 @@
+import logging
+import time
+
+logger = logging.getLogger("TMYBeamTracker")
+
+class TMYBeamTracker():
+    def __init__(self, shape, apply, measure, start:int=0, radius:int=1, hysteresis:float=1.0,
+                 max_latency:float=None, settle=0, wrap_phi:bool=True):
+        """
+        Track the best beam on a precomputed (theta, phi) grid, each iteration probes a small
+        neighbourhood of current beam and moves if a neighbour beats current power by hysteresis.
+
+        Args:
+            shape (tuple): (n_theta, n_phi) of the grid, flat index is theta_idx * n_phi + phi_idx
+            apply (callable): apply(idx) applies precomputed pattern/phase of flat index to device
+            measure (callable): measure(idx) returns received power, or None if invalid
+            start (int, optional): Flat index of initial beam, e.g. the best one of a sweep. Defaults to 0.
+            radius (int, optional): Neighbourhood radius in grid steps. Defaults to 1.
+            hysteresis (float, optional): dB margin to move. Defaults to 1.0.
+            max_latency (float, optional): Seconds budget of one iteration, stop probing if exceeded. Defaults to None.
+            settle (float, optional): Sleep seconds after applying,
+                                      or a TMYSettleDetector to poll measure() until stable. Defaults to 0.
+            wrap_phi (bool, optional): Azimuth grid covers a full circle. Defaults to True.
+        """
+        self.__n_theta, self.__n_phi = shape
+        self.__apply = apply
+        self.__measure = measure
+        self.__radius = radius
+        self.__hysteresis = hysteresis
+        self.__max_latency = max_latency
+        self.__settle = settle
+        self.__wrap_phi = wrap_phi
+
+        self.current = start
+        self.power = None
+        # hits: stay on current beam, moves: switch to a better neighbour,
+        # misses: invalid measurement of current beam or iteration exceeds latency budget
+        self.stats = {'iterations': 0, 'hits': 0, 'misses': 0, 'moves': 0, 'max_latency': 0.0}
+        self.__apply(self.current)
+
+    def neighbours(self, idx:int):
+        """Flat indices around idx, nearest first"""
+        ci, cj = divmod(idx, self.__n_phi)
+        cells = []
+        for di in range(-self.__radius, self.__radius + 1):
+            for dj in range(-self.__radius, self.__radius + 1):
+                if di == 0 and dj == 0:
+                    continue
+                i, j = ci + di, cj + dj
+                if not 0 <= i < self.__n_theta:
+                    continue
+                if self.__wrap_phi:
+                    j %= self.__n_phi
+                elif not 0 <= j < self.__n_phi:
+                    continue
+                cells.append((abs(di) + abs(dj), i * self.__n_phi + j))
+        return [n for _, n in sorted(set(cells)) if n != idx]
+
+    def __wait(self, idx:int):
+        """Wait for the applied beam, returns settled power if settle is a TMYSettleDetector"""
+        if hasattr(self.__settle, 'wait'):
+            power, _, _ = self.__settle.wait(lambda: self.__measure(idx))
+            return power
+        if self.__settle:
+            time.sleep(self.__settle)
+        return None
+
+    def __probe(self, idx:int):
+        self.__apply(idx)
+        power = self.__wait(idx)
+        return power if hasattr(self.__settle, 'wait') else self.__measure(idx)
+
+    def step(self):
+        """One tracking iteration, returns (current flat index, current power)"""
+        start = time.perf_counter()
+        deadline = None if self.__max_latency is None else start + self.__max_latency
+        self.stats['iterations'] += 1
+
+        # Current beam is still applied from last iteration
+        power = self.__measure(self.current)
+        if power is None:
+            self.stats['misses'] += 1
+            return self.current, self.power
+        self.power = power
+
+        best, best_power = self.current, power
+        overrun = False
+        for idx in self.neighbours(self.current):
+            if deadline is not None and time.perf_counter() >= deadline:
+                overrun = True
+                break
+            p = self.__probe(idx)
+            if p is not None and p > best_power:
+                best, best_power = idx, p
+
+        if best != self.current and best_power >= power + self.__hysteresis:
+            logger.info("Move beam %d -> %d: %.2f -> %.2f" %(self.current, best, power, best_power))
+            self.current, self.power = best, best_power
+            self.stats['moves'] += 1
+        else:
+            self.stats['hits'] += 1
+        if overrun:
+            self.stats['misses'] += 1
+        # Restore the tracked beam after probing, next measurement should not read the last neighbour
+        self.__apply(self.current)
+        self.__wait(self.current)
+
+        elapsed = time.perf_counter() - start
+        self.stats['max_latency'] = max(self.stats['max_latency'], elapsed)
+        return self.current, self.power
+
+    def run(self, iterations:int=None, interval:float=0):
+        """Track until iterations done or Ctrl+C, interval is the min seconds between iterations"""
+        i = 0
+        try:
+            while iterations is None or i < iterations:
+                t = time.perf_counter()
+                self.step()
+                i += 1
+                wait = interval - (time.perf_counter() - t)
+                if wait > 0:
+                    time.sleep(wait)
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Detected Ctrl+C, stop tracking")
+        logger.info("Tracking stats: %s" %self.stats)
+        return self.current, self.power
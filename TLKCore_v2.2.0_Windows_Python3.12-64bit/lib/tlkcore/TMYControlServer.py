@@ -0,0 +1,286 @@
+"""
+Local control daemon, owns one TLKCoreService and exposes its functions to other processes.
+
+    frame   := length(uint32) codec(uint8) body
+    request := {'id', 'method', 'args', 'kwargs'} or {'id', 'batch': calls, 'policy'}
+    reply   := {'id', 'ok', 'code', 'data', 'error'} or {'id', 'ok', 'executed', 'failed', 'elapsed', 'results'}
+
+Body is msgpack if installed, otherwise JSON, replies use the codec of request.
+Enum arguments are passed as tokens like "RFMode.TX", enum results are returned as the same tokens.
+"""
+
+import json
+import logging
+import socket
+import socketserver
+import struct
+import threading
+from enum import Enum
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from tlkcore.TMYDispatcher import TMYDispatcher
+from tlkcore.TMYPublic import RetCode
+
+logger = logging.getLogger("TMYControlServer")
+
+JSON = 0
+MSGPACK = 1
+_HEADER = struct.Struct("!IB")
+MAX_FRAME = 64 * 1024 * 1024
+
+def _plain(obj):
+    """
+    Convert results into types both codecs support.
+
+    Raises:
+        TypeError: if obj has no known conversion, instead of sending its str() silently
+    """
+    if isinstance(obj, Enum):
+        return "%s.%s" %(type(obj).__name__, obj.name)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError("Object of type %s is not serializable" %type(obj).__name__)
+
+def encode(obj, codec:int=None):
+    """Encode obj into one frame, msgpack if available by default"""
+    if codec is None:
+        codec = MSGPACK if msgpack is not None else JSON
+    if codec == MSGPACK:
+        body = msgpack.packb(obj, default=_plain, use_bin_type=True)
+    else:
+        body = json.dumps(obj, default=_plain).encode()
+    return _HEADER.pack(len(body) + 1, codec) + body
+
+def _recvExact(sock:socket.socket, size:int):
+    buf = bytearray()
+    while len(buf) < size:
+        data = sock.recv(size - len(buf))
+        if not data:
+            return None
+        buf += data
+    return bytes(buf)
+
+def recvFrame(sock:socket.socket):
+    """
+    Receive one frame.
+
+    Returns:
+        tuple: (codec, obj), or None if connection closed
+    """
+    head = _recvExact(sock, _HEADER.size)
+    if head is None:
+        return None
+    length, codec = _HEADER.unpack(head)
+    if length < 1 or length > MAX_FRAME:
+        raise ValueError("Invalid frame length: %d" %length)
+    body = _recvExact(sock, length - 1)
+    if body is None:
+        return None
+    if codec == MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack frame received but msgpack is not installed")
+        return codec, msgpack.unpackb(body, raw=False, strict_map_key=False)
+    if codec == JSON:
+        return codec, json.loads(body)
+    raise ValueError("Unknown codec: %d" %codec)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.control
+        peer = self.client_address
+        logger.info("Control client connected: %s" %(peer,))
+        try:
+            while True:
+                frame = recvFrame(self.request)
+                if frame is None:
+                    break
+                codec, req = frame
+                reply = server.handle(req)
+                try:
+                    data = encode(reply, codec)
+                except (TypeError, ValueError, OverflowError) as e:
+                    logger.warning("Reply %s not serializable: %s" %(reply.get('id'), e))
+                    data = encode({'id': reply.get('id'), 'ok': False, 'code': reply.get('code'), 'data': None,
+                                   'error': "%s: %s" %(type(e).__name__, e)}, codec)
+                self.request.sendall(data)
+        except (OSError, ValueError) as e:
+            logger.warning("Control client %s error: %s" %(peer, e))
+        logger.info("Control client disconnected: %s" %(peer,))
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+class TMYControlServer():
+    def __init__(self, service, host:str="127.0.0.1", port:int=5004, unix_path:str=None):
+        """
+        Serve TLKCoreService functions to concurrent clients, calls of the same device are serialized.
+
+        Args:
+            service (TLKCoreService): Service instance, usually with devices initialized
+            host (str, optional): Bind address, keep local by default. Defaults to "127.0.0.1".
+            port (int, optional): Bind port, 0 for any free port. Defaults to 5004.
+            unix_path (str, optional): Serve on Unix socket path instead of TCP. Defaults to None.
+        """
+        self.__dispatcher = TMYDispatcher(service)
+        self.__locks = {}
+        self.__locks_lock = threading.Lock()
+        if unix_path:
+            self.__server = _UnixServer(unix_path, _Handler)
+        else:
+            self.__server = _TCPServer((host, port), _Handler)
+        self.__server.control = self
+        self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def address(self):
+        return self.__server.server_address
+
+    @property
+    def dispatcher(self):
+        return self.__dispatcher
+
+    def lock(self, sn):
+        with self.__locks_lock:
+            return self.__locks.setdefault(sn, threading.Lock())
+
+    def __call(self, func_name:str, args, kwargs=None):
+        sn = args[0] if args and isinstance(args[0], str) else None
+        if sn is None:
+            return self.__dispatcher.call(func_name, *args, **(kwargs or {}))
+        with self.lock(sn):
+            return self.__dispatcher.call(func_name, *args, **(kwargs or {}))
+
+    def handle(self, req:dict):
+        """Execute one request, returns reply"""
+        rid = req.get('id') if isinstance(req, dict) else None
+        try:
+            if 'batch' in req:
+                result = self.__batch(req['batch'], req.get('policy', "stop"))
+                result['id'] = rid
+                return result
+            ret = self.__call(req['method'], list(req.get('args', [])), req.get('kwargs'))
+            if hasattr(ret, "RetCode"):
+                return {'id': rid, 'ok': ret.RetCode is RetCode.OK, 'code': str(ret.RetCode),
+                        'data': ret.RetData, 'error': None if ret.RetCode is RetCode.OK else ret.RetMsg}
+            return {'id': rid, 'ok': True, 'code': None, 'data': ret, 'error': None}
+        except Exception as e:
+            logger.warning("Request %s failed: %r" %(rid, e))
+            return {'id': rid, 'ok': False, 'code': None, 'data': None, 'error': "%s: %s" %(type(e).__name__, e)}
+
+    def __batch(self, calls, policy:str):
+        # Hold locks of all devices in the batch until it is done, so batches never interleave on a device,
+        # locks are taken in sorted order to avoid deadlock between batches of overlapping devices
+        calls = self.__dispatcher.expandCalls(calls)
+        sns = sorted({args[0] for _, args in calls if args and isinstance(args[0], str)})
+        locks = [self.lock(sn) for sn in sns]
+        for lock in locks:
+            lock.acquire()
+        try:
+            return self.__dispatcher.batch(calls, policy)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def start(self):
+        """Serve on a background thread"""
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        logger.info("Control server listening on %s (%s)" %(self.address, "msgpack" if msgpack else "JSON"))
+
+    def serveForever(self):
+        """Serve on current thread until Ctrl+C"""
+        logger.info("Control server listening on %s (%s)" %(self.address, "msgpack" if msgpack else "JSON"))
+        try:
+            self.__server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Control server stopped")
+        finally:
+            self.__server.server_close()
+
+    def close(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+class TMYControlClient():
+    def __init__(self, host:str="127.0.0.1", port:int=5004, unix_path:str=None, timeout:float=30.0, codec:int=None):
+        """
+        Client of TMYControlServer, one connection could be shared by threads.
+
+        Args:
+            host (str, optional): Server address. Defaults to "127.0.0.1".
+            port (int, optional): Server port. Defaults to 5004.
+            unix_path (str, optional): Connect Unix socket path instead of TCP. Defaults to None.
+            timeout (float, optional): Seconds to wait reply. Defaults to 30.0.
+            codec (int, optional): MSGPACK or JSON. Defaults to msgpack if installed.
+        """
+        if unix_path:
+            self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.__sock.settimeout(timeout)
+            self.__sock.connect(unix_path)
+        else:
+            self.__sock = socket.create_connection((host, port), timeout=timeout)
+        self.__codec = codec
+        self.__lock = threading.Lock()
+        self.__seq = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __request(self, req:dict):
+        with self.__lock:
+            self.__seq += 1
+            req['id'] = self.__seq
+            self.__sock.sendall(encode(req, self.__codec))
+            frame = recvFrame(self.__sock)
+        if frame is None:
+            raise ConnectionError("Control server closed connection")
+        return frame[1]
+
+    def call(self, method:str, *args, **kwargs):
+        """
+        Call service function, e.g. call("setRFMode", sn, "RFMode.TX")
+
+        Returns:
+            dict: {'id', 'ok', 'code', 'data', 'error'}
+        """
+        return self.__request({'method': method, 'args': list(args), 'kwargs': kwargs})
+
+    def batch(self, calls, policy:str="stop"):
+        """
+        Call several functions in one round trip, see TMYDispatcher.expandCalls() for calls.
+
+        Returns:
+            dict: {'id', 'ok', 'executed', 'failed', 'elapsed', 'results'}
+        """
+        if isinstance(calls, dict):
+            calls = {k: (v.tolist() if hasattr(v, "tolist") else v) for k, v in calls.items()}
+        else:
+            calls = [list(c) for c in calls]
+        return self.__request({'batch': calls, 'policy': policy})
+
+    def close(self):
+        self.__sock.close()
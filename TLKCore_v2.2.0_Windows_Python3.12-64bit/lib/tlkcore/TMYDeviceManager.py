@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+import time
+
+from tlkcore.TMYPublic import RetCode
+
+logger = logging.getLogger("TMYDeviceManager")
+
+class TMYDeviceManager():
+    def __init__(self, service, max_workers:int=4, timeout:float=30.0):
+        """
+        Bring up several devices concurrently with bounded daemon worker threads,
+        access of same device is serialized by its lock.
+
+        Args:
+            service (TLKCoreService): Service instance
+            max_workers (int, optional): Max devices initialized at the same time. Defaults to 4.
+            timeout (float, optional): Max seconds of each device bring-up. Defaults to 30.0.
+        """
+        self.__service = service
+        self.__max_workers = max_workers
+        self.__timeout = timeout
+        self.__locks = {}
+        self.__locks_lock = threading.Lock()
+        # Readiness of each device of all bringUp() calls: {sn: {'ready', 'init_time', 'elapsed', 'error', ...}}
+        self.report = {}
+
+    def lock(self, sn:str):
+        """Lock of sn, hold it while accessing the device from several threads"""
+        with self.__locks_lock:
+            return self.__locks.setdefault(sn, threading.Lock())
+
+    def call(self, sn:str, func_name:str, *args, **kwargs):
+        """Call service function of sn with its lock held"""
+        with self.lock(sn):
+            return getattr(self.__service, func_name)(sn, *args, **kwargs)
+
+    def __bringUp(self, sn:str, info):
+        status = {'ready': False, 'init_time': None, 'error': None, 'initialized': False}
+        start = time.perf_counter()
+        # Init with address and devtype if known, it skips searching the device again
+        ret = self.call(sn, "initDev", *info) if info else self.call(sn, "initDev")
+        status['init_time'] = time.perf_counter() - start
+        if ret.RetCode is not RetCode.OK:
+            status['error'] = "initDev: [%s] %s" %(ret.RetCode, ret.RetMsg)
+            return status
+        status['initialized'] = True
+
+        # Simple queries to make sure device responds
+        status['dev_name'] = self.call(sn, "getDevTypeName")
+        for name in ("queryFWVer", "queryHWVer"):
+            ret = self.call(sn, name)
+            if ret.RetCode is not RetCode.OK:
+                status['error'] = "%s: [%s] %s" %(name, ret.RetCode, ret.RetMsg)
+                return status
+            status[name] = ret.RetData
+        status['ready'] = True
+        return status
+
+    def __worker(self, jobs:queue.Queue, state:dict):
+        """Bring up devices from jobs until empty, results of abandoned devices are released"""
+        cond = state['cond']
+        while True:
+            try:
+                sn, info = jobs.get_nowait()
+            except queue.Empty:
+                return
+            with cond:
+                state['started'][sn] = time.monotonic()
+            try:
+                status = self.__bringUp(sn, info)
+            except Exception as e:
+                logger.exception("Bring up %s failed" %sn)
+                status = {'ready': False, 'init_time': None, 'error': repr(e), 'initialized': False}
+            with cond:
+                late = sn in state['abandoned']
+                if not late:
+                    state['finished'][sn] = status
+                    cond.notify()
+            if late:
+                self.__release(sn, status)
+
+    def __release(self, sn:str, status:dict):
+        """Device finished bring-up after its timeout, it is not reported ready so close it"""
+        if not status.get('initialized'):
+            logger.warning("Bring up %s finished after timeout: %s" %(sn, status['error']))
+            return
+        ret = self.call(sn, "DeInitDev")
+        logger.warning("Bring up %s finished after timeout, DeInitDev: %s" %(sn, ret.RetCode))
+
+    def __spawn(self, jobs:queue.Queue, state:dict):
+        # Daemon threads never block interpreter exit even if a device hangs
+        t = threading.Thread(target=self.__worker, args=(jobs, state), daemon=True,
+                             name="BringUp-%d" %len(state['threads']))
+        state['threads'].append(t)
+        t.start()
+
+    def bringUp(self, devices):
+        """
+        Init and query devices concurrently. Devices running over timeout are reported not ready,
+        their worker threads are left behind and the device is DeInitDev() if it is initialized later.
+
+        Args:
+            devices (dict or list): {sn: (addr, devtype)} e.g. getScanInfo().RetData, or list of sn
+
+        Returns:
+            dict: {sn: {'ready', 'init_time', 'elapsed', 'error', 'dev_name', 'queryFWVer', 'queryHWVer'}}
+        """
+        if not isinstance(devices, dict):
+            devices = {sn: None for sn in devices}
+        report = {}
+        start = time.perf_counter()
+        jobs = queue.Queue()
+        for item in devices.items():
+            jobs.put(item)
+        cond = threading.Condition()
+        state = {'cond': cond, 'started': {}, 'finished': {}, 'abandoned': set(), 'threads': []}
+        for _ in range(min(self.__max_workers, len(devices))):
+            self.__spawn(jobs, state)
+
+        pending = set(devices)
+        try:
+            with cond:
+                while pending:
+                    now = time.monotonic()
+                    for sn in [sn for sn in pending if sn in state['finished']]:
+                        pending.discard(sn)
+                        report[sn] = state['finished'].pop(sn)
+                        report[sn]['elapsed'] = now - state['started'][sn]
+                    # Give up devices running over timeout, a new worker takes over the remaining devices
+                    for sn in [sn for sn in pending if sn in state['started']]:
+                        if now - state['started'][sn] > self.__timeout:
+                            pending.discard(sn)
+                            state['abandoned'].add(sn)
+                            report[sn] = {'ready': False, 'init_time': None, 'elapsed': now - state['started'][sn],
+                                          'error': "Timeout after %.1fs" %self.__timeout, 'initialized': False}
+                            logger.error("Bring up %s timeout" %sn)
+                            if not jobs.empty():
+                                self.__spawn(jobs, state)
+                    if pending:
+                        cond.wait(0.1)
+        finally:
+            # Interrupted: skip devices not started yet, release the started ones once they finish
+            with cond:
+                while not jobs.empty():
+                    sn, _ = jobs.get_nowait()
+                    pending.discard(sn)
+                state['abandoned'].update(pending)
+
+        for s in report.values():
+            s.pop('initialized', None)
+        self.report.update(report)
+        ready = [sn for sn, s in report.items() if s['ready']]
+        logger.info("Bring up %d/%d devices ready in %.3fs" %(len(ready), len(report), time.perf_counter() - start))
+        for sn, s in report.items():
+            logger.info("  %s: %s, init %s, elapsed %.3fs%s"
+                        %(sn, "ready" if s['ready'] else "NOT ready",
+                          "-" if s['init_time'] is None else "%.3fs" %s['init_time'], s['elapsed'],
+                          "" if s['error'] is None else ", " + s['error']))
+        return report
+
+    def getReady(self):
+        """SN list of ready devices"""
+        return [sn for sn, s in self.report.items() if s['ready']]
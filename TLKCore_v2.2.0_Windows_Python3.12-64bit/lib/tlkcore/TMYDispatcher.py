@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from enum import Enum
+
+from tlkcore import TMYPublic
+
+logger = logging.getLogger("TMYDispatcher")
+
+class TMYDispatchError(Exception):
+    """Error of dispatching itself, raised before calling any service function"""
+
+class TMYUnsupportedFuncError(TMYDispatchError, AttributeError):
+    """Service does not support the function name"""
+
+class TMYEnumTokenError(TMYDispatchError, ValueError):
+    """Token like "RFMode.XX" names a known enum but not its member"""
+
+def getEnumTokens(module=TMYPublic):
+    """All enum members of module, e.g. {"RFMode.TX": RFMode.TX, ...}"""
+    tokens = {}
+    for name, obj in vars(module).items():
+        if isinstance(obj, type) and issubclass(obj, Enum) and obj.__module__ == module.__name__:
+            for member_name, member in obj.__members__.items():
+                tokens["%s.%s" %(name, member_name)] = member
+    return tokens
+
+class TMYDispatcher():
+    def __init__(self, service, tokens:dict=None):
+        """
+        Call TLKCoreService functions by name for external tools (LabVIEW/MATLAB),
+        bound methods and enum tokens like "RFMode.TX" are resolved once instead of per call.
+
+        Args:
+            service (TLKCoreService): Service instance
+            tokens (dict, optional): Enum tokens {"RFMode.TX": RFMode.TX}. Defaults to all enums of TMYPublic.
+        """
+        self.__service = service
+        self.__tokens = getEnumTokens() if tokens is None else tokens
+        # Enum names of tokens, only "<enum name>.<member>" strings are parsed
+        self.__enums = {t.split('.', 1)[0] for t in self.__tokens}
+        self.__methods = {}
+        for name in dir(service):
+            if name.startswith("_"):
+                continue
+            attr = getattr(service, name, None)
+            if callable(attr):
+                self.__methods[name] = attr
+        self.__lock = threading.Lock()
+        # {func_name: [calls, errors, total seconds, max seconds]}
+        self.__stats = {}
+
+    @property
+    def service(self):
+        return self.__service
+
+    def hasFunc(self, func_name:str):
+        return self.__resolve(func_name) is not None
+
+    def __resolve(self, func_name:str):
+        method = self.__methods.get(func_name)
+        if method is None and not func_name.startswith("_"):
+            # Dynamic attributes not listed by dir()
+            method = getattr(self.__service, func_name, None)
+            if callable(method):
+                self.__methods[func_name] = method
+            else:
+                method = None
+        return method
+
+    def parseToken(self, p):
+        """
+        Enum member of token like "RFMode.TX", other values (e.g. IP address, path) are returned as is.
+
+        Raises:
+            TMYEnumTokenError: if p starts with a known enum name but the member is unknown
+        """
+        if type(p) is not str or '.' not in p or p.split('.', 1)[0] not in self.__enums:
+            return p
+        try:
+            return self.__tokens[p]
+        except KeyError:
+            raise TMYEnumTokenError("Unknown enum token: %s" %p) from None
+
+    def parseArgs(self, args):
+        """
+        Replace enum tokens like "RFMode.TX" of args into enum members, first arg (sn) is kept.
+
+        Raises:
+            TMYEnumTokenError: if a token names a known enum but not its member
+        """
+        args = list(args)
+        for i in range(1, len(args)):
+            args[i] = self.parseToken(args[i])
+        return args
+
+    def call(self, func_name:str, *args, **kwargs):
+        """
+        Call service function with parsed args and kwargs.
+
+        Raises:
+            TMYUnsupportedFuncError: if service not support func_name
+            TMYEnumTokenError: if a enum token is invalid
+            Exception: raised by the service function itself
+        """
+        start = time.perf_counter()
+        error = False
+        try:
+            method = self.__resolve(func_name)
+            if method is None:
+                raise TMYUnsupportedFuncError("TLKCoreService not support function name: %s()" %func_name)
+            ret = method(*self.parseArgs(args), **{k: self.parseToken(v) for k, v in kwargs.items()})
+            error = getattr(ret, "RetCode", TMYPublic.RetCode.OK) is not TMYPublic.RetCode.OK
+            return ret
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.__lock:
+                s = self.__stats.setdefault(func_name, [0, 0, 0.0, 0.0])
+                s[0] += 1
+                s[1] += error
+                s[2] += elapsed
+                s[3] = max(s[3], elapsed)
+
+    @staticmethod
+    def expandCalls(calls):
+        """
+        Normalize batch payload into [(func_name, args), ...].
+
+        Args:
+            calls (list or dict): [(func_name, args), ...] or [(func_name, arg1, arg2...), ...],
+                                  or compact {'func': func_name, 'sn': sn, 'rows': 2D array of args after sn}
+        """
+        if isinstance(calls, dict):
+            func_name = calls['func']
+            sn = calls.get('sn')
+            rows = calls['rows']
+            rows = rows.tolist() if hasattr(rows, "tolist") else rows
+            head = () if sn is None else (sn,)
+            return [(func_name, head + tuple(row if isinstance(row, (list, tuple)) else [row])) for row in rows]
+        expanded = []
+        for call in calls:
+            call = list(call)
+            if len(call) == 2 and isinstance(call[1], (list, tuple)):
+                expanded.append((call[0], tuple(call[1])))
+            else:
+                expanded.append((call[0], tuple(call[1:])))
+        return expanded
+
+    def batch(self, calls, policy:str="stop", call=None):
+        """
+        Call several functions in order.
+
+        Args:
+            calls (list or dict): See expandCalls()
+            policy (str, optional): "stop" at first error or "continue" with remaining calls. Defaults to "stop".
+            call (callable, optional): call(func_name, *args) to execute each call, e.g. with locks. Defaults to self.call.
+
+        Returns:
+            dict: {'ok': all succeeded, 'executed': calls executed, 'failed': failed count, 'elapsed': seconds,
+                   'results': [{'func', 'ok', 'code', 'data', 'error'}, ...] of executed calls}
+        """
+        if policy not in ("stop", "continue"):
+            raise ValueError("Invalid batch policy: %s" %policy)
+        call = self.call if call is None else call
+        start = time.perf_counter()
+        results = []
+        failed = 0
+        for func_name, args in self.expandCalls(calls):
+            item = {'func': func_name, 'ok': True, 'code': None, 'data': None, 'error': None}
+            try:
+                ret = call(func_name, *args)
+                if hasattr(ret, "RetCode"):
+                    item['code'] = str(ret.RetCode)
+                    item['data'] = ret.RetData
+                    if ret.RetCode is not TMYPublic.RetCode.OK:
+                        item['ok'] = False
+                        item['error'] = ret.RetMsg
+                else:
+                    item['data'] = ret
+            except Exception as e:
+                item['ok'] = False
+                item['error'] = "%s: %s" %(type(e).__name__, e)
+            results.append(item)
+            if not item['ok']:
+                failed += 1
+                logger.error("Batch call %d %s() failed: %s" %(len(results), func_name, item['error']))
+                if policy == "stop":
+                    break
+        return {
+            'ok': failed == 0,
+            'executed': len(results),
+            'failed': failed,
+            'elapsed': time.perf_counter() - start,
+            'results': results,
+        }
+
+    def getStats(self):
+        """
+        Per function latency statistics.
+
+        Returns:
+            dict: {func_name: {'calls', 'errors', 'mean', 'max'}} in seconds
+        """
+        with self.__lock:
+            return {name: {'calls': c, 'errors': e, 'mean': t / c if c else 0.0, 'max': m}
+                    for name, (c, e, t, m) in self.__stats.items()}
+
+    def resetStats(self):
+        with self.__lock:
+            self.__stats.clear()
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import re
+import time
+
+from tlkcore.TMYPublic import DevInterface
+
+logger = logging.getLogger("TMYInventory")
+
+class TMYInventory():
+    def __init__(self, path:str="files/inventory.json", ttl:float=24*3600):
+        """
+        Persistent scan results {sn: (address, devtype)}, known devices could be connected
+        directly by initDev(sn, address, devtype) on next start instead of scanning all interfaces.
+
+        Args:
+            path (str, optional): Inventory file. Defaults to "files/inventory.json".
+            ttl (float, optional): Seconds before inventory expires and full scan is required. Defaults to 24*3600.
+        """
+        self.__path = path
+        self.__ttl = ttl
+        # Scan time and failed devices of last loaded inventory
+        self.time = None
+        self.failed = set()
+
+    def load(self):
+        """
+        Load inventory, its scan time is kept in self.time and devices failed last time in self.failed.
+
+        Returns:
+            dict: {sn: (address, devtype)} including failed devices, or None if not exist, expired or broken
+        """
+        self.time = None
+        self.failed = set()
+        if not os.path.exists(self.__path):
+            return None
+        try:
+            with open(self.__path) as f:
+                data = json.load(f)
+            age = time.time() - data['time']
+            if age > self.__ttl:
+                logger.info("Inventory expired: %.0fs > %.0fs" %(age, self.__ttl))
+                return None
+            devices = {sn: (addr, int(devtype)) for sn, (addr, devtype) in data['devices'].items()}
+            self.time = data['time']
+            self.failed = set(data.get('failed', [])) & set(devices)
+            return devices
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Invalid inventory: %s" %self.__path)
+            return None
+
+    def save(self, devices:dict, failed=(), scan_time:float=None):
+        """
+        Replace inventory with {sn: (address, devtype)}.
+
+        Args:
+            devices (dict): {sn: (address, devtype)} of all known devices
+            failed (iterable, optional): SN of devices not ready, kept in inventory but marked failed. Defaults to ().
+            scan_time (float, optional): Time of the full scan which found devices, keep the loaded self.time
+                                         so ttl counts from the last full scan. Defaults to now.
+        """
+        scan_time = time.time() if scan_time is None else scan_time
+        failed = sorted(set(failed) & set(devices))
+        os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+        tmp = self.__path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'time': scan_time,
+                       'devices': {sn: [addr, devtype] for sn, (addr, devtype) in devices.items()},
+                       'failed': failed}, f, indent=2)
+        os.replace(tmp, self.__path)
+        logger.info("Saved %d devices (%d failed) into inventory: %s" %(len(devices), len(failed), self.__path))
+
+    def clear(self):
+        """Force full scan on next start"""
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+
+    @staticmethod
+    def getInterface(address:str):
+        """Guess connect interface of device address"""
+        address = str(address)
+        if re.fullmatch(r"\d{1,3}(\.\d{1,3}){3}", address):
+            return DevInterface.LAN
+        if address.upper().startswith("COM") or address.startswith("/dev/tty"):
+            return DevInterface.COMPORT
+        return DevInterface.USB
+
+    @staticmethod
+    def getScope(devices:dict):
+        """Interfaces to rescan for devices {sn: (address, devtype)}"""
+        scope = DevInterface.UNKNOWN
+        for addr, _ in devices.values():
+            scope |= TMYInventory.getInterface(addr)
+        return scope
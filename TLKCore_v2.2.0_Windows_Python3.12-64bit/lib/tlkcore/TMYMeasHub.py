@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import threading
+import time
+
+from tlkcore.TMYMeasProtocol import REPLY, REQUEST, TMYFrameReader, packFrame
+
+logger = logging.getLogger("TMYMeasHub")
+
+class _Client():
+    """One connected measurement client with its outstanding requests"""
+    def __init__(self, name:str, reader, writer):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.frames = TMYFrameReader()
+        self.seq = 0
+        self.pending = {}
+
+class TMYMeasHub():
+    def __init__(self, host:str="0.0.0.0", port:int=5003, timeout:float=5.0, reduce=max):
+        """
+        Asyncio measurement hub, accepts several measurement clients (receive antennas, spectrum analysers),
+        fans out each sweep step to all of them and gathers replies with per-client timeout.
+        Provides the same exchange() as TMYMeasLink, so sweeps could use it directly.
+
+        Args:
+            host (str, optional): Bind address. Defaults to "0.0.0.0".
+            port (int, optional): Bind port. Defaults to 5003.
+            timeout (float, optional): Seconds to wait reply of each client. Defaults to 5.0.
+            reduce (callable, optional): Combine valid powers of clients into one value for exchange(). Defaults to max.
+        """
+        self.__host = host
+        self.__port = port
+        self.__timeout = timeout
+        self.__reduce = reduce
+        self.__clients = {}
+        self.__loop = None
+        self.__server = None
+        self.__thread = None
+        self.__ready = threading.Event()
+        # Results of each client by tag: {name: {tag: {id: (value, power)}}}, one entry per step id
+        self.records = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def address(self):
+        """Bound (host, port), port 0 gets any free port"""
+        return self.__server.sockets[0].getsockname()[:2]
+
+    def start(self):
+        """Run event loop on a background thread"""
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        self.__ready.wait()
+        logger.info("Measurement hub listening on %s:%d" %self.address)
+
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__server = self.__loop.run_until_complete(
+            asyncio.start_server(self.__accept, self.__host, self.__port))
+        self.__ready.set()
+        self.__loop.run_forever()
+
+    async def __accept(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        name = "%s:%d" %(peer[0], peer[1])
+        client = _Client(name, reader, writer)
+        self.__clients[name] = client
+        self.records.setdefault(name, {})
+        logger.info("Measurement client connected: %s" %name)
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for msg_type, records in client.frames.feed(data):
+                    if msg_type != REPLY:
+                        continue
+                    for seq, id, timestamp, value in records:
+                        fut = client.pending.pop(seq, None)
+                        if fut is not None and not fut.done():
+                            fut.set_result(value)
+        except (ConnectionError, ValueError) as e:
+            logger.warning("Measurement client %s error: %s" %(name, e))
+        finally:
+            self.__clients.pop(name, None)
+            for fut in client.pending.values():
+                fut.cancel()
+            writer.close()
+            logger.info("Measurement client disconnected: %s" %name)
+
+    async def __ask(self, client:_Client, id:int, value:float):
+        client.seq = (client.seq + 1) & 0xFFFFFFFF
+        seq = client.seq
+        fut = self.__loop.create_future()
+        client.pending[seq] = fut
+        try:
+            client.writer.write(packFrame(REQUEST, [(seq, id, time.time(), float(value))]))
+            await client.writer.drain()
+            return await asyncio.wait_for(fut, self.__timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError, ConnectionError):
+            logger.warning("No reply from %s for id %d" %(client.name, id))
+            return None
+        finally:
+            client.pending.pop(seq, None)
+
+    async def __fanout(self, id:int, value:float):
+        clients = list(self.__clients.values())
+        powers = await asyncio.gather(*[self.__ask(c, id, value) for c in clients])
+        return {c.name: p for c, p in zip(clients, powers)}
+
+    def waitClients(self, n:int, timeout:float=None):
+        """Block until n clients connected, returns connected count"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self.__clients) < n:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        return len(self.__clients)
+
+    def step(self, id:int, value:float, tag:str="sweep"):
+        """
+        Fan out one step to all clients.
+
+        Args:
+            id (int): Step id, e.g. flat index of codebook
+            value (float): Tag value of step, e.g. phi
+            tag (str, optional): Record results under tag, ids of different tags could collide,
+                                 None to skip recording. Defaults to "sweep".
+
+        Returns:
+            dict: {client name: power or None}
+        """
+        result = asyncio.run_coroutine_threadsafe(self.__fanout(id, value), self.__loop).result()
+        if tag is not None:
+            for name, power in result.items():
+                # Polls of one step (e.g. by settle detector) replace each other, the last valid one is kept
+                records = self.records.setdefault(name, {}).setdefault(tag, {})
+                if power is not None or id not in records:
+                    records[id] = (value, power)
+        return result
+
+    def exchange(self, id:int, value:float, tag:str="sweep"):
+        """Fan out then combine valid powers by reduce, None if no valid reply"""
+        powers = [p for p in self.step(id, value, tag).values() if p is not None]
+        return self.__reduce(powers) if powers else None
+
+    def top(self, tag:str="sweep", n:int=3):
+        """
+        Best n steps of each client under tag.
+
+        Returns:
+            dict: {client name: [(id, value, power), ...]}
+        """
+        top = {}
+        for name, tags in self.records.items():
+            valid = [(id, value, power) for id, (value, power) in tags.get(tag, {}).items() if power is not None]
+            top[name] = sorted(valid, key=lambda r: r[2], reverse=True)[:n]
+        return top
+
+    def close(self):
+        if self.__loop is None:
+            return
+        async def shutdown():
+            self.__server.close()
+            for c in list(self.__clients.values()):
+                c.writer.close()
+            await self.__server.wait_closed()
+        asyncio.run_coroutine_threadsafe(shutdown(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+        self.__loop = None
@@ -0,0 +1,215 @@
+"""
+Length-prefixed binary protocol for the measurement socket (port 5003).
+
+    frame   := length(uint32) payload
+    payload := version(uint8) type(uint8) count(uint16) record * count
+    record  := seq(uint32) id(uint32) timestamp(float64) value(float64)
+
+A REQUEST record carries the pattern/angle id and its tag value (e.g. phi or theta),
+a REPLY record echoes seq and id of the request with the measured power,
+several records could be batched in one frame.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+
+logger = logging.getLogger("TMYMeasProtocol")
+
+VERSION = 1
+REQUEST = 1
+REPLY = 2
+
+_LENGTH = struct.Struct("!I")
+_HEADER = struct.Struct("!BBH")
+_RECORD = struct.Struct("!IIdd")
+MAX_RECORDS = 0xFFFF
+
+def packFrame(msg_type:int, records):
+    """
+    Pack records into one frame.
+
+    Args:
+        msg_type (int): REQUEST or REPLY
+        records (list): [(seq, id, timestamp, value), ...]
+
+    Returns:
+        bytes: frame with length prefix
+    """
+    if len(records) > MAX_RECORDS:
+        raise ValueError("Too many records in one frame: %d" %len(records))
+    payload = bytearray(_HEADER.pack(VERSION, msg_type, len(records)))
+    for seq, id, timestamp, value in records:
+        payload += _RECORD.pack(seq & 0xFFFFFFFF, id & 0xFFFFFFFF, timestamp, value)
+    return _LENGTH.pack(len(payload)) + payload
+
+class TMYFrameReader():
+    """Reassemble frames from a byte stream, handles partial reads and coalesced frames"""
+    def __init__(self):
+        self.__buf = bytearray()
+
+    def feed(self, data:bytes):
+        """
+        Append received bytes.
+
+        Returns:
+            list: [(msg_type, [(seq, id, timestamp, value), ...]), ...] of complete frames
+        """
+        self.__buf += data
+        frames = []
+        while len(self.__buf) >= _LENGTH.size:
+            length, = _LENGTH.unpack_from(self.__buf)
+            end = _LENGTH.size + length
+            if len(self.__buf) < end:
+                break
+            version, msg_type, count = _HEADER.unpack_from(self.__buf, _LENGTH.size)
+            if version != VERSION or length != _HEADER.size + count * _RECORD.size:
+                self.__buf.clear()
+                raise ValueError("Invalid frame: version %d, length %d, count %d" %(version, length, count))
+            offset = _LENGTH.size + _HEADER.size
+            records = [_RECORD.unpack_from(self.__buf, offset + i * _RECORD.size) for i in range(count)]
+            frames.append((msg_type, records))
+            del self.__buf[:end]
+        return frames
+
+class TMYMeasLink():
+    def __init__(self, conn:socket.socket, timeout:float=5.0):
+        """
+        Server side of measurement socket, sends REQUEST records and matches REPLY records by seq.
+
+        Args:
+            conn (socket.socket): Connected socket of measurement client
+            timeout (float, optional): Seconds to wait replies. Defaults to 5.0.
+        """
+        self.__conn = conn
+        self.__timeout = timeout
+        self.__reader = TMYFrameReader()
+        self.__seq = 0
+        # Requests waiting replies, late replies of abandoned requests are dropped
+        self.__pending = set()
+        # Replies arrived but not fetched yet, keyed by seq
+        self.__replies = {}
+
+    def request(self, id:int, value:float):
+        """Send one request, returns its seq"""
+        return self.requestBatch([(id, value)])[0]
+
+    def requestBatch(self, items):
+        """Send [(id, value), ...] in one frame, returns list of seq"""
+        now = time.time()
+        records = []
+        for id, value in items:
+            self.__seq = (self.__seq + 1) & 0xFFFFFFFF
+            records.append((self.__seq, id, now, float(value)))
+            self.__pending.add(self.__seq)
+        self.__conn.sendall(packFrame(REQUEST, records))
+        return [r[0] for r in records]
+
+    def __poll(self, deadline:float):
+        remain = deadline - time.monotonic()
+        if remain <= 0:
+            raise socket.timeout("Measurement reply timeout")
+        self.__conn.settimeout(remain)
+        data = self.__conn.recv(65536)
+        if not data:
+            raise ConnectionError("Measurement client disconnected")
+        for msg_type, records in self.__reader.feed(data):
+            if msg_type != REPLY:
+                logger.warning("Unexpected frame type: %d" %msg_type)
+                continue
+            for seq, id, timestamp, value in records:
+                if seq in self.__pending:
+                    self.__replies[seq] = (id, timestamp, value)
+
+    def wait(self, seqs):
+        """
+        Wait replies of seqs.
+
+        Returns:
+            list: [(id, timestamp, value), ...] in order of seqs
+        """
+        deadline = time.monotonic() + self.__timeout
+        try:
+            while any(seq not in self.__replies for seq in seqs):
+                self.__poll(deadline)
+            return [self.__replies.pop(seq) for seq in seqs]
+        finally:
+            self.__pending.difference_update(seqs)
+            for seq in seqs:
+                self.__replies.pop(seq, None)
+
+    def exchange(self, id:int, value:float):
+        """Request then wait, returns measured power or None if timeout"""
+        try:
+            return self.wait([self.request(id, value)])[0][2]
+        except socket.timeout:
+            logger.warning("No reply for id %d" %id)
+            return None
+
+class TMYTextLink():
+    """Legacy text exchange with same interface as TMYMeasLink, for clients not upgraded yet"""
+    def __init__(self, conn:socket.socket, timeout:float=None):
+        self.__conn = conn
+        self.__conn.settimeout(timeout)
+
+    def exchange(self, id:int, value:float):
+        self.__conn.sendall(f"{value}".encode())
+        data = self.__conn.recv(1024)
+        try:
+            return float(data.decode())
+        except ValueError:
+            logger.warning(f"Invalid power value received: {data.decode()}")
+            return None
+
+def serveReceiver(conn:socket.socket, respond):
+    """
+    Client side loop of measurement socket, replies each request with respond(id, value),
+    until the server closes connection.
+
+    Args:
+        conn (socket.socket): Socket connected to the sweep server
+        respond (callable): respond(id, value) returns measured power
+    """
+    reader = TMYFrameReader()
+    while True:
+        data = conn.recv(65536)
+        if not data:
+            break
+        for msg_type, records in reader.feed(data):
+            if msg_type != REQUEST:
+                continue
+            replies = [(seq, id, time.time(), float(respond(id, value))) for seq, id, _, value in records]
+            conn.sendall(packFrame(REPLY, replies))
+
+class TMYLoopbackReceiver(threading.Thread):
+    def __init__(self, respond, host:str="127.0.0.1", port:int=5003):
+        """
+        Local receiver for testing without measurement PC, connects to the sweep server
+        then replies with respond(id, value).
+
+        Args:
+            respond (callable): respond(id, value) returns simulated power
+            host (str, optional): Sweep server address. Defaults to "127.0.0.1".
+            port (int, optional): Sweep server port. Defaults to 5003.
+        """
+        super().__init__(daemon=True)
+        self.__respond = respond
+        self.__addr = (host, port)
+
+    def run(self):
+        for _ in range(50):
+            try:
+                conn = socket.create_connection(self.__addr)
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+        else:
+            logger.error("Loopback receiver can not connect to %s:%d" %self.__addr)
+            return
+        with conn:
+            try:
+                serveReceiver(conn, self.__respond)
+            except OSError:
+                pass
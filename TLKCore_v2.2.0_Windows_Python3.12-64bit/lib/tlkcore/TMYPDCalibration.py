@@ -0,0 +1,88 @@
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger("TMYPDCalibration")
+
+_UNITS = {"GHZ": 1.0, "MHZ": 1e-3, "KHZ": 1e-6, "HZ": 1e-9}
+
+class TMYPDCalibration():
+    def __init__(self, cali_config:dict):
+        """
+        Local power detector calibration, same table as setCaliConfig(), converts
+        voltage readings to dBm offline without device round trips.
+        Each frequency defines a line in dB domain through (lowVolt, lowPower) and (highVolt, highPower),
+        calibration points are linearly interpolated across frequency and held beyond the table ends.
+
+        Args:
+            cali_config (dict): {"28GHz": {"lowPower": -36, "lowVolt": 83.81, "highPower": -5, "highVolt": 979.71}, ...}
+        """
+        points = []
+        for freq, config in cali_config.items():
+            points.append((self.parseFreq(freq), config["lowPower"], config["lowVolt"],
+                           config["highPower"], config["highVolt"]))
+        if len(points) == 0:
+            raise ValueError("Empty calibration config")
+        table = np.array(sorted(points), dtype=np.float64)
+        # Columns: freq(GHz), lowPower, lowVolt, highPower, highVolt
+        self.freqs = table[:, 0]
+        self.__table = table[:, 1:]
+        bad = self.__table[:, 3] <= self.__table[:, 1]
+        if bad.any():
+            raise ValueError("highVolt must be greater than lowVolt at %s GHz" %self.freqs[bad].tolist())
+
+    @staticmethod
+    def parseFreq(freq):
+        """Frequency key like "28GHz", "500MHz" or number in GHz, returns GHz as float"""
+        if isinstance(freq, (int, float)):
+            return float(freq)
+        m = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([A-Za-z]*)\s*", str(freq))
+        unit = m.group(2).upper() if m else None
+        if m is None or (unit and unit not in _UNITS):
+            raise ValueError("Invalid frequency: %s" %freq)
+        return float(m.group(1)) * _UNITS.get(unit, 1.0)
+
+    def getPoints(self, freq):
+        """
+        Calibration points at freq.
+
+        Args:
+            freq (float or array): Frequency in GHz
+
+        Returns:
+            tuple: (lowPower, lowVolt, highPower, highVolt), arrays if freq is array
+        """
+        freq = np.asarray(freq, dtype=np.float64)
+        return tuple(np.interp(freq, self.freqs, self.__table[:, i]) for i in range(4))
+
+    def getLine(self, freq):
+        """Returns (slope in dB/mV, offset in dBm) of freq, power = slope * volt + offset"""
+        low_p, low_v, high_p, high_v = self.getPoints(freq)
+        slope = (high_p - low_p) / (high_v - low_v)
+        return slope, low_p - slope * low_v
+
+    def toPower(self, volts, freq, clip:bool=False):
+        """
+        Convert voltage readings to power.
+
+        Args:
+            volts (array_like): Voltage readings in mV of getVoltageValue(), any shape
+            freq (float or array_like): Frequency in GHz, scalar or broadcastable to volts
+            clip (bool, optional): Clamp to calibrated power range. Defaults to False.
+
+        Returns:
+            np.ndarray: Power in dBm, same shape as volts
+        """
+        volts = np.asarray(volts, dtype=np.float64)
+        slope, offset = self.getLine(freq)
+        power = slope * volts + offset
+        if clip:
+            low_p, _, high_p, _ = self.getPoints(freq)
+            power = np.clip(power, low_p, high_p)
+        return power
+
+    def toVoltage(self, power, freq):
+        """Inverse of toPower(), returns expected voltage in mV of power in dBm"""
+        slope, offset = self.getLine(freq)
+        return (np.asarray(power, dtype=np.float64) - offset) / slope
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from tlkcore.TMYRingBuffer import TMYRingBuffer
+
+logger = logging.getLogger("TMYPowerLogger")
+
+# One record per reading: epoch timestamp and power (NaN if reading failed)
+RECORD = np.dtype([('time', '<f8'), ('power', '<f4')])
+
+class TMYPowerLogger():
+    def __init__(self, read, root:str, prefix:str="power", windows=(100, 1000, 10000),
+                 flush_records:int=1000, flush_interval:float=1.0,
+                 chunk_records:int=1000000, report_interval:float=60.0, interval:float=0):
+        """
+        Headless power acquisition, samples as fast as read() allows and streams
+        records to append-only binary chunk files, keeps rolling statistics of latest readings.
+        Memory is bounded by the largest window and flush_records, so it could run for days.
+
+        Args:
+            read (callable): read() returns power, e.g. lambda: service.getPowerValue(sn, freq).RetData
+            root (str): Directory of chunk files
+            prefix (str, optional): Chunk file name prefix. Defaults to "power".
+            windows (tuple, optional): Readings of each rolling statistics window. Defaults to (100, 1000, 10000).
+            flush_records (int, optional): Write to file after this many records. Defaults to 1000.
+            flush_interval (float, optional): Or after this many seconds. Defaults to 1.0.
+            chunk_records (int, optional): Start a new chunk file after this many records. Defaults to 1000000.
+            report_interval (float, optional): Seconds between logging statistics, 0 to disable. Defaults to 60.0.
+            interval (float, optional): Seconds between readings, 0 for max rate. Defaults to 0.
+        """
+        self.__read = read
+        self.__root = root
+        self.__prefix = prefix
+        self.__windows = sorted(windows)
+        self.__flush_records = flush_records
+        self.__flush_interval = flush_interval
+        self.__chunk_records = chunk_records
+        self.__report_interval = report_interval
+        self.__interval = interval
+        self.__history = TMYRingBuffer(self.__windows[-1], 1, dtype=np.float32)
+        self.__staging = np.empty(flush_records, dtype=RECORD)
+        self.__staged = 0
+        self.__file = None
+        self.__chunk_written = 0
+        self.__stop = threading.Event()
+        # Readings taken, failed readings, chunk files written and path of the latest one,
+        # only the count is kept so memory stays flat however many chunks are written
+        self.count = 0
+        self.failures = 0
+        self.chunks = 0
+        self.path = None
+        os.makedirs(root, exist_ok=True)
+
+    def __open(self):
+        name = "%s_%s_%04d.bin" %(self.__prefix, time.strftime("%Y%m%d_%H%M%S"), self.chunks)
+        self.path = os.path.join(self.__root, name)
+        self.__file = open(self.path, 'ab')
+        self.__chunk_written = 0
+        self.chunks += 1
+        logger.info("Power log chunk: %s" %self.path)
+
+    def __flush(self):
+        if self.__staged == 0:
+            return
+        if self.__file is None:
+            self.__open()
+        self.__staging[:self.__staged].tofile(self.__file)
+        self.__file.flush()
+        self.__chunk_written += self.__staged
+        self.__staged = 0
+        if self.__chunk_written >= self.__chunk_records:
+            self.__file.close()
+            self.__file = None
+
+    def sample(self):
+        """Take one reading, returns power or None"""
+        try:
+            power = self.__read()
+            power = None if power is None else float(power)
+        except (ValueError, TypeError):
+            power = None
+        if power is None:
+            self.failures += 1
+        value = np.nan if power is None else power
+
+        if self.__staged == self.__flush_records:
+            self.__flush()
+        self.__staging[self.__staged] = (time.time(), value)
+        self.__staged += 1
+        self.__history.append(value)
+        self.count += 1
+        return power
+
+    def run(self, duration:float=None, count:int=None):
+        """
+        Acquire until stop(), Ctrl+C, duration or count reached.
+
+        Args:
+            duration (float, optional): Seconds to run. Defaults to None.
+            count (int, optional): Readings to take. Defaults to None.
+
+        Returns:
+            dict: getStats() at the end
+        """
+        self.__stop.clear()
+        start = time.monotonic()
+        last_flush = last_report = start
+        taken = 0
+        try:
+            while not self.__stop.is_set():
+                self.sample()
+                taken += 1
+                now = time.monotonic()
+                if self.__staged >= self.__flush_records or now - last_flush >= self.__flush_interval:
+                    self.__flush()
+                    last_flush = now
+                if self.__report_interval and now - last_report >= self.__report_interval:
+                    logger.info("Power stats: %s" %self.getStats())
+                    last_report = now
+                if (duration is not None and now - start >= duration) or (count is not None and taken >= count):
+                    break
+                if self.__interval:
+                    self.__stop.wait(self.__interval)
+        except KeyboardInterrupt:
+            logger.info("Power logging interrupted")
+        finally:
+            self.__flush()
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+        stats = self.getStats()
+        logger.info("Power logging done: %d readings, %d failures, stats: %s" %(self.count, self.failures, stats))
+        return stats
+
+    def stop(self):
+        """Stop run() from other thread"""
+        self.__stop.set()
+
+    def getStats(self, percentiles=(5, 50, 95)):
+        """
+        Rolling statistics of each window, NaN readings are ignored.
+
+        Returns:
+            dict: {window: {'n', 'min', 'max', 'mean', 'p5', 'p50', 'p95'}} or None for windows without valid readings
+        """
+        data = self.__history.snapshot()[:, 0]
+        stats = {}
+        for window in self.__windows:
+            values = data[-window:]
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                stats[window] = None
+                continue
+            stats[window] = {'n': len(values),
+                             'min': float(values.min()),
+                             'max': float(values.max()),
+                             'mean': float(values.mean())}
+            for p, v in zip(percentiles, np.percentile(values, percentiles)):
+                stats[window]['p%g' %p] = float(v)
+        return stats
+
+    @staticmethod
+    def load(path:str):
+        """Read records of a chunk file, returns structured array with 'time' and 'power' fields"""
+        return np.fromfile(path, dtype=RECORD)
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger("TMYRISCodebook")
+
+class TMYRISCodebook():
+    def __init__(self, antenna_size, freq:float, theta_in:float, phi_in:float,
+                 theta_list=range(0, 180, 1), phi_list=range(0, 360, 10),
+                 dx:float=None, dy:float=None, packed:np.ndarray=None):
+        """
+        1-bit RIS codebook, all reflection patterns of an angle grid are computed
+        in one batch and kept bit-packed, the sweep loop only indexes into it.
+
+        Args:
+            antenna_size (list): [row, col] of RIS module, from getRISModuleInfo()
+            freq (float): Operating frequency in Hz, e.g. 28e9
+            theta_in (float): Incident theta (elevation) in degrees
+            phi_in (float): Incident phi (azimuth) in degrees
+            theta_list (iterable, optional): Reflection theta grid in degrees. Defaults to range(0, 180, 1).
+            phi_list (iterable, optional): Reflection phi grid in degrees. Defaults to range(0, 360, 10).
+            dx (float, optional): Element spacing of x in meters. Defaults to half wavelength.
+            dy (float, optional): Element spacing of y in meters. Defaults to dx.
+            packed (np.ndarray, optional): Precomputed packed patterns, skip computing if assigned.
+        """
+        self.row, self.col = [int(n) for n in antenna_size]
+        self.freq = float(freq)
+        self.wavelength = 3e8 / self.freq
+        self.dx = self.wavelength / 2 if dx is None else float(dx)
+        self.dy = self.dx if dy is None else float(dy)
+        self.theta_in = float(theta_in)
+        self.phi_in = float(phi_in)
+        self.theta_list = np.asarray(list(theta_list))
+        self.phi_list = np.asarray(list(phi_list))
+
+        # Flatten grid as the order of nested loops: theta outside, phi inside
+        tt, pp = np.meshgrid(self.theta_list, self.phi_list, indexing='ij')
+        self.angles = np.column_stack((tt.ravel(), pp.ravel()))
+
+        if packed is None:
+            packed = self.__generate()
+        elif packed.shape != (len(self), self.nbytes):
+            raise ValueError("Packed patterns shape %s mismatch with codebook (%d, %d)"
+                             %(packed.shape, len(self), self.nbytes))
+        self.packed = packed
+
+    def __len__(self):
+        return len(self.theta_list) * len(self.phi_list)
+
+    @property
+    def shape(self):
+        """(n_theta, n_phi) of angle grid"""
+        return (len(self.theta_list), len(self.phi_list))
+
+    @property
+    def nbytes(self):
+        """Bytes of one packed pattern"""
+        return (self.row * self.col + 7) // 8
+
+    def __generate(self, chunk:int=32):
+        """Broadcast (theta, phi) grid with element positions, chunked by theta to limit memory"""
+        # (x, y) positions for RIS elements centered at array's center
+        x = (np.arange(self.col) - (self.col - 1) / 2) * self.dx
+        y = (np.arange(self.row) - (self.row - 1) / 2) * self.dy
+        xx, yy = np.meshgrid(x, y)  # Shape: (row, col)
+
+        theta_in = np.deg2rad(self.theta_in)
+        phi_in = np.deg2rad(self.phi_in)
+        theta_out = np.deg2rad(self.angles[:, 0])
+        phi_out = np.deg2rad(self.angles[:, 1])
+
+        # Directional deltas (incident - outgoing), shape: (N,)
+        delta_x = np.sin(theta_in) * np.cos(phi_in) - np.sin(theta_out) * np.cos(phi_out)
+        delta_y = np.sin(theta_in) * np.sin(phi_in) - np.sin(theta_out) * np.sin(phi_out)
+
+        k = -2 * np.pi / self.wavelength
+        packed = np.empty((len(self), self.nbytes), dtype=np.uint8)
+        step = chunk * len(self.phi_list)
+        for s in range(0, len(self), step):
+            dxs = delta_x[s:s+step, None, None]
+            dys = delta_y[s:s+step, None, None]
+            phase_mod = np.mod(k * (dxs * xx + dys * yy), 2 * np.pi)
+            # 1-bit quantization (threshold at π)
+            bits = phase_mod >= np.pi
+            packed[s:s+step] = np.packbits(bits.reshape(len(bits), -1), axis=-1)
+        logger.info("Generated %d RIS patterns of [%d,%d]" %(len(self), self.row, self.col))
+        return packed
+
+    def index(self, theta:float, phi:float):
+        """Flat index of (theta, phi) in grid"""
+        i = int(np.flatnonzero(self.theta_list == theta)[0])
+        j = int(np.flatnonzero(self.phi_list == phi)[0])
+        return i * len(self.phi_list) + j
+
+    def getAngle(self, idx:int):
+        """(theta, phi) of flat index"""
+        theta, phi = self.angles[idx]
+        return (theta.item(), phi.item())
+
+    def getBits(self, idx:int):
+        """Unpacked pattern of flat index as np.uint8 array with shape (row, col)"""
+        bits = np.unpackbits(self.packed[idx], count=self.row * self.col)
+        return bits.reshape(self.row, self.col)
+
+    def getPattern(self, idx:int):
+        """Pattern of flat index as nested list for setRISPattern()"""
+        return self.getBits(idx).tolist()
+
+    def getDigest(self, idx:int):
+        """Compact hash of packed pattern of flat index"""
+        return hashlib.blake2b(self.packed[idx].tobytes(), digest_size=8).digest()
+
+    def digest(self, pattern):
+        """Compact hash of a pattern (e.g. readback of getRISPattern), None if shape mismatch"""
+        bits = np.asarray(pattern, dtype=np.uint8)
+        if bits.size != self.row * self.col:
+            return None
+        packed = np.packbits(bits.reshape(-1) != 0)
+        return hashlib.blake2b(packed.tobytes(), digest_size=8).digest()
+
+class TMYRISCodebookCache():
+    def __init__(self, root:str="files/ris_codebook", max_bytes:int=256*1024*1024):
+        """
+        Persistent codebook cache, one bit-packed .npy file per geometry/incident angle/grid,
+        loaded memory-mapped and read-only, so several sweep processes could share it.
+        Least recently used files are evicted if total size exceeds max_bytes.
+
+        Args:
+            root (str, optional): Cache directory. Defaults to "files/ris_codebook".
+            max_bytes (int, optional): Limit of total cache size. Defaults to 256MB.
+        """
+        self.__root = root
+        self.__max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def makeKey(antenna_size, freq:float, theta_in:float, phi_in:float,
+                theta_list, phi_list, dx:float=None, dy:float=None):
+        """Hash of (antenna_size, element spacing, freq, theta_in, phi_in, angle grid)"""
+        wavelength = 3e8 / float(freq)
+        dx = wavelength / 2 if dx is None else float(dx)
+        dy = dx if dy is None else float(dy)
+        h = hashlib.sha1()
+        h.update(repr(([int(n) for n in antenna_size], dx, dy, float(freq),
+                       float(theta_in), float(phi_in))).encode())
+        h.update(np.asarray(list(theta_list), dtype=np.float64).tobytes())
+        h.update(np.asarray(list(phi_list), dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    def get(self, antenna_size, freq:float, theta_in:float, phi_in:float,
+            theta_list=range(0, 180, 1), phi_list=range(0, 360, 10),
+            dx:float=None, dy:float=None):
+        """
+        Fetch codebook from cache, or generate then store it if not exist.
+
+        Returns:
+            TMYRISCodebook: codebook with packed patterns, memory-mapped if loaded from cache
+        """
+        theta_list = list(theta_list)
+        phi_list = list(phi_list)
+        key = self.makeKey(antenna_size, freq, theta_in, phi_in, theta_list, phi_list, dx, dy)
+        path = os.path.join(self.__root, key + ".npy")
+
+        if os.path.exists(path):
+            try:
+                packed = np.load(path, mmap_mode='r')
+                # Touch it for LRU
+                os.utime(path)
+                logger.info("Load codebook from cache: %s" %path)
+                return TMYRISCodebook(antenna_size, freq, theta_in, phi_in, theta_list, phi_list,
+                                      dx, dy, packed=packed)
+            except (OSError, ValueError):
+                logger.exception("Load codebook failed, generate again: %s" %path)
+
+        codebook = TMYRISCodebook(antenna_size, freq, theta_in, phi_in, theta_list, phi_list, dx, dy)
+        self.__store(path, codebook.packed)
+        return codebook
+
+    def __store(self, path:str, packed:np.ndarray):
+        """Write to temp file then rename, readers never see a partial file"""
+        try:
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.__root)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, packed)
+                os.replace(tmp, path)
+            except BaseException:
+                # Never leave partial temp files in cache directory
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            logger.info("Store codebook to cache: %s" %path)
+        except OSError:
+            logger.exception("Store codebook failed: %s" %path)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used files until total size fits max_bytes"""
+        entries = []
+        for name in os.listdir(self.__root):
+            if not name.endswith(".npy"):
+                continue
+            p = os.path.join(self.__root, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(e[1] for e in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.__max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+                logger.info("Evict codebook: %s" %p)
+            except OSError:
+                # Still mapped by another process
+                logger.debug("Evict codebook skipped: %s" %p)
@@ -0,0 +1,202 @@
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger("TMYRISOptimizer")
+
+# Irreducible polynomials of GF(2^k), maps elements to Sidon columns of Hadamard probing
+IRREDUCIBLE = {1: 0b11, 2: 0b111, 3: 0b1011, 4: 0b10011, 5: 0b100101, 6: 0b1000011,
+               7: 0b10000011, 8: 0b100011011, 9: 0b1000010001, 10: 0b10000001001,
+               11: 0b100000000101, 12: 0b1000001010011, 13: 0b10000000011011, 14: 0b100010001000011}
+
+class TMYRISOptimizer():
+    def __init__(self, sn:str, service, antenna_size, measure, budget:int=1000,
+                 patience:int=200, min_gain:float=0.1, settle:float=1.0, seed:int=None):
+        """
+        Closed-loop 1-bit RIS optimization driven by measured power,
+        supports greedy flipping and Hadamard/random-basis probing.
+
+        Args:
+            sn (str): Device serial number
+            service (_type_): TLKCoreService instance
+            antenna_size (list): [row, col] of RIS module
+            measure (callable): measure(step) returns received power of the applied pattern, or None if invalid
+            budget (int, optional): Max measurements. Defaults to 1000.
+            patience (int, optional): Early stop after measurements without improvement. Defaults to 200.
+            min_gain (float, optional): dB improvement required to accept a new best. Defaults to 0.1.
+            settle (float, optional): Sleep seconds after applying pattern,
+                                      or a TMYSettleDetector to poll measure() until stable. Defaults to 1.0.
+            seed (int, optional): Random seed of random-basis probing. Defaults to None.
+        """
+        self.__sn = sn
+        self.__service = service
+        self.row, self.col = [int(n) for n in antenna_size]
+        self.__measure = measure
+        self.__budget = budget
+        self.__patience = patience
+        self.__min_gain = min_gain
+        self.__settle = settle
+        self.__rng = np.random.default_rng(seed)
+
+        self.best_bits = None
+        self.best_power = -np.inf
+        # [(measurements, best power), ...] for convergence tracking
+        self.history = []
+        self.__count = 0
+        self.__stale = 0
+
+    @property
+    def measurements(self):
+        return self.__count
+
+    def __exhausted(self):
+        return self.__count >= self.__budget or self.__stale >= self.__patience
+
+    def evaluate(self, bits:np.ndarray):
+        """Apply pattern then measure, also update the best one"""
+        ret = self.__service.setRISPattern(self.__sn, bits.astype(int).tolist())
+        if hasattr(self.__settle, 'wait'):
+            power, _, _ = self.__settle.wait(lambda: self.__measure(self.__count))
+        else:
+            time.sleep(self.__settle)
+            power = self.__measure(self.__count)
+        self.__count += 1
+        logger.debug("Measurement %d: %s (set: %s)" %(self.__count, power, ret.RetCode))
+
+        power = -np.inf if power is None else float(power)
+        if power > self.best_power + self.__min_gain or self.best_bits is None:
+            self.best_bits = bits.copy()
+            self.best_power = power
+            self.__stale = 0
+        else:
+            self.__stale += 1
+        self.history.append((self.__count, self.best_power))
+        return power
+
+    def greedy(self, init_bits=None, unit:str="row"):
+        """
+        Flip rows, columns or elements one by one, keep the flip if power improves,
+        repeat passes until a pass has no improvement.
+
+        Args:
+            init_bits (np.ndarray, optional): Initial pattern with shape (row, col). Defaults to current best or all zeros.
+            unit (str, optional): "row", "col" or "element". Defaults to "row".
+
+        Returns:
+            tuple: (best pattern, best power)
+        """
+        if init_bits is not None:
+            bits = np.asarray(init_bits, dtype=np.uint8).reshape(self.row, self.col)
+        elif self.best_bits is not None:
+            bits = self.best_bits
+        else:
+            bits = np.zeros((self.row, self.col), dtype=np.uint8)
+        if self.best_bits is None or not np.array_equal(bits, self.best_bits):
+            self.evaluate(bits)
+
+        if unit == "row":
+            masks = [np.s_[r, :] for r in range(self.row)]
+        elif unit == "col":
+            masks = [np.s_[:, c] for c in range(self.col)]
+        else:
+            masks = [np.s_[r, c] for r in range(self.row) for c in range(self.col)]
+
+        improved = True
+        while improved and not self.__exhausted():
+            improved = False
+            for m in masks:
+                if self.__exhausted():
+                    break
+                candidate = self.best_bits.copy()
+                candidate[m] ^= 1
+                before = self.best_power
+                self.evaluate(candidate)
+                improved |= self.best_power > before
+        logger.info("Greedy(%s) done: %.2f with %d measurements" %(unit, self.best_power, self.__count))
+        return self.best_bits, self.best_power
+
+    @staticmethod
+    def __gfMul(a, b, k:int):
+        """Multiply elements of GF(2^k) (numpy arrays of ints)"""
+        poly = IRREDUCIBLE[k]
+        a = np.asarray(a, dtype=np.int64).copy()
+        b = np.asarray(b, dtype=np.int64).copy()
+        out = np.zeros_like(a)
+        for _ in range(k):
+            out ^= np.where(b & 1, a, 0)
+            b >>= 1
+            a <<= 1
+            a = np.where(a >> k, a ^ poly, a)
+        return out
+
+    def __columns(self, size:int):
+        """
+        Hadamard columns of elements, x -> (x, x^3) of GF(2^k) is a Sidon set:
+        column xors of two element pairs only match for the same pair,
+        so the vote of each element is not biased by other pairs of elements.
+        """
+        k = max(1, (size - 1).bit_length())
+        if k not in IRREDUCIBLE:
+            raise ValueError("Too many elements for Hadamard probing: %d" %size)
+        x = np.arange(size, dtype=np.int64)
+        return x | (self.__gfMul(self.__gfMul(x, x, k), x, k) << k), 1 << (2 * k)
+
+    def __basis(self, method:str, n:int):
+        """Probing patterns as bits, shape: (n, row, col)"""
+        size = self.row * self.col
+        if method == "hadamard":
+            # Entries of Sylvester Hadamard matrix: (-1)^popcount(row & column), bit 1 for -1
+            cols, order = self.__columns(size)
+            rows = self.__rng.choice(order, size=min(n, order), replace=False)
+            v = rows[:, None] & cols[None, :]
+            for shift in (32, 16, 8, 4, 2, 1):
+                v ^= v >> shift
+            probes = (v & 1).astype(bool)
+        else:
+            probes = self.__rng.integers(0, 2, size=(n, size)).astype(bool)
+        return probes.astype(np.uint8).reshape(-1, self.row, self.col)
+
+    def probe(self, method:str="hadamard", n:int=256):
+        """
+        Measure probing patterns, then reconstruct each element by majority vote
+        (conditional sample mean of power if element agrees with a reference element or not).
+        Hadamard probes are rows of order 4^k (2^k >= elements), the vote is exact with all rows
+        and unbiased with a random subset of them.
+
+        Args:
+            method (str, optional): "hadamard" or "random". Defaults to "hadamard".
+            n (int, optional): Probing patterns, limited by budget. Defaults to 256.
+
+        Returns:
+            tuple: (best pattern, best power)
+        """
+        probes = self.__basis(method, min(n, self.__budget - self.__count))
+        powers = []
+        for bits in probes:
+            if self.__count >= self.__budget:
+                break
+            powers.append(self.evaluate(bits))
+        if len(powers) == 0:
+            return self.best_bits, self.best_power
+
+        probes = probes[:len(powers)]
+        powers = np.asarray(powers)
+        valid = np.isfinite(powers)
+        probes, powers = probes[valid], powers[valid]
+        if len(powers):
+            # Power is invariant if all elements flip, so vote each element relative to a reference element:
+            # conditional sample mean (linear scale) of probes which agree with reference vs which don't
+            lin = 10 ** (powers / 10)
+            flat = probes.reshape(len(probes), -1)
+            agree = (flat == flat[:, :1]).astype(np.float64)
+            same = agree.sum(axis=0)
+            diff = len(flat) - same
+            mean_same = lin @ agree / np.maximum(same, 1)
+            mean_diff = lin @ (1 - agree) / np.maximum(diff, 1)
+            reconstructed = (mean_same < mean_diff).astype(np.uint8).reshape(self.row, self.col)
+            if self.__count < self.__budget:
+                self.evaluate(reconstructed)
+
+        logger.info("Probe(%s) done: %.2f with %d measurements" %(method, self.best_power, self.__count))
+        return self.best_bits, self.best_power
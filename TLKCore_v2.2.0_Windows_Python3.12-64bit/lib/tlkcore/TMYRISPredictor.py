@@ -0,0 +1,107 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("TMYRISPredictor")
+
+class TMYRISPredictor():
+    def __init__(self, codebook, ele_q:float=0):
+        """
+        Array factor predictor of 1-bit RIS patterns, scores expected gain of each pattern
+        toward the receiver, then a sweep only needs to measure the promising ones.
+
+        Args:
+            codebook (TMYRISCodebook): Precomputed patterns of the angle grid
+            ele_q (float, optional): Element factor cos(theta)^q, 0 means isotropic. Defaults to 0.
+        """
+        self.__codebook = codebook
+        self.__ele_q = ele_q
+
+    def __steering(self, theta_rx, phi_rx):
+        """
+        Steering vectors of receiver directions, shape: (row * col, K).
+        Directional deltas (incident - outgoing) are normalized by wavelength, same as codebook formula.
+        """
+        cb = self.__codebook
+        theta_in = np.deg2rad(cb.theta_in)
+        phi_in = np.deg2rad(cb.phi_in)
+        theta_out = np.deg2rad(theta_rx)
+        phi_out = np.deg2rad(phi_rx)
+        ux = (np.sin(theta_in) * np.cos(phi_in) - np.sin(theta_out) * np.cos(phi_out)) / cb.wavelength
+        uy = (np.sin(theta_in) * np.sin(phi_in) - np.sin(theta_out) * np.sin(phi_out)) / cb.wavelength
+        x = (np.arange(cb.col) - (cb.col - 1) / 2) * cb.dx
+        y = (np.arange(cb.row) - (cb.row - 1) / 2) * cb.dy
+        # Row-major flattening matches the unpacked pattern bits
+        sy = np.exp(2j * np.pi * y[:, None, None] * uy[None, None, :])
+        sx = np.exp(2j * np.pi * x[None, :, None] * ux[None, None, :])
+        return (sy * sx).reshape(cb.row * cb.col, len(ux))
+
+    def __reflection(self, indices):
+        """Reflection coefficients (+1/-1) of patterns, shape: (N, row * col)"""
+        cb = self.__codebook
+        bits = np.unpackbits(cb.packed[indices], axis=-1, count=cb.row * cb.col)
+        return 1 - 2 * bits.astype(np.float32)
+
+    def score(self, indices=None, theta_rx=None, phi_rx=None, chunk:int=256):
+        """
+        Predict gain(dB) relative to an ideal continuous-phase panel for each pattern toward the receiver.
+
+        The receiver is one direction, or a region given by several directions,
+        then each pattern is scored by its best gain inside the region.
+        The array factor is evaluated exactly, it costs one (N, row*col) x (row*col, K) product.
+
+        Args:
+            indices (iterable, optional): Flat indices of codebook. Defaults to whole codebook.
+            theta_rx (float or list): Receiver theta(s) in degrees
+            phi_rx (float or list): Receiver phi(s) in degrees, same length as theta_rx
+            chunk (int, optional): Patterns per batch to limit memory. Defaults to 256.
+
+        Returns:
+            np.ndarray: predicted gain in dB of each index
+
+        Raises:
+            ValueError: if receiver direction is missing or theta_rx and phi_rx mismatch
+        """
+        if theta_rx is None or phi_rx is None:
+            raise ValueError("Receiver direction (theta_rx, phi_rx) is required to score patterns")
+        theta_rx = np.atleast_1d(np.asarray(theta_rx, dtype=np.float64))
+        phi_rx = np.atleast_1d(np.asarray(phi_rx, dtype=np.float64))
+        if theta_rx.ndim != 1 or theta_rx.shape != phi_rx.shape or len(theta_rx) == 0:
+            raise ValueError("theta_rx and phi_rx must have the same length")
+
+        cb = self.__codebook
+        indices = np.arange(len(cb)) if indices is None else np.asarray(list(indices), dtype=int)
+        steering = self.__steering(theta_rx, phi_rx)
+
+        n = cb.row * cb.col
+        af = np.empty((len(indices), len(theta_rx)), dtype=np.float64)
+        for s in range(0, len(indices), chunk):
+            af[s:s+chunk] = np.abs(self.__reflection(indices[s:s+chunk]) @ steering)
+
+        gain = 20 * np.log10(np.maximum(af / n, 1e-12))
+        if self.__ele_q:
+            ele = np.abs(np.cos(np.deg2rad(theta_rx))) ** self.__ele_q
+            gain += 10 * np.log10(np.maximum(ele, 1e-12))
+        return gain.max(axis=1)
+
+    def select(self, fraction:float, indices=None, theta_rx=None, phi_rx=None):
+        """
+        Keep the top fraction of patterns by predicted gain toward the receiver, in the original sweep order.
+
+        Args:
+            fraction (float): Fraction of patterns to keep
+            indices (iterable, optional): Flat indices of codebook. Defaults to whole codebook.
+            theta_rx (float or list): Receiver theta(s), see score()
+            phi_rx (float or list): Receiver phi(s), see score()
+
+        Returns:
+            list: flat indices to measure
+        """
+        cb = self.__codebook
+        indices = np.arange(len(cb)) if indices is None else np.asarray(list(indices), dtype=int)
+        keep = max(1, int(np.ceil(len(indices) * fraction)))
+        gain = self.score(indices, theta_rx, phi_rx)
+        order = np.argsort(gain, kind='stable')[::-1][:keep]
+        logger.info("Prune %d of %d patterns, predicted gain threshold: %.2f dB"
+                    %(len(indices) - keep, len(indices), gain[order[-1]]))
+        return np.sort(indices[order]).tolist()
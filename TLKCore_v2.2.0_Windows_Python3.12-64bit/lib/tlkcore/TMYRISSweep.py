@@ -0,0 +1,330 @@
+import logging
+import queue
+import threading
+import time
+
+from tlkcore.TMYPublic import RetCode
+
+logger = logging.getLogger("TMYRISSweep")
+
+# Readback verification policies, see TMYRISSweep
+VERIFY = ("always", "every", "error", "never")
+
+class TMYRISSweep():
+    def __init__(self, sn:str, service, codebook, measure, mid:int=None, settle:float=1.0,
+                 pipeline:bool=False, verify:str="always", verify_every:int=10):
+        """
+        Sweep RIS patterns of a codebook and collect received power,
+        each distinct pattern is applied and measured only once.
+
+        Args:
+            sn (str): Device serial number
+            service (_type_): TLKCoreService instance
+            codebook (TMYRISCodebook): Precomputed patterns of the angle grid
+            measure (callable): measure(theta, phi) returns received power, or None if invalid
+            mid (int, optional): RIS module id for pattern readback. Defaults to None (no readback).
+            settle (float, optional): Sleep seconds after applying pattern,
+                                      or a TMYSettleDetector to poll measure() until stable. Defaults to 1.0.
+            pipeline (bool, optional): Prepare next pattern and log previous result on worker threads
+                                       while current one is settling and measuring. Defaults to False.
+            verify (str, optional): Readback verification policy if mid assigned,
+                                    each readback is one extra getRISPattern() round trip to the device,
+                                    then its hash is compared with the packed pattern:
+                                    "always" reads back and logs every measured step,
+                                    "every" reads back every verify_every measured steps,
+                                    "error" reads back only if setRISPattern failed,
+                                    "never" skips readback. Defaults to "always".
+            verify_every (int, optional): Readback interval of "every" policy. Defaults to 10.
+
+        Raises:
+            ValueError: if verify policy is unknown
+        """
+        if verify not in VERIFY:
+            raise ValueError("Invalid verify policy: %s, expect one of %s" %(verify, VERIFY))
+        self.__sn = sn
+        self.__service = service
+        self.__codebook = codebook
+        self.__measure = measure
+        self.__mid = mid
+        self.__settle = settle
+        self.__pipeline = pipeline
+        self.__verify = verify
+        self.__verify_every = max(1, verify_every)
+        # Measured power of each distinct pattern, keyed by packed bytes
+        self.__measured = {}
+        self.__stats = {'steps': 0, 'measured': 0, 'readbacks': 0, 'mismatches': 0, 'unverified': 0}
+        # Accumulated seconds of each stage
+        self.__timing = {'prepare': 0.0, 'apply': 0.0, 'measure': 0.0, 'log': 0.0}
+
+    def __needReadback(self, code):
+        if self.__mid is None or self.__verify == "never":
+            return False
+        if self.__verify == "every":
+            return self.__stats['measured'] % self.__verify_every == 0
+        if self.__verify == "error":
+            return code is not RetCode.OK
+        return True
+
+    def __apply(self, idx, pattern):
+        """Set pattern then read it back by verification policy, returns (RetCode, readback)"""
+        t = time.perf_counter()
+        code = self.__service.setRISPattern(self.__sn, pattern).RetCode
+        readback = None
+        if self.__needReadback(code):
+            readback = self.__service.getRISPattern(self.__sn, [self.__mid]).RetData
+            self.__verifyReadback(idx, readback)
+        self.__timing['apply'] += time.perf_counter() - t
+        return code, readback
+
+    def __verifyReadback(self, idx, readback):
+        """Compare hash of readback with the expected packed pattern"""
+        self.__stats['readbacks'] += 1
+        pattern = readback
+        if isinstance(readback, dict):
+            pattern = readback.get(self.__mid, readback.get(str(self.__mid)))
+            if pattern is None and len(readback) > 0:
+                pattern = next(iter(readback.values()))
+        try:
+            digest = self.__codebook.digest(pattern)
+        except (TypeError, ValueError):
+            digest = None
+        if digest is None:
+            self.__stats['unverified'] += 1
+        elif digest != self.__codebook.getDigest(idx):
+            self.__stats['mismatches'] += 1
+            logger.warning("RIS pattern readback mismatch at %s" %(self.__codebook.getAngle(idx),))
+
+    def __read(self, theta, phi):
+        """Settle then measure power"""
+        t = time.perf_counter()
+        if hasattr(self.__settle, 'wait'):
+            # The last stable reading is the measurement
+            power, _, _ = self.__settle.wait(lambda: self.__measure(theta, phi))
+        else:
+            time.sleep(self.__settle)
+            power = self.__measure(theta, phi)
+        self.__timing['measure'] += time.perf_counter() - t
+        return power
+
+    def __log(self, theta, phi, code, readback):
+        t = time.perf_counter()
+        logger.info(f"Set RIS pattern for reflection (theta={theta}, phi={phi}): {code}")
+        if readback is not None:
+            logger.info(f"Get RIS pattern: {str(readback)[:80]}")  # Truncated for readability
+        self.__timing['log'] += time.perf_counter() - t
+
+    def measureIndex(self, idx:int):
+        """Apply pattern of flat index, then return measured power"""
+        theta, phi = self.__codebook.getAngle(idx)
+        t = time.perf_counter()
+        pattern = self.__codebook.getPattern(idx)
+        self.__timing['prepare'] += time.perf_counter() - t
+
+        code, readback = self.__apply(idx, pattern)
+        self.__log(theta, phi, code, readback)
+        return self.__read(theta, phi)
+
+    def run(self, indices=None, dedup:bool=True):
+        """
+        Sweep the flat indices of codebook, all angles sharing one pattern get the same measurement.
+
+        Args:
+            indices (iterable, optional): Flat indices to sweep. Defaults to whole codebook.
+            dedup (bool, optional): Measure each distinct pattern once. Defaults to True.
+
+        Returns:
+            list: [(theta, phi, power), ...] for each valid angle
+        """
+        codebook = self.__codebook
+        if indices is None:
+            indices = range(len(codebook))
+
+        measured = self.__sweep(indices, dedup)
+        stats = self.getStats()
+        logger.info("Sweep done: %d angles, %d patterns measured, dedup ratio: %.2f, "
+                    "readback mismatches: %d/%d, timing: %s"
+                    %(stats['steps'], stats['measured'], stats['dedup_ratio'],
+                      stats['mismatches'], stats['readbacks'], stats['timing']))
+        return [(*codebook.getAngle(idx), power) for idx, power in measured.items()]
+
+    def __sweep(self, indices, dedup:bool=True):
+        """Measure indices in order, returns {idx: power} of valid ones, stop early by Ctrl+C"""
+        if self.__pipeline:
+            return self.__sweepPipelined(indices, dedup)
+
+        codebook = self.__codebook
+        measured = {}
+        try:
+            for idx in indices:
+                self.__stats['steps'] += 1
+                key = codebook.packed[idx].tobytes() if dedup else None
+                if key is not None and key in self.__measured:
+                    power = self.__measured[key]
+                    logger.debug("Reuse measured pattern for %s: %s" %(codebook.getAngle(idx), power))
+                else:
+                    power = self.measureIndex(idx)
+                    self.__stats['measured'] += 1
+                    if key is not None:
+                        self.__measured[key] = power
+                if power is not None:
+                    measured[idx] = power
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Detected Ctrl+C, stop sweeping")
+            self.__stats['interrupted'] = True
+        return measured
+
+    def __sweepPipelined(self, indices, dedup:bool=True):
+        """
+        Same as __sweep, but patterns are prepared one step ahead and results are logged one step behind
+        on worker threads. Hardware is only touched by the calling thread, so one pattern is applied at a time.
+        """
+        codebook = self.__codebook
+        # Backpressure: preparing thread runs at most one pattern ahead
+        prepared = queue.Queue(maxsize=1)
+        finished = queue.Queue()
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    prepared.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def prepare():
+            scheduled = set(self.__measured)
+            for idx in indices:
+                if stop.is_set():
+                    break
+                t = time.perf_counter()
+                key = codebook.packed[idx].tobytes() if dedup else None
+                pattern = None
+                if key is None or key not in scheduled:
+                    pattern = codebook.getPattern(idx)
+                    if key is not None:
+                        scheduled.add(key)
+                self.__timing['prepare'] += time.perf_counter() - t
+                put((idx, key, pattern))
+            put(None)
+
+        def record():
+            while True:
+                item = finished.get()
+                if item is None:
+                    break
+                self.__log(*item)
+
+        workers = [threading.Thread(target=prepare, daemon=True), threading.Thread(target=record, daemon=True)]
+        for w in workers:
+            w.start()
+
+        measured = {}
+        try:
+            while True:
+                item = prepared.get()
+                if item is None:
+                    break
+                idx, key, pattern = item
+                self.__stats['steps'] += 1
+                if pattern is None:
+                    # Duplicate of a pattern measured in previous step
+                    power = self.__measured.get(key)
+                else:
+                    theta, phi = codebook.getAngle(idx)
+                    code, readback = self.__apply(idx, pattern)
+                    finished.put((theta, phi, code, readback))
+                    power = self.__read(theta, phi)
+                    self.__stats['measured'] += 1
+                    if key is not None:
+                        self.__measured[key] = power
+                if power is not None:
+                    measured[idx] = power
+        except (KeyboardInterrupt, SystemExit):
+            logger.info("Detected Ctrl+C, stop sweeping")
+            self.__stats['interrupted'] = True
+        finally:
+            stop.set()
+            finished.put(None)
+            for w in workers:
+                w.join()
+        return measured
+
+    def search(self, levels=((15, 3), (5, 1), (1, 1)), top_k:int=3):
+        """
+        Hierarchical coarse-to-fine search, scans a coarse sub-grid first,
+        then refines around the top_k candidates with the next (finer) strides.
+
+        Each refine level covers ±1 stride of previous level around a candidate,
+        so the result matches the exhaustive sweep within one step of the last level,
+        as long as the global peak is inside a coarse cell of one of the top_k coarse candidates.
+
+        Args:
+            levels (tuple, optional): (theta_stride, phi_stride) of each level in grid steps.
+                                      Defaults to ((15, 3), (5, 1), (1, 1)).
+            top_k (int, optional): Candidates to refine for each level. Defaults to 3.
+
+        Returns:
+            list: [(theta, phi, power), ...] for all measured angles
+
+        Raises:
+            ValueError: if levels is empty or a stride is not positive
+        """
+        levels = [tuple(lv) for lv in levels]
+        if not levels:
+            raise ValueError("Search requires at least one level")
+        for lv in levels:
+            if len(lv) != 2 or min(lv) < 1:
+                raise ValueError("Invalid search level %s, expect (theta_stride, phi_stride) >= 1" %(lv,))
+        if top_k < 1:
+            raise ValueError("Invalid top_k: %s" %top_k)
+        codebook = self.__codebook
+        n_theta, n_phi = codebook.shape
+        phi_list = codebook.phi_list
+        # Wrap azimuth if the grid covers a full circle
+        wrap_phi = n_phi > 1 and (phi_list[-1] + (phi_list[1] - phi_list[0])) % 360 == phi_list[0] % 360
+
+        measured = {}
+        prev = None
+        for level, (st, sp) in enumerate(levels):
+            if prev is None:
+                cells = [(i, j) for i in range(0, n_theta, st) for j in range(0, n_phi, sp)]
+            else:
+                cells = []
+                candidates = sorted(measured, key=measured.get, reverse=True)[:top_k]
+                for idx in candidates:
+                    ci, cj = divmod(idx, n_phi)
+                    for i in range(ci - prev[0], ci + prev[0] + 1, st):
+                        if not 0 <= i < n_theta:
+                            continue
+                        for j in range(cj - prev[1], cj + prev[1] + 1, sp):
+                            if wrap_phi:
+                                j %= n_phi
+                            elif not 0 <= j < n_phi:
+                                continue
+                            cells.append((i, j))
+            indices = [i * n_phi + j for i, j in dict.fromkeys(cells) if i * n_phi + j not in measured]
+            logger.info("Search level %d with stride %s: %d new angles" %(level, (st, sp), len(indices)))
+            measured.update(self.__sweep(indices))
+            prev = (st, sp)
+            if self.__stats.get('interrupted'):
+                break
+
+        stats = self.getStats()
+        theta_step = codebook.theta_list[1] - codebook.theta_list[0] if n_theta > 1 else 0
+        phi_step = phi_list[1] - phi_list[0] if n_phi > 1 else 0
+        logger.info("Search done: %d patterns measured of %d angles, tolerance: (%s, %s) degrees"
+                    %(stats['measured'], len(codebook), theta_step * prev[0], phi_step * prev[1]))
+        return [(*codebook.getAngle(idx), power) for idx, power in measured.items()]
+
+    def getStats(self):
+        """Counters of sweep, dedup_ratio is angles per measured pattern, timing is seconds per stage"""
+        stats = dict(self.__stats)
+        stats['timing'] = {k: round(v, 3) for k, v in self.__timing.items()}
+        stats['dedup_ratio'] = stats['steps'] / stats['measured'] if stats['measured'] else 0.0
+        return stats
+
+    @staticmethod
+    def top(results:list, n:int=3):
+        """Top n of (theta, phi, power) by power"""
+        return sorted(results, key=lambda x: x[2], reverse=True)[:n]
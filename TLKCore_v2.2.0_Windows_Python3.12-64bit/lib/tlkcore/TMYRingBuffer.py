@@ -0,0 +1,37 @@
+import threading
+
+import numpy as np
+
+class TMYRingBuffer():
+    def __init__(self, capacity:int, columns:int=1, dtype=np.float64):
+        """
+        Preallocated NumPy ring buffer, one writer thread appends rows
+        and readers take ordered snapshots of the latest rows.
+
+        Args:
+            capacity (int): Max rows kept
+            columns (int, optional): Values per row. Defaults to 1.
+            dtype (optional): Defaults to np.float64.
+        """
+        self.__data = np.full((capacity, columns), np.nan, dtype=dtype)
+        self.__capacity = capacity
+        self.__lock = threading.Lock()
+        # Total rows ever appended
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.__capacity)
+
+    def append(self, row):
+        with self.__lock:
+            self.__data[self.count % self.__capacity] = row
+            self.count += 1
+
+    def snapshot(self):
+        """Copy of kept rows from oldest to newest, shape: (len, columns)"""
+        with self.__lock:
+            n = self.count
+            if n <= self.__capacity:
+                return self.__data[:n].copy()
+            head = n % self.__capacity
+            return np.concatenate((self.__data[head:], self.__data[:head]))
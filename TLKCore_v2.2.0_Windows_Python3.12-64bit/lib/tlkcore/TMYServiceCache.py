@@ -0,0 +1,123 @@
+import copy
+import logging
+import threading
+
+from tlkcore.TMYPublic import RetCode
+
+logger = logging.getLogger("TMYServiceCache")
+
+# Static queries, results only change with frequency, AAKit, RF mode or device re-init
+CACHED = ("getDR", "getCOMDR", "getELEDR", "getChannelCount", "getBoardCount",
+          "getFrequencyList", "getAAKitList")
+# Calls which drop cached results of the device
+INVALIDATE = ("setOperatingFreq", "selectAAKit", "setRFMode", "initDev", "DeInitDev",
+              "reboot", "saveAAKitFile", "setAAKitInfo")
+
+def _copy(ret):
+    """Copy of ret with its own RetData, so callers could not modify the cached one"""
+    dup = copy.copy(ret)
+    dup.RetData = copy.deepcopy(ret.RetData)
+    return dup
+
+class TMYServiceCache():
+    def __init__(self, service, cached=CACHED, invalidate=INVALIDATE):
+        """
+        Caching proxy of TLKCoreService, same interface as the service.
+        Successful results of static queries are kept per (sn, method, args),
+        and dropped for the device once it changes frequency, AAKit, RF mode, reboots or is (de)initialized.
+        Each call returns a copy of the cached result.
+
+        Args:
+            service (TLKCoreService): Service instance
+            cached (tuple, optional): Method names to cache. Defaults to CACHED.
+            invalidate (tuple, optional): Method names which invalidate cache of its sn. Defaults to INVALIDATE.
+        """
+        self.__service = service
+        self.__cached = set(cached)
+        self.__invalidate = set(invalidate)
+        self.__lock = threading.Lock()
+        # {sn: {(method, args, kwargs): ret}}
+        self.__cache = {}
+        # Generation of each sn and of all devices, bumped by invalidation,
+        # results of queries which raced with a change are not cached
+        self.__gens = {}
+        self.__epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def service(self):
+        """The wrapped TLKCoreService"""
+        return self.__service
+
+    def __getattr__(self, name):
+        attr = getattr(self.__service, name)
+        if not callable(attr):
+            return attr
+        if name in self.__cached:
+            return lambda *args, **kwargs: self.__query(name, attr, args, kwargs)
+        if name in self.__invalidate:
+            return lambda *args, **kwargs: self.__change(name, attr, args, kwargs)
+        return attr
+
+    def __query(self, name, func, args, kwargs):
+        sn = args[0] if args else kwargs.get('sn')
+        key = (name, args[1:], tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable parameters, e.g. lists
+            return func(*args, **kwargs)
+        with self.__lock:
+            ret = self.__cache.get(sn, {}).get(key)
+            if ret is not None:
+                self.hits += 1
+                return _copy(ret)
+            self.misses += 1
+            gen = (self.__epoch, self.__gens.get(sn, 0))
+
+        ret = func(*args, **kwargs)
+        if getattr(ret, "RetCode", None) is RetCode.OK:
+            try:
+                cached = _copy(ret)
+            except (TypeError, AttributeError, copy.Error):
+                logger.debug("%s() result is not copyable, not cached" %name)
+                return ret
+            with self.__lock:
+                # Skip if the device changed while querying, the result may be stale
+                if gen == (self.__epoch, self.__gens.get(sn, 0)):
+                    self.__cache.setdefault(sn, {})[key] = cached
+        return ret
+
+    def __change(self, name, func, args, kwargs):
+        sn = args[0] if args else kwargs.get('sn')
+        # Invalidate before and after, queries overlapping the change are not cached
+        self.invalidate(sn)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Drop even if failed, device state is unknown
+            logger.debug("%s() invalidates cache of %s" %(name, sn))
+            self.invalidate(sn)
+
+    def invalidate(self, sn:str=None):
+        """Drop cached results of sn, or all devices if sn is None"""
+        with self.__lock:
+            if sn is None:
+                self.__cache.clear()
+                self.__epoch += 1
+            else:
+                self.__cache.pop(sn, None)
+                self.__gens[sn] = self.__gens.get(sn, 0) + 1
+
+    def getStats(self):
+        """Hit/miss counters and cached entries"""
+        with self.__lock:
+            entries = sum(len(v) for v in self.__cache.values())
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': entries,
+        }
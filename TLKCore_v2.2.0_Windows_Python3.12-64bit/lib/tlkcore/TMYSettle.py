@@ -0,0 +1,100 @@
+import logging
+import time
+
+logger = logging.getLogger("TMYSettle")
+
+class TMYSettleDetector():
+    def __init__(self, read=None, tolerance:float=0.2, count:int=3, interval:float=0.05,
+                 timeout:float=1.5, min_wait:float=0.02, change_wait:float=0):
+        """
+        Replace fixed sleeps after configuring device, poll power source until
+        consecutive readings are stable within tolerance, or fall back to timeout.
+
+        Args:
+            read (callable, optional): read() returns power, e.g. socket exchange or
+                                       lambda: service.getPowerValue(sn, freq).RetData. Defaults to None.
+            tolerance (float, optional): Max dB difference of stable readings. Defaults to 0.2.
+            count (int, optional): Consecutive stable readings required. Defaults to 3.
+            interval (float, optional): Seconds between readings. Defaults to 0.05.
+            timeout (float, optional): Max seconds to wait. Defaults to 1.5.
+            min_wait (float, optional): Seconds to wait before first reading, set it to the switch latency
+                                        of device and receiver, otherwise the first readings could still
+                                        be power of the previous configuration. Defaults to 0.02.
+            change_wait (float, optional): Max seconds to ignore readings within tolerance of the previous
+                                           result, new configuration may still give same power after it.
+                                           0 to disable. Defaults to 0.
+        """
+        self.__read = read
+        self.__tolerance = tolerance
+        self.__count = count
+        self.__interval = interval
+        self.__timeout = timeout
+        self.__min_wait = min_wait
+        self.__change_wait = change_wait
+        # Result of previous wait(), readings of the new configuration should leave it first
+        self.__last = None
+        self.__stale = 0
+        self.__times = []
+        self.__timeouts = 0
+
+    def wait(self, read=None):
+        """
+        Wait until readings settled.
+
+        Args:
+            read (callable, optional): Override read() of this step. Defaults to None.
+
+        Returns:
+            tuple: (last reading or None, settled or not, elapsed seconds)
+        """
+        read = self.__read if read is None else read
+        start = time.perf_counter()
+        if self.__min_wait:
+            time.sleep(self.__min_wait)
+
+        window = []
+        value = None
+        settled = False
+        changed = not self.__change_wait or self.__last is None
+        while True:
+            try:
+                value = read()
+                value = None if value is None else float(value)
+            except (ValueError, TypeError):
+                value = None
+            if not changed and value is not None:
+                changed = abs(value - self.__last) > self.__tolerance or \
+                          time.perf_counter() - start > self.__min_wait + self.__change_wait
+                if not changed:
+                    self.__stale += 1
+            if value is None or not changed:
+                window = []
+            else:
+                window.append(value)
+                window = window[-self.__count:]
+                if len(window) == self.__count and max(window) - min(window) <= self.__tolerance:
+                    settled = True
+                    break
+            if time.perf_counter() - start + self.__interval > self.__timeout:
+                break
+            time.sleep(self.__interval)
+
+        elapsed = time.perf_counter() - start
+        self.__times.append(elapsed)
+        if not settled:
+            self.__timeouts += 1
+        else:
+            self.__last = value
+        logger.info("Settle %s in %.3fs: %s" %("done" if settled else "timeout", elapsed, value))
+        return value, settled, elapsed
+
+    def getStats(self):
+        """Settle time statistics for tuning"""
+        n = len(self.__times)
+        return {
+            'steps': n,
+            'timeouts': self.__timeouts,
+            'stale': self.__stale,
+            'mean': sum(self.__times) / n if n else 0.0,
+            'max': max(self.__times) if n else 0.0,
+        }
@@ -1,10 +1,12 @@
 import argparse
+import inspect
 import logging
 import logging.config
 import os
 from pathlib import Path
 import platform
 import sys
+import threading
 import time
 import traceback
 import numpy as np
@@ -15,11 +17,12 @@ import numpy as np
 import time
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
-import requests  
 
 
 
 service = None
+# Dispatch table of wrapper(), built once with service
+dispatcher = None
 root_path = Path(__file__).absolute().parent
 
 # Please setup path of tlkcore libraries to environment variables,
@@ -40,6 +43,22 @@ def check_ex_files(directory, extension=".so"):
 try:
     from tlkcore.TLKCoreService import TLKCoreService
     from tlkcore.TMYBeamConfig import TMYBeamConfig
+    from tlkcore.TMYBeamTracker import TMYBeamTracker
+    from tlkcore.TMYControlServer import TMYControlServer
+    from tlkcore.TMYDeviceManager import TMYDeviceManager
+    from tlkcore.TMYDispatcher import TMYDispatchError, TMYDispatcher
+    from tlkcore.TMYInventory import TMYInventory
+    from tlkcore.TMYMeasHub import TMYMeasHub
+    from tlkcore.TMYMeasProtocol import TMYMeasLink, TMYTextLink
+    from tlkcore.TMYRISCodebook import TMYRISCodebookCache
+    from tlkcore.TMYRISOptimizer import TMYRISOptimizer
+    from tlkcore.TMYRISPredictor import TMYRISPredictor
+    from tlkcore.TMYRISSweep import TMYRISSweep, VERIFY
+    from tlkcore.TMYPDCalibration import TMYPDCalibration
+    from tlkcore.TMYPowerLogger import TMYPowerLogger
+    from tlkcore.TMYRingBuffer import TMYRingBuffer
+    from tlkcore.TMYServiceCache import TMYServiceCache
+    from tlkcore.TMYSettle import TMYSettleDetector
     from tlkcore.TMYPublic import (
         DevInterface,
         RetCode,
@@ -52,6 +71,8 @@ try:
         CellRFMode,     # For CloverCell series AiP
         POLARIZATION    # For CloverCell series AiP
     )
+    # Measurement socket helpers, depends on tlkcore
+    import requests
 except Exception as e:
     myos = platform.system()
     d = os.path.join(sys.path[0], 'tlkcore',)
@@ -85,67 +106,100 @@ class TMYLogFileHandler(logging.FileHandler):
     def __init__(self, fileName, mode):
         super(TMYLogFileHandler, self).__init__(os.path.join(root_path, fileName), mode)
 
+def getDispatcher():
+    """Create service and its dispatch table once, shared by all wrapper calls"""
+    global service, dispatcher
+    if service is None:
+        service = TLKCoreService(log_path=os.path.join(root_path, 'logging_abs.conf'))
+        logger.info("TLKCoreService v%s %s" %(service.queryTLKCoreVer(), "is running" if service.running else "can not run"))
+        logger.info(sys.path)
+    if dispatcher is None or dispatcher.service is not service:
+        dispatcher = TMYDispatcher(service)
+    return dispatcher
+
 def wrapper(*args, **kwarg):
     """It's a wrapper function to help some API developers who can't call TLKCoreService class driectly,
     so developer must define return type if using LabVIEW/MATLAB"""
-    global service
     if len(args) == 0:
         logger.error("Invalid parameter: please passing function name and parameters")
         raise Exception
-    if service is None:
-        service = TLKCoreService(log_path=os.path.join(root_path, 'logging_abs.conf'))
-        logger.info("TLKCoreService v%s %s" %(service.queryTLKCoreVer(), "is running" if service.running else "can not run"))
-        logger.info(sys.path)
+    dispatcher = getDispatcher()
 
     arg_list = list(args)
     func_name = arg_list.pop(0)
-    logger.info("Calling dev_func: \'%s()\'with %r and %r" % (func_name, arg_list, kwarg))
-    if not hasattr(service, func_name):
-        service = None
-        msg = "TLKCoreService not support function name: %s()" %func_name
-        logger.error(msg)
-        raise Exception(msg)
-
-    for i in range(1, len(arg_list)): # skip first for sn
-        p = arg_list[i]
-        if type(p) is str and p.__contains__('.'):
-            try:
-                # Parsing and update to enum type
-                logger.debug("Parsing: %s" %p)
-                str_list = p.split('.')
-                type_str = str_list[0]
-                value_str = str_list[1]
-                f = globals()[type_str]
-                v = getattr(f, value_str)
-                arg_list[i] = v
-            except Exception:
-                service = None
-                msg = "TLKCoreService scan result parsing failed"
-                logger.error(msg)
-                raise Exception(msg)
-
-    # Relfect and execute function in TLKCoreService
-    ret = getattr(service, func_name)(*tuple(arg_list))
+    logger.debug("Calling dev_func: \'%s()\'with %r and %r" % (func_name, arg_list, kwarg))
+
+    # Relfect and execute function in TLKCoreService,
+    # errors are raised to caller but the service is kept for next calls,
+    # errors raised inside service functions are passed through as is
+    try:
+        ret = dispatcher.call(func_name, *arg_list, **kwarg)
+    except TMYDispatchError as e:
+        logger.error(str(e))
+        raise Exception(str(e))
     if not hasattr(ret, "RetCode"):
         return ret
     if ret.RetCode is not RetCode.OK:
-        service = None
         msg = "%s() returned: [%s] %s" %(func_name, ret.RetCode, ret.RetMsg)
         logger.error(msg)
         raise Exception(msg)
 
     if ret.RetData is None:
-        logger.info("%s() returned: %s" %(func_name, ret.RetCode))
+        logger.debug("%s() returned: %s" %(func_name, ret.RetCode))
         return str(ret.RetCode)
     else:
-        logger.info("%s() returned: %s" %(func_name, ret.RetData))
+        logger.debug("%s() returned: %s" %(func_name, ret.RetData))
         return ret.RetData
 
-def startService(root:str=".", direct_connect_info:list=None, dfu_image:str=""):
+def wrapper_batch(calls, policy:str="stop"):
+    """Batch version of wrapper() to pay the cost of calling into Python once for many commands,
+    e.g. [("setBeamAngle", sn, 10, 0, 0), ("setBeamAngle", sn, 10, 5, 0)]
+    or compact {'func': "setBeamAngle", 'sn': sn, 'rows': [[10, 0, 0], [10, 5, 0]]}
+
+    Args:
+        calls (list or dict): Commands executed in order
+        policy (str, optional): "stop" at first error or "continue". Defaults to "stop".
+
+    Returns:
+        dict: {'ok', 'executed', 'failed', 'elapsed', 'results': [{'func', 'ok', 'code', 'data', 'error'}, ...]}
+    """
+    result = getDispatcher().batch(calls, policy)
+    logger.info("Batch executed %d calls, %d failed in %.3fs" %(result['executed'], result['failed'], result['elapsed']))
+    return result
+
+def wrapper_stats():
+    """Per function call count, error count, mean and max latency in seconds of wrapper calls"""
+    return getDispatcher().getStats()
+
+def scanAll(service):
+    """Scan devices of all interfaces, returns {sn: (address, devtype)} or None if nothing found"""
+    # Please select or combine your interface or not pass any parameters: service.scanDevices()
+    interface = DevInterface.ALL #DevInterface.LAN | DevInterface.COMPORT
+    logger.info("Searching devices via: %s" %interface)
+    ret = service.scanDevices(interface=interface)
+
+    scanlist = ret.RetData
+    logger.info("Scanned device list: %s" %scanlist)
+    if ret.RetCode is not RetCode.OK:
+        if len(scanlist) == 0:
+            logger.warning(ret.RetMsg)
+            return None
+        else:
+            input(" === There is some errors while scanning, do you want to continue? ===")
+
+    # You can also get the info for specific SN
+    # scan_dict = service.getScanInfo(sn).RetData
+    return service.getScanInfo().RetData
+
+def startService(root:str=".", direct_connect_info:list=None, dfu_image:str="", refresh:bool=False,
+                 serve_port:int=None, parallel:bool=True, options:dict=None):
     """ALL return type from TLKCoreService always be RetType,
     and it include: RetCode, RetMsg, RetData,
     you could fetch service.func().RetData
-    or just print string result directly if you make sure it always OK"""
+    or just print string result directly if you make sure it always OK
+
+    options (dict) are keyword arguments of device test functions, e.g. {'searchMode': "hierarchical"},
+    each test function only takes the ones it declares"""
     # You can assign a new root directory into TLKCoreService() to change files and log directory
     if Path(root).exists() and Path(root).absolute() != Path(root_path):
         service = TLKCoreService(root)
@@ -156,6 +210,9 @@ def startService(root:str=".", direct_connect_info:list=None, dfu_image:str=""):
     if not service.running:
         return False
 
+    # Cache static queries (DR, channel count, frequency list...) until freq/AAKit/RF mode changes
+    service = TMYServiceCache(service)
+
     if isinstance(direct_connect_info, list) and len(direct_connect_info) == 3:
         # For some developers just connect device and the address always constant (static IP or somthing),
         # So we provide a extend init function to connect device driectly without scanning,
@@ -164,40 +221,90 @@ def startService(root:str=".", direct_connect_info:list=None, dfu_image:str=""):
         direct_connect_info[2] = int(direct_connect_info[2]) # convert to dev_type:int
         # Parameter: SN, Address, Devtype
         ret = service.initDev(*tuple(direct_connect_info))
-        if ret.RetCode is RetCode.OK:
-            testDevice(direct_connect_info[0], service, dfu_image)
+        ready = [direct_connect_info[0]] if ret.RetCode is RetCode.OK else []
+        if ready and serve_port is None:
+            testDevice(direct_connect_info[0], service, dfu_image, options)
     else:
-        # Please select or combine your interface or not pass any parameters: service.scanDevices()
-        interface = DevInterface.ALL #DevInterface.LAN | DevInterface.COMPORT
-        logger.info("Searching devices via: %s" %interface)
-        ret = service.scanDevices(interface=interface)
-
-        scanlist = ret.RetData
-        logger.info("Scanned device list: %s" %scanlist)
-        if ret.RetCode is not RetCode.OK:
-            if len(scanlist) == 0:
-                logger.warning(ret.RetMsg)
+        # Known devices of last run are connected directly, only failed ones are searched again,
+        # new devices are found after inventory expired or with --refresh
+        files_root = root if Path(root).exists() else root_path
+        inventory = TMYInventory(os.path.join(files_root, "files", "inventory.json"), ttl=24*3600)
+        if refresh:
+            inventory.clear()
+        scan_dict = inventory.load()
+        # Keep scan time of the inventory, its ttl counts from the last full scan instead of the last run
+        scan_time = inventory.time
+        cached = bool(scan_dict)
+        if cached:
+            logger.info("Connecting %d devices of inventory, failed last time: %s"
+                        %(len(scan_dict), sorted(inventory.failed)))
+        else:
+            scan_dict = scanAll(service)
+            if not scan_dict:
                 return False
-            else:
-                input(" === There is some errors while scanning, do you want to continue? ===")
-
-        scan_dict = service.getScanInfo().RetData
-        # You can also get the info for specific SN
-        # scan_dict = service.getScanInfo(sn).RetData
-        i = 0
-        for sn, (addr, devtype) in list(scan_dict.items()):
-            i+=1
-            logger.info("====== Dev_%d: %s, %s, %d ======" %(i, sn, addr, devtype))
-
-            # Init device, the first action for device before the operations
-            if service.initDev(sn).RetCode is not RetCode.OK:
-                continue
-            testDevice(sn, service, dfu_image)
+            scan_time = None
+
+        def rescan(failed):
+            """Search failed devices of inventory again on their interfaces, returns {sn: (address, devtype)} found"""
+            interface = TMYInventory.getScope(failed)
+            logger.info("Searching %s via: %s" %(list(failed), interface))
+            service.scanDevices(interface=interface)
+            found = service.getScanInfo().RetData or {}
+            found = {sn: found[sn] for sn in failed if sn in found}
+            scan_dict.update(found)
+            return found
+
+        if parallel:
+            # Init and query all devices concurrently, then test ready devices one by one
+            manager = TMYDeviceManager(service, max_workers=4, timeout=30.0)
+            manager.bringUp(scan_dict if cached else list(scan_dict))
+            failed = {sn: info for sn, info in scan_dict.items() if sn not in manager.getReady()}
+            if cached and failed:
+                found = rescan(failed)
+                if found:
+                    manager.bringUp(list(found))
+            ready = manager.getReady()
+            inventory.save(scan_dict, [sn for sn in scan_dict if sn not in ready], scan_time)
+
+            if serve_port is None:
+                for i, sn in enumerate(ready, 1):
+                    logger.info("====== Dev_%d: %s, %s, %d ======" %(i, sn, *scan_dict[sn]))
+                    testDevice(sn, service, dfu_image, options)
+        else:
+            # Init and test devices one by one
+            def initTest(devices, direct):
+                ready = []
+                for sn, (addr, devtype) in list(devices.items()):
+                    logger.info("====== Dev_%d: %s, %s, %d ======" %(len(ready) + 1, sn, addr, devtype))
+
+                    # Init device, the first action for device before the operations
+                    ret = service.initDev(sn, addr, devtype) if direct else service.initDev(sn)
+                    if ret.RetCode is not RetCode.OK:
+                        continue
+                    ready.append(sn)
+                    if serve_port is None:
+                        testDevice(sn, service, dfu_image, options)
+                return ready
+
+            ready = initTest(scan_dict, cached)
+            failed = {sn: info for sn, info in scan_dict.items() if sn not in ready}
+            if cached and failed:
+                ready += initTest(rescan(failed), False)
+            inventory.save(scan_dict, [sn for sn in scan_dict if sn not in ready], scan_time)
+
+    if serve_port is not None:
+        # Keep service and initialized devices for other processes until Ctrl+C
+        try:
+            TMYControlServer(service, port=serve_port).serveForever()
+        finally:
+            for sn in ready:
+                logger.info("DeInitDev %s: %s" %(sn, service.DeInitDev(sn).RetCode))
 
+    logger.info("Service cache stats: %s" %service.getStats())
     return True
 
-def testDevice(sn, service, dfu_image:str=""):
-    """ A simple query operations to device """
+def testDevice(sn, service, dfu_image:str="", options:dict=None):
+    """ A simple query operations to device, options are passed to the test function if it declares them """
     dev_name = service.getDevTypeName(sn)
     # print(dev_name)
 
@@ -222,6 +329,8 @@ def testDevice(sn, service, dfu_image:str=""):
         elif 'BBox' in dev_name:
             dev_name = "BBox"
         f = globals()["test"+dev_name]
+        params = inspect.signature(f).parameters
+        kw.update({k: v for k, v in (options or {}).items() if k in params})
 
     # Start testing
     f(**kw)
@@ -291,18 +400,14 @@ __caliConfig = {
 
 logger = logging.getLogger(__name__)
 
-# Shared state for plotting
-power_values = []
-theta_values = []
-time_indices = []
-
-def testPD(sn, service):
+def testPD(sn, service, headless:bool=False):
     """
     Perform calibration, voltage/power readings, reboot, and start power plotting with live socket data.
 
     Args:
         sn (str): Serial number of the device.
         service (object): Service object providing methods to interact with the device.
+        headless (bool, optional): Log power to files for long-term monitoring instead of plotting. Defaults to False.
     """
 
 
@@ -316,36 +421,90 @@ def testPD(sn, service):
     target_freq = 28
 
     # Perform multiple voltage and power readings to verify stability
+    voltages = []
+    powers = []
     for _ in range(10):
         voltage = service.getVoltageValue(sn, target_freq)
         logger.info("Fetch voltage: %s", voltage)
 
         power = service.getPowerValue(sn, target_freq)
         logger.info("Power: %s", power)
+        if voltage.RetCode is RetCode.OK and power.RetCode is RetCode.OK:
+            voltages.append(voltage.RetData)
+            powers.append(power.RetData)
+
+    # Same calibration table applied locally, bulk voltage captures could be converted offline in one pass
+    calibration = TMYPDCalibration(__caliConfig)
+    if voltages:
+        local = calibration.toPower(np.array(voltages, dtype=float), target_freq)
+        logger.info("Local conversion max error: %.3f dB",
+                    np.max(np.abs(local - np.array(powers, dtype=float))))
 
     # Test device reboot functionality
     reboot_status = service.reboot(sn)
     logger.info("Reboot test: %s", reboot_status)
 
-    # Connect to external socket server to fetch theta data in real-time
+    # Headless acquisition for long-term monitoring, skips the plotting UI
+    if headless:
+        logPower(sn, service, target_freq)
+        return
+
+    # Connect to external socket server, it sends theta of each step and receives power in real-time,
+    # the connection is kept open and reconnected with backoff if lost,
+    # framed or legacy text protocol of the server is detected automatically
     HOST = ''  # Server IP for receiving theta data
     PORT = 5003              # Server port (must match server configuration)
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    client_socket.connect((HOST, PORT))
+    client = requests.TransmitClient(HOST, PORT)
 
     # Launch the real-time power plotting UI
-    power_plot(sn, service, target_freq=target_freq, client_socket=client_socket)
+    try:
+        power_plot(sn, service, target_freq=target_freq, client=client)
+    finally:
+        client.close()
 
-def power_plot(sn, service, target_freq, client_socket):
+def power_plot(sn, service, target_freq, client, history=500, acq_interval=0.05):
     """
     Plot power readings over time and against theta angle in real-time.
+    A background thread acquires data into a ring buffer at its own rate,
+    the animation only draws a snapshot of it.
 
     Args:
         sn (str): Serial number of the device.
         service (object): Service interface to get power readings.
         target_freq (int): Frequency to use for querying power.
-        client_socket (socket.socket): Connected socket to receive theta data.
+        client (requests.TransmitClient): Persistent client to receive theta and reply power.
+        history (int): Points kept for plotting.
+        acq_interval (float): Seconds between acquisitions.
     """
+    # Rows of (time index, power, theta)
+    buffer = TMYRingBuffer(history, 3)
+    stop = threading.Event()
+
+    def acquire():
+        """
+        Acquisition loop, fetches new power and theta data into ring buffer.
+        """
+        index = 0
+        while not stop.is_set():
+            # Fetch current power value
+            power_data = service.getPowerValue(sn, target_freq)
+            power = np.nan
+            if power_data and hasattr(power_data, 'RetData'):
+                try:
+                    power = float(power_data.RetData)
+                except (ValueError, TypeError):
+                    pass  # Ignore if conversion fails
+
+            # Power is replied on next request of server, theta is the latest one received,
+            # never stall on a slow peer
+            if not np.isnan(power):
+                client.update(power)
+            theta = client.latest
+
+            buffer.append((index, power, np.nan if theta is None else theta))
+            index += 1
+            stop.wait(acq_interval)
+
     fig, (ax1, ax2) = plt.subplots(nrows=2, figsize=(8, 6))
     fig.tight_layout(pad=3.0)
 
@@ -372,54 +531,33 @@ def power_plot(sn, service, target_freq, client_socket):
     def update(frame):
         """
         Update function called periodically by the animation.
-        Fetches new power and theta data and updates the plots accordingly.
+        Reads a snapshot of the ring buffer and updates the plots accordingly.
         """
-        # Fetch current power value
-        power_data = service.getPowerValue(sn, target_freq)
-        power = None
-        if power_data and hasattr(power_data, 'RetData'):
-            try:
-                power = float(power_data.RetData)
-            except (ValueError, TypeError):
-                pass  # Ignore if conversion fails
-
-        # Fetch current theta from socket
-        theta = None
-        try:
-            client_socket.settimeout(1.5)
-            theta_raw = requests.transmit(client_socket, power_data.RetData)  # Assuming this sends power data and gets theta
-            theta = float(theta_raw)
-        except:
-            pass  # Ignore communication or parsing errors
-
-        # Append values to global lists (maintain sliding window of 500 points)
-        power_values.append(power)
-        time_indices.append(len(time_indices))
-        theta_values.append(theta)
-
-        if len(power_values) > 500:
-            power_values.pop(0)
-            time_indices.pop(0)
-        if len(theta_values) > 500:
-            theta_values.pop(0)
+        data = buffer.snapshot()
+        if len(data) == 0:
+            return power_line, theta_scatter, current_power_text
+        time_indices, power_values, theta_values = data.T
 
         # Update power vs. time line plot
-        if power_values:
-            power_line.set_data(time_indices, power_values)
-            current_power_text.set_text(f"Current Power: {power_values[-1]:.2f} dBm")
+        power_line.set_data(time_indices, power_values)
+        current_power_text.set_text(f"Current Power: {power_values[-1]:.2f} dBm")
 
         # Update power vs. theta scatter plot
-        points = np.column_stack((theta_values, power_values))
-        theta_scatter.set_offsets(points)
+        theta_scatter.set_offsets(data[:, [2, 1]])
 
         # Keep the time plot moving
-        ax1.set_xlim(max(0, len(time_indices) - 500), len(time_indices) + 1)
+        ax1.set_xlim(time_indices[0], time_indices[-1] + 1)
 
         return power_line, theta_scatter, current_power_text
 
-    # Launch the animation
+    # Launch the acquisition thread and the animation
+    acquisition = threading.Thread(target=acquire, daemon=True)
+    acquisition.start()
     ani = FuncAnimation(fig, update, interval=500, blit=True)
     plt.show()
+    stop.set()
+    acquisition.join()
+
     for freq, config in __caliConfig.items():
         logger.info("Process cali %s: %s" %(freq, service.setCaliConfig(sn, {freq: config})))
 
@@ -429,13 +567,26 @@ def power_plot(sn, service, target_freq, client_socket):
         logger.info("        power: %s" %service.getPowerValue(sn, target_freq))
     logger.info("Reboot test: %s" %service.reboot(sn))
 
-    while(True):
-        try:
-            logger.info("power: %s" %(service.getPowerValue(sn, target_freq)))
-            time.sleep(0.5)
-        except (KeyboardInterrupt, SystemExit):
-            print("Detected Ctrl+C")
-            break
+    logPower(sn, service, target_freq)
+
+def logPower(sn, service, target_freq, duration=None):
+    """
+    Log power readings as fast as the device allows until Ctrl+C or duration,
+    records are written to files/power_log/ and rolling statistics are logged periodically.
+
+    Args:
+        sn (str): Serial number of the device.
+        service (object): Service interface to get power readings.
+        target_freq (int): Frequency to use for querying power.
+        duration (float, optional): Seconds to log, None for until Ctrl+C.
+    """
+    def read():
+        ret = service.getPowerValue(sn, target_freq)
+        return ret.RetData if ret.RetCode is RetCode.OK else None
+
+    power_logger = TMYPowerLogger(read, os.path.join(root_path, "files", "power_log"),
+                                  windows=(100, 1000, 10000), report_interval=60.0)
+    power_logger.run(duration=duration)
 
 def testUDBox(sn, service):
     logger.info("PLO state: %r" %service.getUDState(sn, UDState.PLO_LOCK).RetData)
@@ -740,9 +891,15 @@ def testBBox(sn, service):
 
         batch_import = False
         if batch_import:
-            batch = TMYBeamConfig(sn, service)
-            if not batch.applyBeams():
-                logger.error("Beam Config setting failed")
+            # Validate csv once then load the compiled table on later runs,
+            # it is compiled again automatically once the csv or gain limits of device changed
+            table = "CustomBatchBeams.npz"
+            if not os.path.exists(table):
+                table = TMYBeamConfig(sn, service).compile("CustomBatchBeams.csv", table) or "CustomBatchBeams.csv"
+            batch = TMYBeamConfig(sn, service, path=table)
+            # Only write beams which differ from device, re-applying an edited table writes just the edits
+            if not batch.applyBeams(diff=True):
+                logger.error("Beam Config setting failed: %s" %batch.stats)
                 return
         else:
             if aakit_selected:
@@ -814,13 +971,17 @@ def testBBox(sn, service):
 
 logger = logging.getLogger(__name__)
 
-def testBBoard(sn, service):
+def testBBoard(sn, service, trackBeam:bool=False, framedProtocol:bool=True):
     """
     Configure and test the beamforming board (BBoard). This includes:
     - RF mode setup
     - Frequency and AAKit configuration
     - Beam steering phase setup based on user-input theta
     - Real-time communication with client via socket to send theta and receive power
+
+    Args:
+        trackBeam (bool, optional): Keep tracking around the entered theta instead of repeating it. Defaults to False.
+        framedProtocol (bool, optional): Binary framed measurement protocol, False for legacy text clients. Defaults to True.
     """
 
     logger.info("Static IP: %s", service.queryStaticIP(sn))
@@ -908,6 +1069,36 @@ def testBBoard(sn, service):
         conn, addr = server_socket.accept()
         with conn:
             print(f"[RECEIVER] Connected by {addr}")
+            link = TMYMeasLink(conn) if framedProtocol else TMYTextLink(conn)
+
+            if trackBeam:
+                # Precompute phase codes of all theta in one batch, shape: (181, 4)
+                theta_grid = np.arange(-90, 91)
+                grid_codes = (np.round(np.outer(180 * np.sin(np.radians(theta_grid)) / phase_step_deg,
+                                                element_indices))).astype(int) % 64
+
+                def apply(idx):
+                    for ch in range(1, 5):
+                        service.setChannelPhaseStep(sn, ch, int(grid_codes[idx][ch - 1]))
+
+                def measure(idx):
+                    return link.exchange(idx, float(theta_grid[idx]))
+
+                for ch in range(1, 5):
+                    service.switchChannel(sn, ch, False)
+                # Poll each probed theta until stable, readings right after apply are power of the previous one
+                settle = TMYSettleDetector(tolerance=0.2, count=3, interval=0.05, timeout=1.2, min_wait=0.05)
+                tracker = TMYBeamTracker((len(theta_grid), 1), apply, measure,
+                                         start=int(np.argmin(np.abs(theta_grid - theta))),
+                                         radius=1, hysteresis=1.0, max_latency=0.5, settle=settle, wrap_phi=False)
+                tracker.run(interval=0.1)
+                logger.info("Tracked theta: %s, power: %s", theta_grid[tracker.current], tracker.power)
+                return
+
+            # Send current theta to the connected client, then receive power data
+            read = lambda: link.exchange(0, theta)
+            # Wait switch latency of phase steps first, readings before it could be power of the previous setting
+            settle = TMYSettleDetector(read, tolerance=0.2, count=3, interval=0.05, timeout=1.2, min_wait=0.05)
 
             while True:
                 try:
@@ -929,18 +1120,13 @@ def testBBoard(sn, service):
                         logger.warning("[RECEIVER] Skipping this theta due to channel error.")
                         continue
 
-                    time.sleep(1.2)
-
-                    # Send current theta to the connected client
-                    conn.sendall(str(theta).encode())
-
-                    # Receive power data from client
-                    data = conn.recv(1024)
-                    try:
-                        power = float(data.decode())
-                        logger.info(f"[RECEIVER] Received power: {power} at theta: {theta}")
-                    except ValueError:
-                        logger.warning(f"[RECEIVER] Invalid power value received: {data.decode()}")
+                    # Send current theta to the connected client and receive power data,
+                    # until readings are stable instead of sleeping a fixed 1.2s
+                    power, settled, elapsed = settle.wait()
+                    if power is not None:
+                        logger.info(f"[RECEIVER] Received power: {power} at theta: {theta}, settle: {elapsed:.3f}s")
+                    else:
+                        logger.warning(f"[RECEIVER] No valid power value received at theta: {theta}")
 
                 except (KeyboardInterrupt, SystemExit):
                     print("Detected Ctrl+C, shutting down receiver.")
@@ -1067,7 +1253,9 @@ def testCloverCell(sn, service):
 path loss modeling and experimental measurement (IEEE Xplore, 2021)
 https://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=9206044 """
 
-def testRIS(sn, service):  # Works in 3D for 28 GHz 32x32 RIS
+def testRIS(sn, service, searchMode:str="exhaustive", pruneFraction:float=1.0, rx_prior:tuple=None,
+            trackBeam:bool=False, framedProtocol:bool=True, receivers:int=1,
+            pipeline:bool=True, verify:str="every", verify_every:int=20):  # Works in 3D for 28 GHz 32x32 RIS
     """
     Scans and determines the optimal reflection angles (theta_out, phi_out)
     that yield the best received power by configuring RIS phase profiles
@@ -1079,6 +1267,20 @@ def testRIS(sn, service):  # Works in 3D for 28 GHz 32x32 RIS
     Args:
         sn (str): Serial number of the RIS device
         service (object): Interface object for controlling RIS hardware
+        searchMode (str, optional): "exhaustive" scans the whole grid, "hierarchical" searches coarse-to-fine,
+            "optimize" refines the best hierarchical pattern element-wise by measured power. Defaults to "exhaustive".
+        pruneFraction (float, optional): Only measure this top fraction of patterns by predicted array-factor gain,
+            1.0 to measure all. Defaults to 1.0.
+        rx_prior (tuple, optional): Receiver direction (theta, phi) for pruning, or region ([theta, ...], [phi, ...]),
+            required if pruneFraction < 1.0. Defaults to None.
+        trackBeam (bool, optional): Keep tracking around the best direction after searching. Defaults to False.
+        framedProtocol (bool, optional): Binary framed measurement protocol, False for legacy text clients. Defaults to True.
+        receivers (int, optional): Measurement clients to serve concurrently,
+            e.g. several receiver positions in one sweep. Defaults to 1.
+        pipeline (bool, optional): Prepare next pattern and log previous result while current one is measured. Defaults to True.
+        verify (str, optional): Pattern readback policy: "always", "every" (verify_every steps), "error" or "never",
+            each readback costs one more getRISPattern() round trip. Defaults to "every".
+        verify_every (int, optional): Steps between readbacks of "every" policy. Defaults to 20.
     """
     logger = logging.getLogger("RIS")
     logger.info("Get Net config: %s", service.getNetInfo(sn))
@@ -1097,7 +1299,6 @@ def testRIS(sn, service):  # Works in 3D for 28 GHz 32x32 RIS
     wavelength = 3e8 / freq                 # meters (≈ 0.0107 m)
     dx = wavelength / 2                     # element spacing (0.5 lambda)
     dy = dx
-    d = dx
 
     # Prompt user for theta_in_deg (0 to 180) and phi_in_deg (-180 to 180)
     while True:
@@ -1124,74 +1325,100 @@ def testRIS(sn, service):  # Works in 3D for 28 GHz 32x32 RIS
 
     HOST = '0.0.0.0'
     PORT = 5003
-    all_results = []
 
-    # --- Compute (x, y) positions for RIS elements centered at array's center ---
-    x = (np.arange(col) - (col - 1) / 2) * dx
-    y = (np.arange(row) - (row - 1) / 2) * dy
-    xx, yy = np.meshgrid(x, y)  # Shape: (row, col)
-
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        server_socket.bind((HOST, PORT))
-        server_socket.listen()
-
-        print(f"[RECEIVER] Listening on port {PORT}...")
-
-        conn, addr = server_socket.accept()
-        with conn:
-            print(f"[RECEIVER] Connected by {addr}")
-            time.sleep(1.5)
-
-            # --- 3D sweep over reflection directions ---
-            for theta_out_deg in range(0, 180, 1):  # Example: single elevation step (adjust as needed)
-                for phi_out_deg in range(0, 360, 10):   # Sweep azimuth every 10°
-                    try:
-                        # Convert angles to radians
-                        theta_in = np.deg2rad(theta_in_deg)
-                        phi_in = np.deg2rad(phi_in_deg)
-                        theta_out = np.deg2rad(theta_out_deg)
-                        phi_out = np.deg2rad(phi_out_deg)
-
-                        # Compute directional deltas (incident - outgoing)
-                        delta_x = np.sin(theta_in) * np.cos(phi_in) - np.sin(theta_out) * np.cos(phi_out)
-                        delta_y = np.sin(theta_in) * np.sin(phi_in) - np.sin(theta_out) * np.sin(phi_out)
-
-                        # Compute phase profile across RIS
-                        phase = -2 * np.pi / wavelength * (delta_x * xx + delta_y * yy)
-                        phase_mod = np.mod(phase, 2 * np.pi)
-
-                        # 1-bit quantization (threshold at π)
-                        pattern = (phase_mod >= np.pi).astype(int).tolist()
-
-                        result = service.setRISPattern(sn, pattern)
-                        logger.info(f"Set RIS pattern for reflection (theta={theta_out_deg}, phi={phi_out_deg}): {result.RetCode}")
-
-                        p = service.getRISPattern(sn, [mid]).RetData
-                        logger.info(f"Get RIS pattern: {str(p)[:80]}")  # Truncated for readability
-
-                        time.sleep(1)
-
-                        # Send current reflection azimuth to client
-                        conn.sendall(f"{phi_out_deg}".encode())
+    # --- Precompute all reflection patterns of the sweep grid in one batch, or load it from cache ---
+    cache = TMYRISCodebookCache(os.path.join(root_path, "files", "ris_codebook"))
+    codebook = cache.get([row, col], freq, theta_in_deg, phi_in_deg,
+                         theta_list=range(0, 180, 1),   # Example: elevation step (adjust as needed)
+                         phi_list=range(0, 360, 10),    # Sweep azimuth every 10°
+                         dx=dx, dy=dy)
+
+    def sweepWith(link):
+        """Search with a measurement link (TMYMeasLink, TMYTextLink or TMYMeasHub)"""
+        def exchange(id, value, tag):
+            # Hub records results per client under tag, so optimizer/tracker steps are kept out of sweep records
+            return link.exchange(id, value, tag=tag) if isinstance(link, TMYMeasHub) else link.exchange(id, value)
+
+        def measure(theta_out_deg, phi_out_deg, tag="sweep"):
+            # Send pattern id with current reflection azimuth to client, then receive power value
+            power = exchange(codebook.index(theta_out_deg, phi_out_deg), phi_out_deg, tag)
+            if power is not None:
+                logger.debug(f"[RECEIVER] Received power: {power} at (theta, phi): ({theta_out_deg}, {phi_out_deg})")
+            return power
+
+        # Poll power until stable instead of sleeping a fixed 1s after each pattern
+        # min_wait covers RIS pattern switch latency, change_wait ignores power of the previous pattern for a while
+        settle = TMYSettleDetector(tolerance=0.2, count=3, interval=0.05, timeout=1.0,
+                                   min_wait=0.05, change_wait=0.2)
+        sweep = TMYRISSweep(sn, service, codebook, measure, mid=mid, settle=settle, pipeline=pipeline,
+                            verify=verify, verify_every=verify_every)
+        if searchMode in ("hierarchical", "optimize"):
+            # Coarse grid first, then refine around top_k candidates with finer (theta, phi) strides
+            all_results = sweep.search(levels=((15, 3), (5, 1), (1, 1)), top_k=3)
+        else:
+            indices = None
+            if pruneFraction < 1.0 and rx_prior is None:
+                logger.warning("Pruning requires rx_prior, measure all patterns")
+            elif pruneFraction < 1.0:
+                predictor = TMYRISPredictor(codebook)
+                indices = predictor.select(pruneFraction, theta_rx=rx_prior[0], phi_rx=rx_prior[1])
+            all_results = sweep.run(indices)
+        logger.info("Sweep stats: %s", sweep.getStats())
+        logger.info("Settle stats: %s", settle.getStats())
+
+        if searchMode == "optimize" and all_results:
+            # Closed-loop flipping of rows then columns, starting from the best geometric pattern
+            theta_best, phi_best, _ = TMYRISSweep.top(all_results, 1)[0]
+            optimizer = TMYRISOptimizer(sn, service, [row, col],
+                                        lambda step: exchange(step, step, "optimize"),
+                                        budget=500, patience=100, settle=settle)
+            optimizer.greedy(codebook.getBits(codebook.index(theta_best, phi_best)), unit="row")
+            optimizer.greedy(unit="col")
+            # Or probe with Hadamard basis then vote: optimizer.probe("hadamard", n=256)
+            logger.info("Optimized power: %.2f with %d measurements, convergence: %s",
+                        optimizer.best_power, optimizer.measurements, optimizer.history[-10:])
+            service.setRISPattern(sn, optimizer.best_bits.tolist())
+
+        if trackBeam and all_results:
+            theta_best, phi_best, _ = TMYRISSweep.top(all_results, 1)[0]
+            tracker = TMYBeamTracker(codebook.shape,
+                                     lambda idx: service.setRISPattern(sn, codebook.getPattern(idx)),
+                                     lambda idx: measure(*codebook.getAngle(idx), tag="track"),
+                                     start=codebook.index(theta_best, phi_best),
+                                     radius=1, hysteresis=1.0, max_latency=0.5, settle=settle)
+            tracker.run(interval=0.1)
+            logger.info("Tracked direction: %s, power: %s",
+                        codebook.getAngle(tracker.current), tracker.power)
+        return all_results
+
+    if receivers > 1:
+        # Fan out each step to several measurement clients, settled results are also recorded per client
+        with TMYMeasHub(HOST, PORT, timeout=5.0) as hub:
+            print(f"[RECEIVER] Waiting {receivers} clients on port {PORT}...")
+            hub.waitClients(receivers)
+            all_results = sweepWith(hub)
+            for name, best in hub.top("sweep", 3).items():
+                logger.info("Client %s top 3 (theta, phi, power): %s",
+                            name, [(*codebook.getAngle(id), power) for id, _, power in best])
+    else:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+            server_socket.bind((HOST, PORT))
+            server_socket.listen()
 
-                        # Receive power value
-                        data = conn.recv(1024)
-                        try:
-                            power = float(data.decode())
-                            logger.info(f"[RECEIVER] Received power: {power} at (theta, phi): ({theta_out_deg}, {phi_out_deg})")
-                            all_results.append((theta_out_deg, phi_out_deg, power))
+            print(f"[RECEIVER] Listening on port {PORT}...")
 
-                        except ValueError:
-                            logger.warning(f"[RECEIVER] Invalid power value received: {data.decode()}")
+            conn, addr = server_socket.accept()
+            with conn:
+                print(f"[RECEIVER] Connected by {addr}")
 
-                    except (KeyboardInterrupt, SystemExit):
-                        print("Detected Ctrl+C")
-                        break
+                # Length-prefixed binary exchange, or text for legacy clients
+                link = TMYMeasLink(conn) if framedProtocol else TMYTextLink(conn)
+                all_results = sweepWith(link)
 
     # Display top 3 received power values with corresponding reflection angles
     print("\nTop 3 Power Values and Corresponding (Theta, Phi):")
     if all_results:
-        top3 = sorted(all_results, key=lambda x: x[2], reverse=True)[:3]
+        top3 = TMYRISSweep.top(all_results, 3)
         for idx, (theta_ris_deg, phi_ris_deg, power) in enumerate(top3, 1):
             print(f"  #{idx}:")
             print(f"    Theta_ris: {theta_ris_deg}°")
@@ -1219,7 +1446,33 @@ if __name__ == '__main__':
     parser.add_argument("--dc", help="Direct connect device to skip scanning, must provide 3 parameters: SN IP dev_type", metavar=('SN','Address','DevType'), nargs=3)
     parser.add_argument("--dfu", help="DFU image path", type=str, default="")
     parser.add_argument("--root", help="The root path/directory of for log/ & files/", type=str, default=".")
+    parser.add_argument("--refresh", help="Ignore device inventory and scan all interfaces", action="store_true")
+    parser.add_argument("--serve", help="Run local control server on PORT instead of device tests", type=int, metavar="PORT")
+    parser.add_argument("--sequential", help="Init and test devices one by one instead of bringing them up concurrently", action="store_true")
+    # Options of device test functions
+    parser.add_argument("--headless", help="PD: log power to files instead of plotting", action="store_true")
+    parser.add_argument("--track", help="BBoard/RIS: keep tracking the best beam after searching", action="store_true")
+    parser.add_argument("--text-protocol", help="BBoard/RIS: legacy text measurement clients", action="store_true")
+    parser.add_argument("--search", help="RIS: search mode", choices=("exhaustive", "hierarchical", "optimize"), default="exhaustive")
+    parser.add_argument("--prune", help="RIS: only measure this top fraction of patterns by predicted gain, requires --rx", type=float, default=1.0, metavar="FRACTION")
+    parser.add_argument("--rx", help="RIS: receiver direction for pruning", type=float, nargs=2, metavar=('THETA','PHI'))
+    parser.add_argument("--receivers", help="RIS: measurement clients to serve concurrently", type=int, default=1)
+    parser.add_argument("--no-pipeline", help="RIS: prepare and measure patterns one after another", action="store_true")
+    parser.add_argument("--verify", help="RIS: pattern readback policy", choices=VERIFY, default="every")
+    parser.add_argument("--verify-every", help="RIS: steps between readbacks of 'every' policy", type=int, default=20, metavar="N")
     args = parser.parse_args()
 
-    startService(args.root, args.dc, args.dfu)
+    options = {
+        'headless': args.headless,
+        'trackBeam': args.track,
+        'framedProtocol': not args.text_protocol,
+        'searchMode': args.search,
+        'pruneFraction': args.prune,
+        'rx_prior': tuple(args.rx) if args.rx else None,
+        'receivers': args.receivers,
+        'pipeline': not args.no_pipeline,
+        'verify': args.verify,
+        'verify_every': args.verify_every,
+    }
+    startService(args.root, args.dc, args.dfu, args.refresh, args.serve, not args.sequential, options)
     logger.info("========= end =========")
\ No newline at end of file
@@ -1,4 +1,11 @@
+import logging
 import socket
+import threading
+import time
+
+from tlkcore.TMYMeasProtocol import serveReceiver
+
+logger = logging.getLogger("requests")
 
 def transmit(client_socket,mgs):
     response = client_socket.recv(1024)
@@ -13,3 +20,119 @@ def transmit(client_socket,mgs):
     client_socket.sendall(message.encode('utf-8'))
     return response
     # Optional: Receive reply from server
+
+class TransmitClient():
+    def __init__(self, host:str, port:int, protocol:str="auto", backoff:float=0.5, max_backoff:float=10.0):
+        """
+        Persistent connection of PD to the measurement server (e.g. testBBoard/testRIS on port 5003),
+        the server sends theta of each step and this client replies the latest power set by update().
+        Replies never wait the device, so acquisition keeps its own rate.
+        Reconnects with exponential backoff if connection is lost.
+
+        Args:
+            host (str): Server address
+            port (int): Server port
+            protocol (str, optional): "framed" answers REQUEST frames with REPLY frames of same seq and id,
+                                      "text" receives theta text then sends power text as the legacy servers,
+                                      "auto" detects it by first byte from server. Defaults to "auto".
+            backoff (float, optional): First reconnect delay in seconds. Defaults to 0.5.
+            max_backoff (float, optional): Max reconnect delay in seconds. Defaults to 10.0.
+        """
+        if protocol not in ("auto", "framed", "text"):
+            raise ValueError("Invalid protocol: %s" %protocol)
+        self.__addr = (host, port)
+        self.__protocol = protocol
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__lock = threading.Lock()
+        self.__sock = None
+        self.__power = float("nan")
+        self.__closed = False
+        # Last theta from server and its arrival time, for callers which should never block
+        self.latest = None
+        self.latest_time = None
+        self.replies = 0
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    @property
+    def connected(self):
+        return self.__sock is not None
+
+    def update(self, power:float):
+        """Set the latest measured power, it is sent on next request of server"""
+        self.__power = float(power)
+
+    def __respond(self, id:int, value:float):
+        self.latest, self.latest_time = value, time.time()
+        self.replies += 1
+        return self.__power
+
+    def __connect(self):
+        delay = self.__backoff
+        while not self.__closed:
+            try:
+                sock = socket.create_connection(self.__addr, timeout=self.__max_backoff)
+                sock.settimeout(None)
+                logger.info("Connected to %s:%d" %self.__addr)
+                return sock
+            except OSError as e:
+                logger.warning("Connect to %s:%d failed: %s, retry in %.1fs" %(*self.__addr, e, delay))
+                time.sleep(delay)
+                delay = min(delay * 2, self.__max_backoff)
+        return None
+
+    def __serveText(self, sock:socket.socket):
+        """Legacy exchange: theta text in, power text out"""
+        while True:
+            data = sock.recv(1024)
+            if not data:
+                break
+            try:
+                theta = float(data.decode())
+            except ValueError:
+                logger.warning("Invalid theta received: %s" %data)
+                continue
+            sock.sendall(str(self.__respond(0, theta)).encode())
+
+    def __run(self):
+        """Answer requests of server and reconnect if needed"""
+        while not self.__closed:
+            sock = self.__connect()
+            if sock is None:
+                break
+            with self.__lock:
+                self.__sock = sock
+            try:
+                protocol = self.__protocol
+                if protocol == "auto":
+                    # Frames start with a big-endian length, legacy servers send theta as text
+                    first = sock.recv(1, socket.MSG_PEEK)
+                    if not first:
+                        raise ConnectionError("Server closed connection")
+                    protocol = "framed" if first == b"\x00" else "text"
+                    logger.info("Server protocol: %s" %protocol)
+                if protocol == "framed":
+                    serveReceiver(sock, self.__respond)
+                else:
+                    self.__serveText(sock)
+                if not self.__closed:
+                    logger.warning("Server closed connection")
+            except (OSError, ValueError) as e:
+                if not self.__closed:
+                    logger.warning("Connection lost: %s" %e)
+            with self.__lock:
+                self.__sock = None
+            sock.close()
+
+    def close(self):
+        self.__closed = True
+        with self.__lock:
+            sock = self.__sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self.__thread.join(timeout=1.0)
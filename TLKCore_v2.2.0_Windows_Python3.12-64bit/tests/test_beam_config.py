@@ -0,0 +1,148 @@
+import copy
+
+import numpy as np
+import pytest
+
+from tlkcore.TMYBeamConfig import BEAM_TABLE, TMYBeamConfig, normalizeChannelGains
+from tlkcore.TMYPublic import BeamType, RetCode, RFMode
+
+CSV = """Mode,BeamID,BeamType,beam_db,beam_theta,beam_phi,ch,ch_sw,ch_db,ch_deg
+TX,1,0,-1.3,-1,,,,,
+RX,2,0,,0,-1,,,,
+TX,3,1,,,,1,0,-1,-1
+TX,3,1,,,,2,,3.5,
+"""
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK):
+        self.RetCode, self.RetData, self.RetMsg = code, data, ""
+
+class _SimBeamService():
+    def __init__(self):
+        self.dr = {'TX': [-20, 15], 'RX': [-20, 15]}
+        self.beams = {}
+        self.writes = 0
+    def getAAKitInfo(self, sn):
+        return _Ret({})
+    def getChannelCount(self, sn):
+        return _Ret(8)
+    def getDR(self, sn):
+        return _Ret(copy.deepcopy(self.dr))
+    def getCOMDR(self, sn):
+        return _Ret([[[-5, 15]] * 2] * 2)
+    def getELEDR(self, sn):
+        return _Ret([[20] * 2] * 2)
+    def getBeamPattern(self, sn, mode, beam_id):
+        return _Ret(copy.deepcopy(self.beams.get((mode, beam_id),
+                                                 {'beam_type': 0, 'beam_config': {'db': 1, 'theta': 0, 'phi': 0}})))
+    def setBeamPattern(self, sn, mode, beam_id, beam_type, config):
+        self.writes += 1
+        key = 'beam_config' if beam_type is BeamType.BEAM else 'channel_config'
+        self.beams[(mode, beam_id)] = {'beam_type': beam_type.value, key: copy.deepcopy(config)}
+        return _Ret()
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "beams.csv"
+    path.write_text(CSV)
+    return str(path)
+
+def test_read_table_masks(csv_path):
+    table = TMYBeamConfig.readTable(csv_path)
+    assert table.dtype == BEAM_TABLE and len(table) == 4
+    # -1 and 0 are values, only empty fields are unassigned
+    assert table['db'][0] == -1.3 and table['theta'][0] == -1 and not table['has_phi'][0]
+    assert not table['has_db'][1] and table['has_theta'][1] and table['phi'][1] == -1
+    assert table['has_sw'][2] and table['deg'][2] == -1
+    assert not table['has_sw'][3] and not table['has_deg'][3] and table['db'][3] == 3.5
+
+def test_parse_keeps_minus_one(csv_path):
+    config = TMYBeamConfig("SN", _SimBeamService(), path=csv_path).getConfig()
+    assert config['TX']['1']['config'] == [-1.3, -1, None]
+    assert config['RX']['2']['config'] == [None, 0, -1]
+    assert config['TX']['3']['config'] == {'1': [0, -1.0, -1], '2': [None, 3.5, None]}
+
+def test_compiled_table_matches_csv(csv_path, tmp_path):
+    service = _SimBeamService()
+    out = TMYBeamConfig("SN", service, path=csv_path).compile(csv_path, str(tmp_path / "beams.npz"))
+    assert out is not None
+    assert TMYBeamConfig("SN", service, path=out).getConfig() == \
+        TMYBeamConfig("SN", service, path=csv_path).getConfig()
+
+def test_edited_csv_recompiled(csv_path, tmp_path):
+    service = _SimBeamService()
+    out = TMYBeamConfig("SN", service, path=csv_path).compile(csv_path, str(tmp_path / "beams.npz"))
+    with open(csv_path, "a") as f:
+        f.write("RX,4,0,2,10,20,,,,\n")
+    config = TMYBeamConfig("SN", service, path=out).getConfig()
+    assert config['RX']['4']['config'] == [2.0, 10, 20]
+    # Compiled again with the new hash, loading does not compile again
+    with np.load(out) as data:
+        assert str(data['hash']) == TMYBeamConfig.hashFile(csv_path)
+
+def test_stale_limits_fail_if_table_invalid(csv_path, tmp_path):
+    service = _SimBeamService()
+    out = TMYBeamConfig("SN", service, path=csv_path).compile(csv_path, str(tmp_path / "beams.npz"))
+    # Beam db -1.3 no longer fits the gain range of device
+    service.dr['TX'] = [0, 15]
+    batch = TMYBeamConfig("SN", service, path=out)
+    assert batch.getConfig() is None
+    assert not batch.applyBeams()
+
+def test_validate_table(csv_path):
+    table = TMYBeamConfig.readTable(csv_path)
+    limits = {'channel_count': 8, 'dr': {'TX': [-20, 15], 'RX': [-20, 15]},
+              'com_dr': [[[-5, 15]] * 2] * 2, 'ele_dr': [[20] * 2] * 2}
+    assert TMYBeamConfig.validateTable(table, limits) == []
+    limits['channel_count'] = 1
+    limits['dr']['TX'] = [0, 15]
+    errors = TMYBeamConfig.validateTable(table, limits)
+    assert len(errors) == 2
+    assert any("ch_2" in e for e in errors) and any("BeamID 01" in e for e in errors)
+
+def test_normalize_channel_gains():
+    ele = [[[0, 2, 4, 6], [-3, 0, 1, 2]],
+           [[-8, 0, 0, 0], [0, 30, 0, 0]]]
+    result = normalizeChannelGains(ele, [[10, 10], [0, 10]], [[-5, 15], [-5, 15]], [20, 20])
+    np.testing.assert_allclose(result['common'], [[10, 7], [-8, 10]])
+    np.testing.assert_allclose(result['element'][0, 1], [0, 3, 4, 5])
+    np.testing.assert_array_equal(result['adjusted'], [[False, True], [True, False]])
+    np.testing.assert_array_equal(result['spread_error'], [[False, False], [False, True]])
+    np.testing.assert_array_equal(result['common_error'], [[False, False], [True, False]])
+    np.testing.assert_array_equal(result['valid'], [True, False])
+
+def test_normalize_keeps_common_above_max():
+    # Common gain above max but not lowered is left to device, as before vectorizing
+    result = normalizeChannelGains([[[0, 1, 2, 3]]], [[20]], [[-5, 15]], [20])
+    assert result['valid'][0] and not result['common_error'][0, 0]
+
+def channelBeam(common_db):
+    board = {'common_db': common_db}
+    board.update({'channel_%d' %c: {'sw': 0, 'db': 0, 'deg': 0} for c in range(1, 5)})
+    return {'beam_type': BeamType.CHANNEL.value,
+            'channel_config': {'board_1': copy.deepcopy(board), 'board_2': copy.deepcopy(board)}}
+
+def test_apply_channel_beams(csv_path):
+    service = _SimBeamService()
+    service.beams[(RFMode.TX, 3)] = channelBeam(0)
+    batch = TMYBeamConfig("SN", service, path=csv_path)
+    assert batch.applyBeams()
+    assert batch.stats == {'written': 3, 'skipped': 0, 'failed': 0}
+    board = service.beams[(RFMode.TX, 3)]['channel_config']['board_1']
+    # ch1 -1 dB lowers common gain of board 1 from 0 to -1, other gains are kept
+    assert board['common_db'] == -1.0
+    assert [board['channel_%d' %c]['db'] for c in range(1, 5)] == [0, 4.5, 1, 1]
+    assert service.beams[(RFMode.TX, 3)]['channel_config']['board_2']['common_db'] == 0
+    assert batch.applyBeams(diff=True)
+    assert batch.stats == {'written': 0, 'skipped': 3, 'failed': 0}
+
+def test_invalid_channel_beam_writes_nothing(tmp_path):
+    path = tmp_path / "beams.csv"
+    # Lowering common gain of RX beam 5 to -10 is below min common gain -5
+    path.write_text(CSV + "RX,5,1,,,,1,,-10,\n")
+    service = _SimBeamService()
+    service.beams[(RFMode.TX, 3)] = channelBeam(0)
+    service.beams[(RFMode.RX, 5)] = channelBeam(0)
+    batch = TMYBeamConfig("SN", service, path=str(path))
+    assert not batch.applyBeams()
+    assert service.writes == 0 and batch.stats['failed'] == 1
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from tlkcore.TMYBeamTracker import TMYBeamTracker
+
+class _SimBeam():
+    """Power of the applied beam from a (theta, phi) map, the first reading after apply
+    is still power of the previous beam if lag is set"""
+    def __init__(self, power_map, lag:bool=False):
+        self.map = np.asarray(power_map, dtype=float)
+        self.applied = []
+        self.lag = lag
+        self.__previous = None
+        self.__fresh = False
+        self.invalid = set()
+    def apply(self, idx):
+        self.__previous = self.applied[-1] if self.applied else idx
+        self.__fresh = True
+        self.applied.append(idx)
+    def measure(self, idx):
+        if self.applied[-1] in self.invalid:
+            return None
+        beam = self.__previous if self.lag and self.__fresh else self.applied[-1]
+        self.__fresh = False
+        return float(self.map.flat[beam])
+
+class _Settle():
+    """Poll until two readings match, like TMYSettleDetector without timing"""
+    def __init__(self):
+        self.waits = 0
+    def wait(self, read):
+        self.waits += 1
+        last, value = None, read()
+        while value != last:
+            last, value = value, read()
+        return value, True, 0.0
+
+def peak_map(shape, peak):
+    ti, pj = np.indices(shape)
+    return -(np.abs(ti - peak[0]) + np.abs(pj - peak[1])).astype(float)
+
+def test_neighbours_at_theta_edges():
+    sim = _SimBeam(np.zeros((5, 6)))
+    tracker = TMYBeamTracker((5, 6), sim.apply, sim.measure)
+    # Nearest first, phi wraps around
+    assert tracker.neighbours(0) == [1, 5, 6, 7, 11]
+    assert tracker.neighbours(27) == [21, 26, 28, 20, 22]
+    tracker = TMYBeamTracker((5, 6), sim.apply, sim.measure, wrap_phi=False)
+    assert tracker.neighbours(0) == [1, 6, 7]
+    assert tracker.neighbours(29) == [23, 28, 22]
+
+def test_neighbours_single_phi():
+    sim = _SimBeam(np.zeros((4, 1)))
+    tracker = TMYBeamTracker((4, 1), sim.apply, sim.measure, radius=2, wrap_phi=False)
+    assert tracker.neighbours(0) == [1, 2]
+    assert tracker.neighbours(2) == [1, 3, 0]
+
+@pytest.mark.parametrize("gain, moved", [(0.5, False), (2.0, True)])
+def test_hysteresis(gain, moved):
+    power_map = np.zeros((3, 3))
+    power_map[1, 2] = gain
+    sim = _SimBeam(power_map)
+    tracker = TMYBeamTracker((3, 3), sim.apply, sim.measure, start=4, hysteresis=1.0, wrap_phi=False)
+    current, power = tracker.step()
+    assert (current == 5) is moved
+    assert power == (gain if moved else 0.0)
+    assert tracker.stats['moves' if moved else 'hits'] == 1
+
+def test_tracks_moving_peak():
+    sim = _SimBeam(peak_map((10, 12), (5, 5)))
+    tracker = TMYBeamTracker((10, 12), sim.apply, sim.measure, start=5 * 12 + 5, hysteresis=0.5)
+    sim.map = peak_map((10, 12), (7, 8))
+    tracker.run(iterations=5)
+    assert tracker.current == 7 * 12 + 8 and tracker.power == 0.0
+
+def test_miss_on_invalid_power():
+    sim = _SimBeam(peak_map((3, 3), (1, 1)))
+    tracker = TMYBeamTracker((3, 3), sim.apply, sim.measure, start=0)
+    sim.invalid.add(0)
+    applied = len(sim.applied)
+    assert tracker.step() == (0, None)
+    assert tracker.stats['misses'] == 1 and tracker.stats['hits'] == 0
+    # No neighbour is probed without a valid reference
+    assert len(sim.applied) == applied
+
+def test_miss_on_latency_overrun():
+    sim = _SimBeam(peak_map((3, 3), (1, 1)))
+    tracker = TMYBeamTracker((3, 3), sim.apply, sim.measure, start=0, max_latency=0)
+    assert tracker.step() == (0, -2.0)
+    assert tracker.stats['misses'] == 1 and tracker.stats['hits'] == 1
+    assert sim.applied == [0, 0]
+
+def test_tracked_beam_reapplied_after_probing():
+    sim = _SimBeam(peak_map((5, 5), (2, 3)))
+    tracker = TMYBeamTracker((5, 5), sim.apply, sim.measure, start=12, wrap_phi=False)
+    current, _ = tracker.step()
+    assert current == 13
+    assert sim.applied[1:-1] == tracker.neighbours(12)
+    assert sim.applied[-1] == 13
+
+def test_settle_waits_after_each_apply():
+    power_map = peak_map((5, 5), (2, 4))
+    # Without settling, each neighbour is scored by power of the previously applied one
+    sim = _SimBeam(power_map, lag=True)
+    tracker = TMYBeamTracker((5, 5), sim.apply, sim.measure, start=12, hysteresis=0.5, wrap_phi=False)
+    assert tracker.step()[0] != 13
+
+    sim = _SimBeam(power_map, lag=True)
+    settle = _Settle()
+    tracker = TMYBeamTracker((5, 5), sim.apply, sim.measure, start=12, hysteresis=0.5,
+                             settle=settle, wrap_phi=False)
+    assert tracker.step() == (13, -1.0)
+    # Each probe plus the restore of the tracked beam
+    assert settle.waits == len(tracker.neighbours(12)) + 1
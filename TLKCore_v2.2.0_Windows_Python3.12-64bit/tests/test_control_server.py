@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from tlkcore import TMYControlServer as control
+from tlkcore.TMYControlServer import JSON, TMYControlClient, TMYControlServer
+from tlkcore.TMYPublic import RetCode, RFMode
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK, msg=""):
+        self.RetCode, self.RetData, self.RetMsg = code, data, msg
+
+class _SimService():
+    """Simulated service, records overlapping calls of one device"""
+    def __init__(self):
+        self.mode = {}
+        self.angle = {}
+        self.log = []
+        self.lock = threading.Lock()
+    def querySN(self, sn):
+        return _Ret(sn)
+    def setRFMode(self, sn, mode):
+        self.mode[sn] = mode
+        return _Ret()
+    def getRFMode(self, sn):
+        return _Ret(self.mode.get(sn, RFMode.TX))
+    def setBeamAngle(self, sn, db, theta, phi):
+        if theta > 45:
+            return _Ret(code=RetCode.ERROR_BF_BEAM, msg="Theta out of range")
+        with self.lock:
+            self.log.append((sn, theta))
+        time.sleep(0.002)
+        self.angle[sn] = (db, theta, phi)
+        return _Ret()
+    def getObject(self, sn):
+        return _Ret(object())
+
+@pytest.fixture
+def server():
+    with TMYControlServer(_SimService(), port=0) as server:
+        yield server
+
+@pytest.mark.parametrize("codec", [JSON, None])
+def test_call_with_enum_tokens(server, codec):
+    if codec is None and control.msgpack is None:
+        pytest.skip("msgpack not installed")
+    with TMYControlClient(*server.address, codec=codec) as client:
+        assert client.call("setRFMode", "SN0", "RFMode.RX")['ok']
+        reply = client.call("getRFMode", "SN0")
+        assert reply['ok'] and reply['data'] == "RFMode.RX" and reply['code'] == str(RetCode.OK)
+        # kwargs tokens are parsed as well
+        assert client.call("setRFMode", "SN1", mode="RFMode.RX")['ok']
+        assert server.dispatcher.service.mode["SN1"] is RFMode.RX
+
+def test_errors(server):
+    with TMYControlClient(*server.address, codec=JSON) as client:
+        reply = client.call("noSuchFunction", "SN0")
+        assert not reply['ok'] and reply['error'].startswith("TMYUnsupportedFuncError")
+        reply = client.call("setBeamAngle", "SN0", 10, 60, 0)
+        assert not reply['ok'] and reply['error'] == "Theta out of range"
+        # Unknown result types are reported instead of sent as str()
+        reply = client.call("getObject", "SN0")
+        assert not reply['ok'] and reply['error'].startswith("TypeError")
+        # Connection is still usable
+        assert client.call("querySN", "SN0")['data'] == "SN0"
+
+def test_batch(server):
+    with TMYControlClient(*server.address, codec=JSON) as client:
+        reply = client.batch({'func': "setBeamAngle", 'sn': "SN0", 'rows': [[10, t, 0] for t in (0, 15, 60, 10)]},
+                             policy="continue")
+        assert reply['executed'] == 4 and reply['failed'] == 1
+        assert [r['ok'] for r in reply['results']] == [True, True, False, True]
+
+def test_batches_of_one_device_do_not_interleave(server):
+    service = server.dispatcher.service
+    def worker(base):
+        with TMYControlClient(*server.address, codec=JSON) as client:
+            calls = [("setBeamAngle", "SN%d" %(i % 2), 10, base + i, 0) for i in range(10)]
+            assert client.batch(calls)['ok']
+    threads = [threading.Thread(target=worker, args=(base,)) for base in (0, 20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for sn in ("SN0", "SN1"):
+        thetas = [theta for s, theta in service.log if s == sn]
+        assert len(thetas) == 10
+        # Each batch holds the device until done, so its calls are contiguous
+        assert thetas in (sorted(thetas), sorted(thetas, key=lambda t: (t < 20, t)))
+
+def test_concurrent_clients(server):
+    errors = []
+    def worker(sn):
+        try:
+            with TMYControlClient(*server.address) as client:
+                for theta in range(0, 40, 5):
+                    assert client.call("setBeamAngle", sn, 10, theta, 0)['ok']
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker, args=("SN%d" %i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert server.dispatcher.getStats()["setBeamAngle"]['calls'] == 24
+
+def test_plain_rejects_unknown_types():
+    assert control._plain(RFMode.TX) == "RFMode.TX"
+    assert control._plain((1, 2)) == [1, 2]
+    with pytest.raises(TypeError):
+        control._plain(object())
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from tlkcore.TMYDeviceManager import TMYDeviceManager
+from tlkcore.TMYPublic import RetCode
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK, msg=""):
+        self.RetCode, self.RetData, self.RetMsg = code, data, msg
+
+class _SimService():
+    def __init__(self, delays=None, fail=()):
+        self.delays = delays or {}
+        self.fail = fail
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.inited = []
+        self.deinited = []
+    def initDev(self, sn, *info):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            delay = self.delays.get(sn, 0.01)
+            if delay is None:
+                # Hangs until released
+                self.release.wait(5.0)
+            else:
+                time.sleep(delay)
+            if sn in self.fail:
+                return _Ret(code=RetCode.ERROR, msg="No response")
+            self.inited.append((sn, info))
+            return _Ret()
+        finally:
+            with self.lock:
+                self.active -= 1
+    def DeInitDev(self, sn):
+        self.deinited.append(sn)
+        return _Ret()
+    def getDevTypeName(self, sn):
+        return "BBoxOne"
+    def queryFWVer(self, sn):
+        return _Ret("2.0.0")
+    def queryHWVer(self, sn):
+        return _Ret("1.0")
+
+def test_bounded_concurrency_and_report():
+    service = _SimService(delays={"SN%d" %i: 0.05 for i in range(6)}, fail=("SN5",))
+    manager = TMYDeviceManager(service, max_workers=2, timeout=2.0)
+    report = manager.bringUp({"SN%d" %i: ("192.168.100.%d" %i, 9) for i in range(6)})
+    assert service.max_active == 2
+    assert sorted(manager.getReady()) == ["SN%d" %i for i in range(5)]
+    assert report["SN0"]['queryFWVer'] == "2.0.0" and 'initialized' not in report["SN0"]
+    assert report["SN5"]['error'].startswith("initDev")
+    assert ("SN1", ("192.168.100.1", 9)) in service.inited
+
+def test_hung_device_times_out_and_is_released_later():
+    service = _SimService(delays={"HUNG": None})
+    manager = TMYDeviceManager(service, max_workers=1, timeout=0.2)
+    start = time.monotonic()
+    report = manager.bringUp(["HUNG", "SN1", "SN2"])
+    # Remaining devices are taken over by a new worker instead of waiting the hung one
+    assert time.monotonic() - start < 2.0
+    assert not report["HUNG"]['ready'] and "Timeout" in report["HUNG"]['error']
+    assert report["SN1"]['ready'] and report["SN2"]['ready']
+    assert service.deinited == []
+    # The hung device comes up late, it is not reported ready so it is closed
+    service.release.set()
+    deadline = time.monotonic() + 2.0
+    while not service.deinited and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.deinited == ["HUNG"]
+    assert "HUNG" not in manager.getReady()
+
+def test_workers_are_daemon_threads():
+    service = _SimService(delays={"HUNG": None})
+    TMYDeviceManager(service, max_workers=1, timeout=0.1).bringUp(["HUNG"])
+    workers = [t for t in threading.enumerate() if t.name.startswith("BringUp")]
+    assert workers and all(t.daemon for t in workers)
+    service.release.set()
@@ -0,0 +1,76 @@
+import pytest
+
+from tlkcore.TMYDispatcher import (TMYDispatchError, TMYDispatcher, TMYEnumTokenError,
+                                   TMYUnsupportedFuncError, getEnumTokens)
+from tlkcore.TMYPublic import BeamType, RetCode, RFMode
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK, msg=""):
+        self.RetCode, self.RetData, self.RetMsg = code, data, msg
+
+class _SimService():
+    def __init__(self):
+        self.calls = []
+    def initDev(self, sn, address=None, devtype=None):
+        self.calls.append(("initDev", sn, address, devtype))
+        return _Ret()
+    def setRFMode(self, sn, mode):
+        self.calls.append(("setRFMode", sn, mode))
+        return _Ret()
+    def setBeamAngle(self, sn, db, theta, phi):
+        if theta > 45:
+            return _Ret(code=RetCode.ERROR_BF_BEAM, msg="Theta out of range")
+        return _Ret((db, theta, phi))
+    def broken(self, sn, value):
+        # Errors of service functions are not dispatch errors
+        raise ValueError("bad value inside service")
+
+@pytest.fixture
+def dispatcher():
+    return TMYDispatcher(_SimService())
+
+def test_enum_tokens():
+    tokens = getEnumTokens()
+    assert tokens["RFMode.TX"] is RFMode.TX and tokens["BeamType.CHANNEL"] is BeamType.CHANNEL
+
+def test_parse_only_known_enum_tokens(dispatcher):
+    args = dispatcher.parseArgs(["SN.1", "RFMode.RX", "192.168.100.111", "C:/files/table.csv", 1.5, "Foo.Bar"])
+    assert args == ["SN.1", RFMode.RX, "192.168.100.111", "C:/files/table.csv", 1.5, "Foo.Bar"]
+    with pytest.raises(TMYEnumTokenError):
+        dispatcher.parseArgs(["SN", "RFMode.TXX"])
+
+def test_call(dispatcher):
+    assert dispatcher.call("setRFMode", "SN", "RFMode.TX").RetCode is RetCode.OK
+    dispatcher.call("initDev", "SN", "192.168.100.111", 9)
+    assert dispatcher.service.calls == [("setRFMode", "SN", RFMode.TX), ("initDev", "SN", "192.168.100.111", 9)]
+    assert dispatcher.hasFunc("setBeamAngle") and not dispatcher.hasFunc("_SimService__x")
+
+def test_dispatch_errors(dispatcher):
+    with pytest.raises(TMYUnsupportedFuncError):
+        dispatcher.call("noSuchFunction", "SN")
+    with pytest.raises(TMYDispatchError):
+        dispatcher.call("setRFMode", "SN", "RFMode.XX")
+    # Raised by service, not caught as dispatch error
+    with pytest.raises(ValueError) as e:
+        dispatcher.call("broken", "SN", 1)
+    assert not isinstance(e.value, TMYDispatchError)
+    stats = dispatcher.getStats()
+    assert stats["noSuchFunction"]['errors'] == 1 and stats["broken"]['errors'] == 1
+
+def test_expand_calls():
+    assert TMYDispatcher.expandCalls([("f", ["SN", 1]), ("g", "SN", 2), ["h"]]) == \
+        [("f", ("SN", 1)), ("g", ("SN", 2)), ("h", ())]
+    assert TMYDispatcher.expandCalls({'func': "f", 'sn': "SN", 'rows': [[1, 2], 3]}) == \
+        [("f", ("SN", 1, 2)), ("f", ("SN", 3))]
+
+@pytest.mark.parametrize("policy, executed", [("stop", 2), ("continue", 3)])
+def test_batch_policy(dispatcher, policy, executed):
+    result = dispatcher.batch({'func': "setBeamAngle", 'sn': "SN", 'rows': [[10, 0, 0], [10, 60, 0], [10, 5, 0]]},
+                              policy)
+    assert result['executed'] == executed and result['failed'] == 1 and not result['ok']
+    assert result['results'][0]['data'] == (10, 0, 0)
+    assert result['results'][1]['error'] == "Theta out of range"
+
+def test_batch_invalid_policy(dispatcher):
+    with pytest.raises(ValueError):
+        dispatcher.batch([], "retry")
@@ -0,0 +1,53 @@
+import json
+import time
+
+from tlkcore.TMYInventory import TMYInventory
+from tlkcore.TMYPublic import DevInterface
+
+DEVICES = {"D2230E013-28": ("192.168.100.111", 9), "D2104L011-28": ("COM5", 12), "UD-BD22470039-24": ("", 18)}
+
+def test_round_trip_keeps_failed(tmp_path):
+    inventory = TMYInventory(str(tmp_path / "files" / "inventory.json"))
+    assert inventory.load() is None and inventory.time is None
+    inventory.save(DEVICES, failed=["D2104L011-28", "unknown"])
+    assert inventory.load() == DEVICES
+    assert inventory.failed == {"D2104L011-28"}
+
+def test_scan_time_is_kept(tmp_path):
+    path = tmp_path / "inventory.json"
+    inventory = TMYInventory(str(path), ttl=100)
+    scan_time = time.time() - 50
+    inventory.save(DEVICES, scan_time=scan_time)
+    inventory.load()
+    assert inventory.time == scan_time
+    # Saving a cached inventory again does not extend its ttl
+    inventory.save(DEVICES, scan_time=inventory.time)
+    assert json.loads(path.read_text())['time'] == scan_time
+
+def test_expired(tmp_path):
+    inventory = TMYInventory(str(tmp_path / "inventory.json"), ttl=10)
+    inventory.save(DEVICES, scan_time=time.time() - 11)
+    assert inventory.load() is None and inventory.time is None
+
+def test_old_format_and_broken_file(tmp_path):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps({'time': time.time(), 'devices': {"SN": ["192.168.1.2", "9"]}}))
+    inventory = TMYInventory(str(path))
+    assert inventory.load() == {"SN": ("192.168.1.2", 9)} and inventory.failed == set()
+    path.write_text("{")
+    assert inventory.load() is None
+
+def test_clear(tmp_path):
+    inventory = TMYInventory(str(tmp_path / "inventory.json"))
+    inventory.save(DEVICES)
+    inventory.clear()
+    assert inventory.load() is None
+    inventory.clear()
+
+def test_interface_scope():
+    assert TMYInventory.getInterface("192.168.100.111") == DevInterface.LAN
+    assert TMYInventory.getInterface("COM5") == DevInterface.COMPORT
+    assert TMYInventory.getInterface("/dev/ttyUSB0") == DevInterface.COMPORT
+    assert TMYInventory.getInterface("") == DevInterface.USB
+    assert TMYInventory.getScope({k: DEVICES[k] for k in ("D2230E013-28", "D2104L011-28")}) == \
+        DevInterface.LAN | DevInterface.COMPORT
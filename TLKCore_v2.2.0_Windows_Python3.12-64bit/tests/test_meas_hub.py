@@ -0,0 +1,52 @@
+import socket
+import threading
+
+import pytest
+
+from tlkcore.TMYMeasHub import TMYMeasHub
+from tlkcore.TMYMeasProtocol import serveReceiver
+
+def connect(hub, respond):
+    conn = socket.create_connection(hub.address)
+
+    def serve():
+        try:
+            serveReceiver(conn, respond)
+        except OSError:
+            # Closed by hub or test
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return conn
+
+@pytest.fixture
+def hub():
+    with TMYMeasHub("127.0.0.1", 0, timeout=2.0) as hub:
+        yield hub
+
+def test_fanout_and_reduce(hub):
+    conns = [connect(hub, lambda id, value: -id), connect(hub, lambda id, value: -id - 5)]
+    try:
+        assert hub.waitClients(2, timeout=2.0) == 2
+        assert hub.exchange(3, 30.0) == -3
+        assert sorted(hub.step(4, 40.0).values()) == [-9, -4]
+    finally:
+        for c in conns:
+            c.close()
+
+def test_records_last_poll_per_step_and_tag(hub):
+    polls = iter([-20.0, -11.0, -10.0, -1.0, -30.0])
+    conn = connect(hub, lambda id, value: next(polls))
+    try:
+        hub.waitClients(1, timeout=2.0)
+        # Settle detector polls step 7 three times, only the settled reading is kept
+        for _ in range(3):
+            hub.exchange(7, 70.0)
+        hub.exchange(8, 80.0, tag="optimize")
+        hub.exchange(9, 90.0, tag=None)
+        (records,) = hub.records.values()
+        assert records == {'sweep': {7: (70.0, -10.0)}, 'optimize': {8: (80.0, -1.0)}}
+        assert list(hub.top("sweep").values()) == [[(7, 70.0, -10.0)]]
+    finally:
+        conn.close()
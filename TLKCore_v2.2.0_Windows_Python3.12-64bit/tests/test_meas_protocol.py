@@ -0,0 +1,90 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from tlkcore.TMYMeasProtocol import (REPLY, REQUEST, TMYFrameReader, TMYMeasLink, TMYTextLink,
+                                     packFrame, serveReceiver)
+
+RECORDS = [(1, 10, 100.5, -3.25), (2, 11, 101.0, 45.0)]
+
+def test_round_trip():
+    frames = TMYFrameReader().feed(packFrame(REPLY, RECORDS))
+    assert frames == [(REPLY, RECORDS)]
+
+def test_partial_reads():
+    data = packFrame(REQUEST, RECORDS)
+    reader = TMYFrameReader()
+    frames = []
+    for i in range(len(data)):
+        frames += reader.feed(data[i:i+1])
+    assert frames == [(REQUEST, RECORDS)]
+
+def test_coalesced_frames():
+    data = packFrame(REQUEST, RECORDS[:1]) + packFrame(REPLY, RECORDS[1:]) + packFrame(REPLY, [])
+    reader = TMYFrameReader()
+    # Second frame is split across two reads
+    cut = len(data) - 10
+    frames = reader.feed(data[:cut]) + reader.feed(data[cut:])
+    assert frames == [(REQUEST, RECORDS[:1]), (REPLY, RECORDS[1:]), (REPLY, [])]
+
+def test_sequence_wraps_to_uint32():
+    frames = TMYFrameReader().feed(packFrame(REQUEST, [(2**32 + 5, 7, 0.0, 1.0)]))
+    assert frames[0][1][0][0] == 5
+
+@pytest.mark.parametrize("payload", [struct.pack("!BBH", 9, REPLY, 0),
+                                     struct.pack("!BBH", 1, REPLY, 2) + b"\0" * 24])
+def test_invalid_frame(payload):
+    reader = TMYFrameReader()
+    with pytest.raises(ValueError):
+        reader.feed(struct.pack("!I", len(payload)) + payload)
+    # Buffer is dropped, the next valid frame is still parsed
+    assert reader.feed(packFrame(REPLY, RECORDS)) == [(REPLY, RECORDS)]
+
+def test_link_with_receiver():
+    server, client = socket.socketpair()
+    def serve():
+        try:
+            serveReceiver(client, lambda id, value: id * 10 + value)
+        except OSError:
+            pass
+
+    receiver = threading.Thread(target=serve, daemon=True)
+    receiver.start()
+    try:
+        link = TMYMeasLink(server, timeout=2.0)
+        assert link.exchange(3, 0.5) == 30.5
+        seqs = link.requestBatch([(1, 0), (2, 0), (4, 0.25)])
+        assert [r[2] for r in link.wait(seqs)] == [10, 20, 40.25]
+    finally:
+        server.close()
+        receiver.join(timeout=2.0)
+        client.close()
+
+def test_link_timeout_drops_late_reply():
+    server, client = socket.socketpair()
+    try:
+        link = TMYMeasLink(server, timeout=0.1)
+        assert link.exchange(1, 0) is None
+        # Reply of abandoned request arrives late, then the next request gets its own reply
+        reader = TMYFrameReader()
+        (_, [first]), = reader.feed(client.recv(1024))
+        client.sendall(packFrame(REPLY, [(first[0], first[1], 0.0, -99.0)]))
+        seq = link.request(2, 0)
+        client.sendall(packFrame(REPLY, [(seq, 2, 0.0, -5.0)]))
+        assert link.wait([seq])[0][2] == -5.0
+    finally:
+        server.close()
+        client.close()
+
+def test_text_link():
+    server, client = socket.socketpair()
+    try:
+        link = TMYTextLink(server, timeout=1.0)
+        client.sendall(b"-12.5")
+        assert link.exchange(0, 30) == -12.5
+        assert client.recv(1024) == b"30"
+    finally:
+        server.close()
+        client.close()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from tlkcore.TMYPDCalibration import TMYPDCalibration
+
+CONFIG = {
+    "28GHz": {"lowPower": -36, "lowVolt": 80.0, "highPower": -5, "highVolt": 980.0},
+    "0.3GHz": {"lowPower": -35, "lowVolt": 40.0, "highPower": -5, "highVolt": 900.0},
+    "30000MHz": {"lowPower": -34, "lowVolt": 100.0, "highPower": -4, "highVolt": 1000.0},
+}
+
+@pytest.fixture(scope="module")
+def cali():
+    return TMYPDCalibration(CONFIG)
+
+@pytest.mark.parametrize("freq, ghz", [("28GHz", 28.0), ("500MHz", 0.5), (" 1.5 GHz ", 1.5),
+                                       ("2400", 2400.0), (3, 3.0), ("10kHz", 1e-5)])
+def test_parse_freq(freq, ghz):
+    assert TMYPDCalibration.parseFreq(freq) == pytest.approx(ghz)
+
+@pytest.mark.parametrize("freq", ["abc", "28THz", ""])
+def test_parse_invalid_freq(freq):
+    with pytest.raises(ValueError):
+        TMYPDCalibration.parseFreq(freq)
+
+def test_table_sorted_by_freq(cali):
+    np.testing.assert_allclose(cali.freqs, [0.3, 28.0, 30.0])
+
+def test_calibration_points_map_exactly(cali):
+    np.testing.assert_allclose(cali.toPower([80.0, 980.0], 28), [-36, -5])
+    np.testing.assert_allclose(cali.toVoltage([-36, -5], 28), [80.0, 980.0])
+
+def test_interpolates_between_and_holds_beyond(cali):
+    low_p, low_v, high_p, high_v = cali.getPoints([29.0, 100.0, 0.1])
+    np.testing.assert_allclose(low_p, [-35, -34, -35])
+    np.testing.assert_allclose(low_v, [90.0, 100.0, 40.0])
+    np.testing.assert_allclose(high_v, [990.0, 1000.0, 900.0])
+
+def test_bulk_conversion_shape_and_clip(cali):
+    volts = np.linspace(0, 1200, 12).reshape(3, 4)
+    power = cali.toPower(volts, 28)
+    assert power.shape == (3, 4)
+    np.testing.assert_allclose(cali.toVoltage(power, 28), volts)
+    clipped = cali.toPower(volts, 28, clip=True)
+    assert clipped.min() == -36 and clipped.max() == -5
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        TMYPDCalibration({})
+    with pytest.raises(ValueError):
+        TMYPDCalibration({"28GHz": {"lowPower": -36, "lowVolt": 900, "highPower": -5, "highVolt": 80}})
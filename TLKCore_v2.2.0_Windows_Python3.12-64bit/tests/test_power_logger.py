@@ -0,0 +1,83 @@
+import glob
+import os
+import time
+
+import numpy as np
+import pytest
+
+from tlkcore.TMYPowerLogger import TMYPowerLogger
+
+class _Source():
+    """Fake power reading, calls on_read(n) before returning the n-th value"""
+    def __init__(self, values=None, on_read=None, delay:float=0):
+        self.values = values
+        self.on_read = on_read
+        self.delay = delay
+        self.n = 0
+    def __call__(self):
+        self.n += 1
+        if self.on_read:
+            self.on_read(self.n)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.values is None:
+            return -20.0 - self.n * 0.1
+        return self.values[(self.n - 1) % len(self.values)]
+
+def records(root):
+    return [TMYPowerLogger.load(path) for path in sorted(glob.glob(os.path.join(root, "*.bin")))]
+
+def test_chunk_rollover_and_load(tmp_path):
+    source = _Source()
+    power_logger = TMYPowerLogger(source, str(tmp_path), flush_records=10, flush_interval=1e9,
+                                  chunk_records=30, report_interval=0)
+    start = time.time()
+    power_logger.run(count=95)
+    chunks = records(tmp_path)
+    assert [len(c) for c in chunks] == [30, 30, 30, 5]
+    assert power_logger.chunks == 4 and power_logger.path == sorted(glob.glob(os.path.join(tmp_path, "*.bin")))[-1]
+
+    data = np.concatenate(chunks)
+    expected = np.array([-20.0 - n * 0.1 for n in range(1, 96)], dtype=np.float32)
+    assert data['power'].dtype == np.float32
+    np.testing.assert_array_equal(data['power'], expected)
+    assert np.all(np.diff(data['time']) >= 0)
+    assert start <= data['time'][0] and data['time'][-1] <= time.time()
+
+def test_flush_by_count(tmp_path):
+    on_disk = {}
+    source = _Source(on_read=lambda n: on_disk.__setitem__(n, sum(len(c) for c in records(tmp_path))))
+    TMYPowerLogger(source, str(tmp_path), flush_records=10, flush_interval=1e9, report_interval=0).run(count=25)
+    assert on_disk[10] == 0
+    assert on_disk[11] == on_disk[20] == 10
+    assert on_disk[21] == 20
+    # The rest is flushed when stopped
+    assert sum(len(c) for c in records(tmp_path)) == 25
+
+def test_flush_by_interval(tmp_path):
+    on_disk = {}
+    source = _Source(on_read=lambda n: on_disk.__setitem__(n, sum(len(c) for c in records(tmp_path))), delay=0.03)
+    TMYPowerLogger(source, str(tmp_path), flush_records=1000, flush_interval=0.02, report_interval=0).run(count=4)
+    # Each reading takes longer than flush_interval, so records are written one by one
+    assert [on_disk[n] for n in range(1, 5)] == [0, 1, 2, 3]
+
+def test_failed_readings_and_stats_windows(tmp_path):
+    source = _Source([1.0, None, "bad", 3.0, 5.0, None, None, None])
+    power_logger = TMYPowerLogger(source, str(tmp_path), windows=(3, 8), report_interval=0)
+    power_logger.run(count=8)
+    assert power_logger.count == 8 and power_logger.failures == 5
+
+    stats = power_logger.getStats()
+    assert stats[3] is None
+    assert stats[8]['n'] == 3
+    assert (stats[8]['min'], stats[8]['max'], stats[8]['mean'], stats[8]['p50']) == (1.0, 5.0, 3.0, 3.0)
+
+    power = np.concatenate(records(tmp_path))['power']
+    assert np.isnan(power).sum() == 5
+    np.testing.assert_array_equal(power[~np.isnan(power)], [1.0, 3.0, 5.0])
+
+def test_stats_keep_latest_readings(tmp_path):
+    power_logger = TMYPowerLogger(_Source(list(range(10))), str(tmp_path), windows=(4,), report_interval=0)
+    power_logger.run(count=10)
+    assert power_logger.getStats()[4] == pytest.approx({'n': 4, 'min': 6.0, 'max': 9.0, 'mean': 7.5,
+                                                         'p5': 6.15, 'p50': 7.5, 'p95': 8.85})
@@ -0,0 +1,50 @@
+import threading
+
+import numpy as np
+
+from tlkcore.TMYRingBuffer import TMYRingBuffer
+
+def test_snapshot_before_full():
+    buffer = TMYRingBuffer(4, 2)
+    assert buffer.snapshot().shape == (0, 2)
+    buffer.append((0, 10))
+    buffer.append((1, 11))
+    np.testing.assert_array_equal(buffer.snapshot(), [[0, 10], [1, 11]])
+    assert len(buffer) == 2
+
+def test_wraps_oldest_to_newest():
+    buffer = TMYRingBuffer(3)
+    for i in range(8):
+        buffer.append(i)
+    np.testing.assert_array_equal(buffer.snapshot().ravel(), [5, 6, 7])
+    assert len(buffer) == 3 and buffer.count == 8
+
+def test_snapshot_is_a_copy():
+    buffer = TMYRingBuffer(2)
+    buffer.append(1)
+    snap = buffer.snapshot()
+    snap[0] = 99
+    buffer.append(2)
+    buffer.append(3)
+    snap = buffer.snapshot()
+    snap[:] = 0
+    np.testing.assert_array_equal(buffer.snapshot().ravel(), [2, 3])
+
+def test_concurrent_snapshots_are_ordered():
+    buffer = TMYRingBuffer(64, 2)
+    done = threading.Event()
+
+    def write():
+        for i in range(20000):
+            buffer.append((i, -i))
+        done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not done.is_set():
+        snap = buffer.snapshot()
+        if len(snap):
+            assert np.all(np.diff(snap[:, 0]) == 1)
+            np.testing.assert_array_equal(snap[:, 1], -snap[:, 0])
+    writer.join()
+    assert buffer.snapshot()[-1, 0] == 19999
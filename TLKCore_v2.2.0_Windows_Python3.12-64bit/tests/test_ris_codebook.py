@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from tlkcore.TMYRISCodebook import TMYRISCodebook
+
+def reference(antenna_size, freq, theta_in, phi_in, theta_out, phi_out):
+    """Per-step pattern formula of the original sweep loop"""
+    row, col = antenna_size
+    wavelength = 3e8 / freq
+    dx = dy = wavelength / 2
+    x = (np.arange(col) - (col - 1) / 2) * dx
+    y = (np.arange(row) - (row - 1) / 2) * dy
+    xx, yy = np.meshgrid(x, y)
+    ti, pi_, to, po = np.deg2rad([theta_in, phi_in, theta_out, phi_out])
+    delta_x = np.sin(ti) * np.cos(pi_) - np.sin(to) * np.cos(po)
+    delta_y = np.sin(ti) * np.sin(pi_) - np.sin(to) * np.sin(po)
+    phase = np.mod(-2 * np.pi / wavelength * (delta_x * xx + delta_y * yy), 2 * np.pi)
+    return (phase >= np.pi).astype(np.uint8)
+
+@pytest.fixture(scope="module")
+def codebook():
+    return TMYRISCodebook([8, 12], 28e9, 30, 45, theta_list=range(0, 90, 7), phi_list=range(0, 360, 40))
+
+def test_matches_reference_formula(codebook):
+    for idx in range(0, len(codebook), 5):
+        theta, phi = codebook.getAngle(idx)
+        np.testing.assert_array_equal(codebook.getBits(idx),
+                                      reference([8, 12], 28e9, 30, 45, theta, phi))
+
+def test_grid_order_and_index(codebook):
+    assert codebook.shape == (13, 9)
+    assert len(codebook) == 13 * 9
+    assert codebook.packed.shape == (len(codebook), codebook.nbytes)
+    for idx in (0, 1, 9, len(codebook) - 1):
+        assert codebook.index(*codebook.getAngle(idx)) == idx
+    theta, phi = codebook.getAngle(10)
+    assert isinstance(theta, int) and (theta, phi) == (7, 40)
+
+def test_pattern_and_digest(codebook):
+    pattern = codebook.getPattern(3)
+    assert len(pattern) == 8 and len(pattern[0]) == 12
+    assert codebook.digest(pattern) == codebook.getDigest(3)
+    assert codebook.digest([[0] * 3]) is None
+
+def test_packed_shape_mismatch(codebook):
+    with pytest.raises(ValueError):
+        TMYRISCodebook([8, 12], 28e9, 30, 45, theta_list=[0], phi_list=[0], packed=codebook.packed)
@@ -0,0 +1,46 @@
+import os
+
+import numpy as np
+import pytest
+
+from tlkcore import TMYRISCodebook as codebook_module
+from tlkcore.TMYRISCodebook import TMYRISCodebookCache
+
+GRID = dict(theta_list=range(0, 60, 5), phi_list=range(0, 360, 30))
+
+def test_store_then_load_memory_mapped(tmp_path):
+    cache = TMYRISCodebookCache(str(tmp_path))
+    first = cache.get([8, 8], 28e9, 30, 45, **GRID)
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].endswith(".npy")
+
+    second = cache.get([8, 8], 28e9, 30, 45, **GRID)
+    assert isinstance(second.packed, np.memmap)
+    assert not second.packed.flags.writeable
+    np.testing.assert_array_equal(first.packed, second.packed)
+
+def test_key_depends_on_geometry_and_angles():
+    key = TMYRISCodebookCache.makeKey([8, 8], 28e9, 30, 45, GRID['theta_list'], GRID['phi_list'])
+    assert key == TMYRISCodebookCache.makeKey([8, 8], 28e9, 30.0, 45, list(GRID['theta_list']), GRID['phi_list'])
+    assert key != TMYRISCodebookCache.makeKey([8, 8], 28e9, 31, 45, GRID['theta_list'], GRID['phi_list'])
+    assert key != TMYRISCodebookCache.makeKey([8, 16], 28e9, 30, 45, GRID['theta_list'], GRID['phi_list'])
+    assert key != TMYRISCodebookCache.makeKey([8, 8], 28e9, 30, 45, GRID['theta_list'], GRID['phi_list'], dx=0.004)
+
+def test_evict_least_recently_used(tmp_path):
+    TMYRISCodebookCache(str(tmp_path)).get([8, 8], 28e9, 30, 45, **GRID)
+    old = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    os.utime(old, (1, 1))
+    # Room for one codebook only, older one is evicted when storing a new one
+    cache = TMYRISCodebookCache(str(tmp_path), max_bytes=os.path.getsize(old))
+    cache.get([8, 8], 28e9, 40, 45, **GRID)
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and os.path.join(tmp_path, files[0]) != old
+
+def test_failed_store_removes_temp_file(tmp_path, monkeypatch):
+    def broken_save(f, packed):
+        raise OSError("disk full")
+    monkeypatch.setattr(codebook_module.np, "save", broken_save)
+    cache = TMYRISCodebookCache(str(tmp_path))
+    codebook = cache.get([8, 8], 28e9, 30, 45, **GRID)
+    assert len(codebook) == 12 * 12
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from tlkcore.TMYPublic import RetCode
+from tlkcore.TMYRISOptimizer import TMYRISOptimizer
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK):
+        self.RetCode, self.RetData, self.RetMsg = code, data, ""
+
+class _SimRIS():
+    """1-bit RIS with a real channel, the planted optimum (or its flip) reaches 0 dB"""
+    def __init__(self, target):
+        self.target = np.asarray(target, dtype=np.uint8)
+        self.bits = None
+        self.applied = 0
+    def setRISPattern(self, sn, pattern):
+        self.bits = np.asarray(pattern, dtype=np.uint8)
+        self.applied += 1
+        return _Ret()
+    def power(self, bits=None):
+        bits = self.bits if bits is None else bits
+        a = np.mean((1 - 2.0 * bits) * (1 - 2.0 * self.target))
+        return 20 * np.log10(max(abs(a), 1e-6))
+    def measure(self, step):
+        return self.power()
+
+def planted(shape, seed=0):
+    return np.random.default_rng(seed).integers(0, 2, shape).astype(np.uint8)
+
+def optimizer(ris, shape, **kw):
+    return TMYRISOptimizer("SN", ris, shape, ris.measure, settle=0, **kw)
+
+def test_greedy_improves_start():
+    ris = _SimRIS(planted((4, 4)))
+    opt = optimizer(ris, [4, 4], budget=500, patience=500)
+    start = ris.power(np.zeros((4, 4), dtype=np.uint8))
+    bits, power = opt.greedy(unit="element")
+    assert power > start
+    assert power == pytest.approx(0.0, abs=1e-9)
+    assert np.array_equal(bits, ris.target) or np.array_equal(bits, 1 - ris.target)
+
+def test_budget_stops_measurements():
+    ris = _SimRIS(planted((8, 8)))
+    opt = optimizer(ris, [8, 8], budget=10, patience=100)
+    opt.greedy(unit="element")
+    assert opt.measurements == ris.applied == 10
+    # Nothing left for probing either
+    opt.probe("random", n=5)
+    assert opt.measurements == 10
+
+def test_patience_stops_without_improvement():
+    ris = _SimRIS(planted((4, 4)))
+    opt = TMYRISOptimizer("SN", ris, [4, 4], lambda step: -10.0, budget=100, patience=5, settle=0)
+    opt.greedy(unit="element")
+    # First measurement sets the best, then 5 without improvement
+    assert opt.measurements == 6
+
+def test_history_and_best_are_consistent():
+    ris = _SimRIS(planted((4, 4), seed=3))
+    opt = optimizer(ris, [4, 4], budget=40, patience=40)
+    opt.greedy(unit="row")
+    opt.greedy(unit="element")
+    counts, best = zip(*opt.history)
+    assert list(counts) == list(range(1, opt.measurements + 1))
+    assert all(b >= a for a, b in zip(best, best[1:]))
+    assert best[-1] == opt.best_power == pytest.approx(ris.power(opt.best_bits))
+
+@pytest.mark.parametrize("shape, seed", [((4, 4), 0), ((4, 4), 7), ((3, 5), 1)])
+def test_hadamard_probe_recovers_planted_optimum(shape, seed):
+    ris = _SimRIS(planted(shape, seed))
+    # All 256 rows of the Hadamard basis, plus the reconstructed pattern
+    opt = optimizer(ris, shape, budget=257, patience=257, seed=seed)
+    bits, power = opt.probe("hadamard", n=256)
+    assert opt.measurements == 257
+    assert power == pytest.approx(0.0, abs=1e-9)
+    assert np.array_equal(bits, ris.target) or np.array_equal(bits, 1 - ris.target)
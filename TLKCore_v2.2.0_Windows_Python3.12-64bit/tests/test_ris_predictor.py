@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from tlkcore.TMYRISCodebook import TMYRISCodebook
+from tlkcore.TMYRISPredictor import TMYRISPredictor
+
+def reference(codebook, idx, theta_rx, phi_rx):
+    """Array factor summed element by element"""
+    cb = codebook
+    ti, pi_, to, po = np.deg2rad([cb.theta_in, cb.phi_in, theta_rx, phi_rx])
+    ux = (np.sin(ti) * np.cos(pi_) - np.sin(to) * np.cos(po)) / cb.wavelength
+    uy = (np.sin(ti) * np.sin(pi_) - np.sin(to) * np.sin(po)) / cb.wavelength
+    gamma = 1 - 2 * cb.getBits(idx).astype(float)
+    total = 0j
+    for r in range(cb.row):
+        for c in range(cb.col):
+            x = (c - (cb.col - 1) / 2) * cb.dx
+            y = (r - (cb.row - 1) / 2) * cb.dy
+            total += gamma[r, c] * np.exp(2j * np.pi * (ux * x + uy * y))
+    return 20 * np.log10(max(abs(total) / (cb.row * cb.col), 1e-12))
+
+@pytest.fixture(scope="module")
+def codebook():
+    return TMYRISCodebook([6, 10], 28e9, 30, 45, theta_list=range(0, 90, 10), phi_list=range(0, 360, 45))
+
+def test_matches_reference(codebook):
+    predictor = TMYRISPredictor(codebook)
+    indices = list(range(0, len(codebook), 3))
+    gain = predictor.score(indices, theta_rx=40, phi_rx=90, chunk=7)
+    expected = [reference(codebook, idx, 40, 90) for idx in indices]
+    np.testing.assert_allclose(gain, expected, atol=1e-6)
+
+def test_region_takes_best_direction(codebook):
+    predictor = TMYRISPredictor(codebook)
+    region = predictor.score(theta_rx=[20, 50], phi_rx=[0, 135])
+    np.testing.assert_allclose(region, np.maximum(predictor.score(theta_rx=20, phi_rx=0),
+                                                  predictor.score(theta_rx=50, phi_rx=135)))
+
+def test_select_keeps_pattern_of_receiver(codebook):
+    predictor = TMYRISPredictor(codebook)
+    kept = predictor.select(0.1, theta_rx=60, phi_rx=180)
+    assert len(kept) == int(np.ceil(len(codebook) * 0.1))
+    assert kept == sorted(kept)
+    assert codebook.index(60, 180) in kept
+
+def test_requires_receiver(codebook):
+    predictor = TMYRISPredictor(codebook)
+    with pytest.raises(ValueError):
+        predictor.score()
+    with pytest.raises(ValueError):
+        predictor.select(0.5, theta_rx=10)
+    with pytest.raises(ValueError):
+        predictor.score(theta_rx=[10, 20], phi_rx=[0])
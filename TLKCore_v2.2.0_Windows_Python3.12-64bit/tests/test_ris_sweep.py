@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+from tlkcore.TMYPublic import RetCode
+from tlkcore.TMYRISCodebook import TMYRISCodebook
+from tlkcore.TMYRISSweep import TMYRISSweep, VERIFY
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK):
+        self.RetCode, self.RetData, self.RetMsg = code, data, ""
+
+class _SimRIS():
+    def __init__(self):
+        self.applied = 0
+    def setRISPattern(self, sn, pattern):
+        self.applied += 1
+        return _Ret()
+    def getRISPattern(self, sn, mids):
+        return _Ret({})
+
+def peak(theta, phi):
+    """Smooth power surface peaking at (42, 200)"""
+    return -abs(theta - 42) - min(abs(phi - 200), 360 - abs(phi - 200)) / 4
+
+@pytest.fixture(scope="module")
+def codebook():
+    return TMYRISCodebook([16, 16], 28e9, 30, 45, theta_list=range(0, 61, 2), phi_list=range(0, 360, 10))
+
+def test_run_measures_each_pattern_once(codebook):
+    service = _SimRIS()
+    sweep = TMYRISSweep("SN", service, codebook, peak, settle=0)
+    results = sweep.run()
+    stats = sweep.getStats()
+    assert stats['steps'] == len(codebook) == len(results)
+    assert service.applied == stats['measured'] <= len(codebook)
+
+def test_search_finds_exhaustive_peak(codebook):
+    best = TMYRISSweep.top(TMYRISSweep("SN", _SimRIS(), codebook, peak, settle=0).run(), 1)[0]
+    service = _SimRIS()
+    sweep = TMYRISSweep("SN", service, codebook, peak, settle=0)
+    found = TMYRISSweep.top(sweep.search(levels=((6, 6), (2, 2), (1, 1))), 1)[0]
+    assert found[:2] == best[:2] == (42, 200)
+    assert service.applied < len(codebook)
+
+@pytest.mark.parametrize("levels", [(), [], ((0, 1),), ((3,),)])
+def test_search_rejects_invalid_levels(codebook, levels):
+    sweep = TMYRISSweep("SN", _SimRIS(), codebook, peak, settle=0)
+    with pytest.raises(ValueError):
+        sweep.search(levels=levels)
+
+class _ReadbackRIS(_SimRIS):
+    def __init__(self, codebook):
+        super().__init__()
+        self.codebook = codebook
+        self.readbacks = 0
+        self.pattern = None
+    def setRISPattern(self, sn, pattern):
+        self.pattern = pattern
+        return super().setRISPattern(sn, pattern)
+    def getRISPattern(self, sn, mids):
+        self.readbacks += 1
+        return _Ret({mids[0]: self.pattern})
+
+@pytest.mark.parametrize("verify, expected", [("always", 20), ("every", 4), ("error", 0), ("never", 0)])
+def test_verify_policy_readbacks(codebook, verify, expected):
+    service = _ReadbackRIS(codebook)
+    sweep = TMYRISSweep("SN", service, codebook, peak, mid=1, settle=0, verify=verify, verify_every=5)
+    sweep.run(range(100, 120))
+    stats = sweep.getStats()
+    assert service.readbacks == stats['readbacks'] == expected
+    assert stats['mismatches'] == 0
+
+def test_rejects_unknown_verify_policy(codebook):
+    with pytest.raises(ValueError):
+        TMYRISSweep("SN", _SimRIS(), codebook, peak, verify="hash")
+
+class _RecordRIS(_ReadbackRIS):
+    """Readback service recording patterns in applied order, setRISPattern fails for some patterns"""
+    def __init__(self, codebook, fail=()):
+        super().__init__(codebook)
+        self.patterns = []
+        self.fail = set(fail)
+    def setRISPattern(self, sn, pattern):
+        ret = super().setRISPattern(sn, pattern)
+        self.patterns.append(str(pattern))
+        if len(self.patterns) in self.fail:
+            ret.RetCode = RetCode.ERROR
+        return ret
+
+def sweepBoth(codebook, action, **kw):
+    """Run action(sweep) serially and pipelined, returns [(result, stats, service), ...]"""
+    outcomes = []
+    for pipeline in (False, True):
+        service = _RecordRIS(codebook, fail=(3, 7))
+        sweep = TMYRISSweep("SN", service, codebook, peak, mid=1, settle=0, pipeline=pipeline, **kw)
+        result = action(sweep)
+        stats = sweep.getStats()
+        stats.pop('timing')
+        outcomes.append((result, stats, service))
+    return outcomes
+
+@pytest.mark.parametrize("verify", VERIFY)
+def test_pipelined_run_matches_serial(codebook, verify):
+    # Patterns of the first rows of theta repeat, so dedup is also covered
+    (serial, s_stats, s_service), (piped, p_stats, p_service) = sweepBoth(
+        codebook, lambda sweep: sweep.run(range(0, 400)), verify=verify, verify_every=5)
+    assert piped == serial
+    assert p_stats == s_stats
+    assert p_stats['measured'] < p_stats['steps'] == 400
+    assert p_service.patterns == s_service.patterns
+    assert p_service.readbacks == s_service.readbacks == p_stats['readbacks']
+
+def test_pipelined_search_matches_serial(codebook):
+    (serial, s_stats, s_service), (piped, p_stats, p_service) = sweepBoth(
+        codebook, lambda sweep: sweep.search(levels=((6, 6), (2, 2), (1, 1))), verify="every")
+    assert piped == serial
+    assert p_stats == s_stats
+    assert p_service.patterns == s_service.patterns
+    assert TMYRISSweep.top(piped, 1)[0][:2] == (42, 200)
+
+def failing(after, error):
+    calls = []
+    def measure(theta, phi):
+        calls.append((theta, phi))
+        if len(calls) > after:
+            raise error
+        return peak(theta, phi)
+    return measure, calls
+
+def test_pipelined_stops_workers_if_measure_raises(codebook):
+    before = set(threading.enumerate())
+    measure, calls = failing(5, RuntimeError("receiver lost"))
+    sweep = TMYRISSweep("SN", _SimRIS(), codebook, measure, settle=0, pipeline=True)
+    with pytest.raises(RuntimeError):
+        sweep.run()
+    assert len(calls) == 6
+    assert set(threading.enumerate()) == before
+
+def test_pipelined_interrupt_keeps_partial_results(codebook):
+    before = set(threading.enumerate())
+    measure, calls = failing(5, KeyboardInterrupt())
+    sweep = TMYRISSweep("SN", _SimRIS(), codebook, measure, settle=0, pipeline=True)
+    results = sweep.run(range(len(codebook) - 50, len(codebook)))
+    assert len(results) == 5
+    assert sweep.getStats()['interrupted']
+    assert set(threading.enumerate()) == before
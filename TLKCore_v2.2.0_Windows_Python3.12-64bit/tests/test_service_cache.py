@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from tlkcore.TMYPublic import RetCode
+from tlkcore.TMYServiceCache import TMYServiceCache
+
+class _Ret():
+    def __init__(self, data=None, code=RetCode.OK):
+        self.RetCode, self.RetData, self.RetMsg = code, data, ""
+
+class _SimService():
+    def __init__(self):
+        self.freq = {}
+        self.calls = 0
+        self.querying = None
+        self.release = None
+    def getFrequencyList(self, sn):
+        self.calls += 1
+        freq = self.freq.get(sn, 28.0)
+        if self.querying is not None:
+            self.querying.set()
+            self.release.wait(2.0)
+        return _Ret([freq, freq + 1])
+    def getDR(self, sn, mode):
+        self.calls += 1
+        return _Ret({'mode': mode, 'range': [0, 15]})
+    def getChannelCount(self, sn):
+        self.calls += 1
+        return _Ret(code=RetCode.ERROR)
+    def setOperatingFreq(self, sn, freq):
+        self.freq[sn] = freq
+        return _Ret()
+    def reboot(self, sn):
+        return _Ret()
+    def queryFWVer(self, sn):
+        return _Ret("v1")
+
+@pytest.fixture
+def svc():
+    return _SimService()
+
+def test_hits_per_sn_and_args(svc):
+    cache = TMYServiceCache(svc)
+    assert cache.getDR("SN1", 0).RetData['mode'] == 0
+    cache.getDR("SN1", 0)
+    cache.getDR("SN1", 1)
+    cache.getDR("SN2", 0)
+    assert svc.calls == 3
+    assert cache.getStats() == {'hits': 1, 'misses': 3, 'hit_ratio': 0.25, 'entries': 3}
+    # Not cached methods pass through
+    assert cache.queryFWVer("SN1").RetData == "v1"
+
+def test_failed_result_not_cached(svc):
+    cache = TMYServiceCache(svc)
+    cache.getChannelCount("SN1")
+    cache.getChannelCount("SN1")
+    assert svc.calls == 2
+
+def test_returns_copies(svc):
+    cache = TMYServiceCache(svc)
+    first = cache.getDR("SN1", 0)
+    first.RetData['range'].append(99)
+    second = cache.getDR("SN1", 0)
+    second.RetData['range'].append(100)
+    assert cache.getDR("SN1", 0).RetData['range'] == [0, 15]
+    assert second is not cache.getDR("SN1", 0)
+
+@pytest.mark.parametrize("name, args", [("setOperatingFreq", (39.0,)), ("reboot", ())])
+def test_change_invalidates_sn(svc, name, args):
+    cache = TMYServiceCache(svc)
+    cache.getFrequencyList("SN1")
+    cache.getFrequencyList("SN2")
+    getattr(cache, name)("SN1", *args)
+    cache.getFrequencyList("SN1")
+    cache.getFrequencyList("SN2")
+    assert svc.calls == 3
+
+def test_query_racing_change_is_not_cached(svc):
+    cache = TMYServiceCache(svc)
+    svc.querying, svc.release = threading.Event(), threading.Event()
+    query = threading.Thread(target=cache.getFrequencyList, args=("SN1",))
+    query.start()
+    svc.querying.wait(2.0)
+    # Frequency changes while the old result is on its way back
+    cache.setOperatingFreq("SN1", 39.0)
+    svc.release.set()
+    query.join()
+    svc.querying = None
+    assert cache.getFrequencyList("SN1").RetData == [39.0, 40.0]
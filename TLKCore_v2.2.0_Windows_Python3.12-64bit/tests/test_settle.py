@@ -0,0 +1,37 @@
+import itertools
+
+from tlkcore.TMYSettle import TMYSettleDetector
+
+def test_settles_on_stable_readings():
+    readings = iter([1.0, 5.0, 9.0, 9.1, 9.0, 9.05])
+    settle = TMYSettleDetector(lambda: next(readings), tolerance=0.2, count=3, interval=0, timeout=1.0, min_wait=0)
+    value, settled, _ = settle.wait()
+    assert settled and value == 9.0
+
+def test_invalid_readings_reset_window():
+    readings = iter([2.0, 2.0, None, "x", 2.0, 2.0, 2.0])
+    settle = TMYSettleDetector(lambda: next(readings), count=3, interval=0, timeout=1.0, min_wait=0)
+    value, settled, _ = settle.wait()
+    assert settled and value == 2.0
+
+def test_timeout_returns_last_reading():
+    readings = itertools.cycle([0.0, 5.0])
+    settle = TMYSettleDetector(lambda: next(readings), interval=0.01, timeout=0.05, min_wait=0)
+    value, settled, _ = settle.wait()
+    assert not settled and value in (0.0, 5.0)
+    assert settle.getStats()['timeouts'] == 1
+
+def test_ignores_power_of_previous_configuration():
+    settle = TMYSettleDetector(tolerance=0.2, count=3, interval=0, timeout=1.0, min_wait=0, change_wait=0.5)
+    assert settle.wait(lambda: -10.0)[0] == -10.0
+    # The receiver still reports the old power for a few polls after switching
+    readings = iter([-10.0] * 5 + [-3.0] * 3)
+    value, settled, _ = settle.wait(lambda: next(readings))
+    assert settled and value == -3.0
+    assert settle.getStats()['stale'] == 5
+
+def test_unchanged_power_accepted_after_change_wait():
+    settle = TMYSettleDetector(tolerance=0.2, count=3, interval=0.01, timeout=1.0, min_wait=0, change_wait=0.05)
+    settle.wait(lambda: -10.0)
+    value, settled, elapsed = settle.wait(lambda: -10.0)
+    assert settled and value == -10.0 and elapsed >= 0.05
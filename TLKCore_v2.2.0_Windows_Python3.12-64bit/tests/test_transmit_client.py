@@ -0,0 +1,73 @@
+import math
+import os
+import socket
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import requests
+from tlkcore.TMYMeasProtocol import TMYMeasLink, TMYTextLink
+
+def waitFor(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def server():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    sock.settimeout(2.0)
+    yield sock
+    sock.close()
+
+@pytest.mark.parametrize("protocol", ["auto", "framed"])
+def test_answers_framed_requests(server, protocol):
+    client = requests.TransmitClient(*server.getsockname(), protocol=protocol)
+    conn, _ = server.accept()
+    try:
+        link = TMYMeasLink(conn, timeout=2.0)
+        # No power acquired yet
+        assert math.isnan(link.exchange(0, 10.0))
+        client.update(-12.5)
+        seqs = link.requestBatch([(1, 20.0), (2, 30.0)])
+        assert [(id, value) for id, _, value in link.wait(seqs)] == [(1, -12.5), (2, -12.5)]
+        assert client.latest == 30.0 and client.replies == 3
+    finally:
+        client.close()
+        conn.close()
+
+@pytest.mark.parametrize("protocol", ["auto", "text"])
+def test_answers_legacy_text_server(server, protocol):
+    client = requests.TransmitClient(*server.getsockname(), protocol=protocol)
+    conn, _ = server.accept()
+    try:
+        client.update(-7.25)
+        link = TMYTextLink(conn, timeout=2.0)
+        assert link.exchange(0, 45) == -7.25
+        assert client.latest == 45.0
+    finally:
+        client.close()
+        conn.close()
+
+def test_reconnects_after_server_closed(server):
+    client = requests.TransmitClient(*server.getsockname(), backoff=0.05)
+    try:
+        conn, _ = server.accept()
+        conn.close()
+        conn, _ = server.accept()
+        client.update(-1.0)
+        assert TMYMeasLink(conn, timeout=2.0).exchange(5, 60.0) == -1.0
+        conn.close()
+    finally:
+        client.close()
+
+def test_rejects_unknown_protocol():
+    with pytest.raises(ValueError):
+        requests.TransmitClient("127.0.0.1", 1, protocol="json")